@@ -0,0 +1,77 @@
+"""Compares the round-trip latency of the reply channel used by *holmes_extractor.Manager*, where
+    all worker processes reply on a single queue whose replies are distributed by a
+    *ReplyRouter*, with the previous approach of creating a *multiprocessing.Manager().Queue()*
+    proxy for each call. An echo process stands in for a Holmes worker so that only the
+    communication overhead is measured.
+
+    Usage: python benchmarks/benchmark_reply_channels.py [number_of_calls]
+"""
+import sys
+import time
+import json
+from multiprocessing import Manager as MultiprocessingManager, get_context
+from holmes_extractor.manager import ReplyRouter
+
+def echo_with_proxy_queues(input_queue):
+    while True:
+        message, reply_queue = input_queue.get()
+        reply_queue.put(message)
+
+def echo_with_reply_router(input_queue, reply_queue):
+    while True:
+        message, request_id = input_queue.get()
+        reply_queue.put((request_id, message))
+
+def time_proxy_queues(number_of_calls):
+    spawn_context = get_context('spawn')
+    multiprocessing_manager = MultiprocessingManager()
+    input_queue = spawn_context.Queue()
+    process = spawn_context.Process(
+        target=echo_with_proxy_queues, args=(input_queue,), daemon=True)
+    process.start()
+    timings = []
+    for counter in range(number_of_calls):
+        start_time = time.perf_counter()
+        reply_queue = multiprocessing_manager.Queue()
+        input_queue.put((counter, reply_queue))
+        reply_queue.get()
+        timings.append(time.perf_counter() - start_time)
+    process.terminate()
+    multiprocessing_manager.shutdown()
+    return timings
+
+def time_reply_router(number_of_calls):
+    spawn_context = get_context('spawn')
+    input_queue = spawn_context.Queue()
+    reply_queue = spawn_context.Queue()
+    reply_router = ReplyRouter(reply_queue)
+    process = spawn_context.Process(
+        target=echo_with_reply_router, args=(input_queue, reply_queue), daemon=True)
+    process.start()
+    timings = []
+    for counter in range(number_of_calls):
+        start_time = time.perf_counter()
+        request_id = reply_router.open_request()
+        input_queue.put((counter, request_id))
+        reply_router.get(request_id, None)
+        reply_router.close_request(request_id)
+        timings.append(time.perf_counter() - start_time)
+    process.terminate()
+    reply_router.close()
+    return timings
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        'mean_ms': 1000 * sum(timings) / len(timings),
+        'median_ms': 1000 * timings[len(timings) // 2],
+        'p99_ms': 1000 * timings[int(len(timings) * 0.99)],
+    }
+
+if __name__ == '__main__':
+    number_of_calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(json.dumps({
+        'number_of_calls': number_of_calls,
+        'proxy_queues': summarize(time_proxy_queues(number_of_calls)),
+        'reply_router': summarize(time_reply_router(number_of_calls)),
+    }, indent=2))
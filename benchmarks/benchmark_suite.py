@@ -0,0 +1,373 @@
+"""Measures the main Holmes operations against deterministic synthetic corpora (see
+    *synthetic_corpora.py*) and emits the results as JSON so that the output for two commits can
+    be diffed to detect regressions. The suite runs offline against the installed spaCy models and
+    covers:
+
+    - *holmes_parse* throughput, measured separately from the spaCy and coreferee pipeline;
+    - the indexing rate of *register_serialized_documents* for each corpus size and worker count;
+    - *match()* latency with various numbers of registered search phrases;
+    - *topic_match_documents_against* p50 / p99 latency for each corpus size and worker count;
+    - *SupervisedTopicClassifier.classify* throughput;
+    - the corpus index operations performed during registration, matching and removal, measured
+      both for *CorpusIndexEntry* and for the list-based entry it replaced so that each run
+      reports before and after figures.
+
+    Usage: python benchmarks/benchmark_suite.py [options] (see --help)
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import random
+import time
+import spacy
+import holmes_extractor as holmes
+from holmes_extractor.parsing import serialize_holmes_document, CorpusIndexEntry, \
+    PackedCorpusWordPositions
+from synthetic_corpora import generate_labelled_documents, generate_search_phrases, \
+    generate_queries
+
+DEFAULT_MODELS = {'en': 'en_core_web_sm', 'de': 'de_core_news_lg'}
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        'count': len(timings),
+        'mean_ms': 1000 * sum(timings) / len(timings),
+        'p50_ms': 1000 * timings[len(timings) // 2],
+        'p99_ms': 1000 * timings[int(len(timings) * 0.99)],
+    }
+
+def get_throughput(number_of_items, elapsed_seconds):
+    return number_of_items / elapsed_seconds if elapsed_seconds > 0 else None
+
+def get_git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def time_parsing(manager, texts, batch_size):
+    """ Returns the parsing results together with the parsed documents. The spaCy pipeline
+        including coreference resolution is run first with the Holmes component disabled so that
+        *holmes_parse* can be timed on its own.
+    """
+    start_time = time.perf_counter()
+    docs = list(manager.nlp.pipe(texts, batch_size=batch_size, disable=['holmes']))
+    spacy_seconds = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    for doc in docs:
+        manager.semantic_analyzer.holmes_parse(doc)
+    holmes_seconds = time.perf_counter() - start_time
+    number_of_tokens = sum(len(doc) for doc in docs)
+    return {
+        'documents': len(docs),
+        'tokens': number_of_tokens,
+        'spacy_pipeline_docs_per_second': get_throughput(len(docs), spacy_seconds),
+        'holmes_parse_docs_per_second': get_throughput(len(docs), holmes_seconds),
+        'holmes_parse_tokens_per_second': get_throughput(number_of_tokens, holmes_seconds),
+    }, docs
+
+def time_registration(manager, labels_to_serialized_docs, number_of_tokens):
+    start_time = time.perf_counter()
+    manager.register_serialized_documents(labels_to_serialized_docs)
+    elapsed_seconds = time.perf_counter() - start_time
+    return {
+        'documents': len(labels_to_serialized_docs),
+        'docs_per_second': get_throughput(len(labels_to_serialized_docs), elapsed_seconds),
+        'tokens_per_second': get_throughput(number_of_tokens, elapsed_seconds),
+    }
+
+def time_topic_matching(manager, queries, repetitions):
+    timings = []
+    for _ in range(repetitions):
+        for query in queries:
+            start_time = time.perf_counter()
+            manager.topic_match_documents_against(query)
+            timings.append(time.perf_counter() - start_time)
+    return summarize(timings)
+
+def time_matching(manager, search_phrases, repetitions):
+    manager.remove_all_search_phrases()
+    for search_phrase in search_phrases:
+        manager.register_search_phrase(search_phrase)
+    timings = []
+    number_of_matches = 0
+    for _ in range(repetitions):
+        start_time = time.perf_counter()
+        number_of_matches = len(manager.match())
+        timings.append(time.perf_counter() - start_time)
+    manager.remove_all_search_phrases()
+    results = summarize(timings)
+    results['search_phrases'] = len(search_phrases)
+    results['matches'] = number_of_matches
+    return results
+
+def time_classification(manager, labelled_docs, number_of_training_documents, mlp_max_iter):
+    """ Trains a classifier on the first *number_of_training_documents* documents and measures
+        how quickly it classifies the remaining ones.
+    """
+    training_docs = labelled_docs[:number_of_training_documents]
+    test_docs = labelled_docs[number_of_training_documents:]
+    if len(training_docs) == 0 or len(test_docs) == 0:
+        return None
+    start_time = time.perf_counter()
+    sttb = manager.get_supervised_topic_training_basis(verbose=False)
+    for label, topic, doc in training_docs:
+        sttb.register_training_document(doc, topic, label)
+    sttb.prepare()
+    trainer = sttb.train(minimum_occurrences=0, cv_threshold=0, mlp_max_iter=mlp_max_iter)
+    classifier = trainer.classifier()
+    training_seconds = time.perf_counter() - start_time
+    correct = 0
+    start_time = time.perf_counter()
+    for _, topic, doc in test_docs:
+        classifications = classifier.classify(doc)
+        if len(classifications) > 0 and classifications[0] == topic:
+            correct += 1
+    classification_seconds = time.perf_counter() - start_time
+    return {
+        'training_documents': len(training_docs),
+        'training_seconds': training_seconds,
+        'classified_documents': len(test_docs),
+        'docs_per_second': get_throughput(len(test_docs), classification_seconds),
+        'accuracy': correct / len(test_docs),
+    }
+
+class ListCorpusIndexEntry:
+    """ The corpus index entry as it was before postings were held in arrays: postings are held
+        as tuples of stored *CorpusWordPosition* objects in lists grouped by document label,
+        with a set of all postings to reject duplicates.
+    """
+
+    def __init__(self):
+        self.document_labels_to_postings = {}
+        self.posting_set = set()
+
+    def add(self, corpus_word_position, word, is_derivation):
+        posting = (corpus_word_position, word, is_derivation)
+        if posting in self.posting_set:
+            return False
+        self.posting_set.add(posting)
+        document_label = corpus_word_position.document_label
+        if document_label in self.document_labels_to_postings:
+            self.document_labels_to_postings[document_label].append(posting)
+        else:
+            self.document_labels_to_postings[document_label] = [posting]
+        return True
+
+    def remove_document(self, document_label):
+        if document_label in self.document_labels_to_postings:
+            self.posting_set.difference_update(
+                self.document_labels_to_postings.pop(document_label))
+
+    def get_number_of_corpus_word_positions_in_document(self, document_label):
+        if document_label not in self.document_labels_to_postings:
+            return 0
+        return len({posting[0] for posting in self.document_labels_to_postings[document_label]})
+
+    def get_number_of_postings_in_document(self, document_label):
+        return len(self.document_labels_to_postings.get(document_label, ()))
+
+    def get_number_of_corpus_word_positions(self):
+        return len({posting[0] for posting in self.posting_set})
+
+    def get_postings(self, document_labels=None):
+        if document_labels is None:
+            for postings in self.document_labels_to_postings.values():
+                yield from postings
+        else:
+            for document_label in document_labels:
+                if document_label in self.document_labels_to_postings:
+                    yield from self.document_labels_to_postings[document_label]
+
+def time_corpus_index_entries(entry_class, labels_to_postings, reverse_matching_positions,
+        repetitions):
+    """ Times the corpus index operations for one entry class. *labels_to_postings* maps each
+        document label to a list of *(key_word, corpus_word_position, word, is_derivation)*
+        tuples.
+    """
+    timings = {'register': [], 'count': [], 'iterate': [], 'filter': [], 'remove': []}
+    number_of_postings = sum(len(postings) for postings in labels_to_postings.values())
+    for _ in range(repetitions):
+        corpus_index_dict = {}
+        # registration adds each document and then reads its postings back
+        start_time = time.perf_counter()
+        for document_label, postings in labels_to_postings.items():
+            key_words = set()
+            for key_word, corpus_word_position, word, is_derivation in postings:
+                if key_word not in corpus_index_dict:
+                    corpus_index_dict[key_word] = entry_class()
+                corpus_index_dict[key_word].add(corpus_word_position, word, is_derivation)
+                key_words.add(key_word)
+            for key_word in key_words:
+                corpus_index_entry = corpus_index_dict[key_word]
+                corpus_index_entry.get_number_of_postings_in_document(document_label)
+                corpus_index_entry.get_number_of_corpus_word_positions_in_document(
+                    document_label)
+                for _ in corpus_index_entry.get_postings({document_label}):
+                    pass
+        timings['register'].append(time.perf_counter() - start_time)
+        # the corpus frequency count is the first read of each entry as a whole, so the timing
+        # for CorpusIndexEntry includes merging the postings added during registration
+        start_time = time.perf_counter()
+        for corpus_index_entry in corpus_index_dict.values():
+            corpus_index_entry.get_number_of_corpus_word_positions()
+        timings['count'].append(time.perf_counter() - start_time)
+        # iterating in the form used by the single-word matching path
+        start_time = time.perf_counter()
+        for corpus_index_entry in corpus_index_dict.values():
+            if entry_class is CorpusIndexEntry:
+                postings = corpus_index_entry.get_unpacked_postings()
+            else:
+                postings = corpus_index_entry.get_postings()
+            for _ in postings:
+                pass
+        timings['iterate'].append(time.perf_counter() - start_time)
+        start_time = time.perf_counter()
+        if entry_class is CorpusIndexEntry:
+            packed_positions = PackedCorpusWordPositions(reverse_matching_positions)
+            for corpus_index_entry in corpus_index_dict.values():
+                corpus_index_entry.get_corpus_word_positions(None, packed_positions)
+        else:
+            for corpus_index_entry in corpus_index_dict.values():
+                _ = [cwp for cwp, _, _ in corpus_index_entry.get_postings()
+                    if cwp in reverse_matching_positions]
+        timings['filter'].append(time.perf_counter() - start_time)
+        start_time = time.perf_counter()
+        for document_label, postings in list(labels_to_postings.items())[::2]:
+            for key_word in {posting[0] for posting in postings}:
+                corpus_index_dict[key_word].remove_document(document_label)
+        timings['remove'].append(time.perf_counter() - start_time)
+    results = {operation: summarize(operation_timings) for operation, operation_timings in
+        timings.items()}
+    results['postings_per_second_registered'] = get_throughput(
+        number_of_postings, results['register']['p50_ms'] / 1000)
+    return results
+
+def time_corpus_index(labels_to_postings, repetitions, seed):
+    """ Returns before and after figures for the corpus index operations. The positions used for
+        reverse matching are a tenth of all positions chosen at random.
+    """
+    all_positions = sorted({posting[1] for postings in labels_to_postings.values() for posting
+        in postings}, key=lambda cwp: (cwp.document_label, cwp.index.token_index,
+        cwp.index.subword_index if cwp.index.is_subword() else -1))
+    reverse_matching_positions = set(random.Random(seed).sample(
+        all_positions, len(all_positions) // 10))
+    return {
+        'documents': len(labels_to_postings),
+        'postings': sum(len(postings) for postings in labels_to_postings.values()),
+        'before': time_corpus_index_entries(ListCorpusIndexEntry, labels_to_postings,
+            reverse_matching_positions, repetitions),
+        'after': time_corpus_index_entries(CorpusIndexEntry, labels_to_postings,
+            reverse_matching_positions, repetitions),
+    }
+
+def get_labels_to_postings(semantic_matching_helper, labels_to_docs):
+    labels_to_postings = {}
+    for document_label, doc in labels_to_docs.items():
+        corpus_index_dict = {}
+        semantic_matching_helper.add_to_corpus_index(corpus_index_dict, doc, document_label)
+        labels_to_postings[document_label] = [
+            (key_word, corpus_word_position, word, is_derivation)
+            for key_word, corpus_index_entry in corpus_index_dict.items()
+            for corpus_word_position, word, is_derivation in corpus_index_entry]
+    return labels_to_postings
+
+def benchmark_language(language, model, arguments):
+    corpus_sizes = sorted(arguments.corpus_sizes)
+    labelled_texts = generate_labelled_documents(
+        language, corpus_sizes[-1], arguments.sentences_per_document, seed=arguments.seed)
+    queries = generate_queries(language, arguments.queries, seed=arguments.seed + 1)
+    results = {'model': model}
+    parsing_manager = holmes.Manager(model, number_of_workers=1)
+    try:
+        results['parse'], docs = time_parsing(
+            parsing_manager, [text for _, _, text in labelled_texts], arguments.batch_size)
+        results['classify'] = time_classification(
+            parsing_manager, [(label, topic, doc) for (label, topic, _), doc in zip(
+                labelled_texts, docs)], arguments.classification_training_documents,
+            arguments.mlp_max_iter)
+        results['corpus_index'] = time_corpus_index(get_labels_to_postings(
+            parsing_manager.semantic_matching_helper, {label: doc for (label, _, _), doc in zip(
+            labelled_texts, docs)}), arguments.repetitions, arguments.seed)
+    finally:
+        parsing_manager.close()
+    labels_to_serialized_docs = {label: serialize_holmes_document(doc) for (label, _, _), doc
+        in zip(labelled_texts, docs)}
+    labels_to_token_counts = {label: len(doc) for (label, _, _), doc in zip(
+        labelled_texts, docs)}
+    results['register'] = []
+    results['topic_match'] = []
+    results['match'] = []
+    for number_of_workers in sorted(arguments.worker_counts):
+        manager = holmes.Manager(model, number_of_workers=number_of_workers)
+        try:
+            for corpus_size in corpus_sizes:
+                manager.remove_all_documents()
+                labels = [label for label, _, _ in labelled_texts[:corpus_size]]
+                registration_results = time_registration(
+                    manager, {label: labels_to_serialized_docs[label] for label in labels},
+                    sum(labels_to_token_counts[label] for label in labels))
+                registration_results['workers'] = number_of_workers
+                results['register'].append(registration_results)
+                topic_match_results = time_topic_matching(
+                    manager, queries, arguments.repetitions)
+                topic_match_results['corpus_size'] = corpus_size
+                topic_match_results['workers'] = number_of_workers
+                results['topic_match'].append(topic_match_results)
+            for number_of_search_phrases in sorted(arguments.search_phrase_counts):
+                match_results = time_matching(manager, generate_search_phrases(
+                    language, number_of_search_phrases, seed=arguments.seed),
+                    arguments.repetitions)
+                match_results['corpus_size'] = corpus_sizes[-1]
+                match_results['workers'] = number_of_workers
+                results['match'].append(match_results)
+        finally:
+            manager.close()
+    return results
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(description='Runs the Holmes benchmark suite.')
+    parser.add_argument(
+        '--languages', nargs='+', default=['en', 'de'], choices=sorted(DEFAULT_MODELS.keys()))
+    parser.add_argument('--english-model', default=DEFAULT_MODELS['en'])
+    parser.add_argument('--german-model', default=DEFAULT_MODELS['de'])
+    parser.add_argument('--corpus-sizes', nargs='+', type=int, default=[100, 1000])
+    parser.add_argument('--worker-counts', nargs='+', type=int, default=[1, 2, 4])
+    parser.add_argument('--search-phrase-counts', nargs='+', type=int, default=[10, 100])
+    parser.add_argument('--sentences-per-document', type=int, default=20)
+    parser.add_argument('--queries', type=int, default=20)
+    parser.add_argument('--repetitions', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--classification-training-documents', type=int, default=60)
+    parser.add_argument('--mlp-max-iter', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='a file to write the JSON to instead of stdout')
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    arguments = parse_arguments(sys.argv[1:])
+    languages_to_models = {'en': arguments.english_model, 'de': arguments.german_model}
+    output = {
+        'environment': {
+            'git_commit': get_git_commit(),
+            'python': platform.python_version(),
+            'spacy': spacy.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'parameters': vars(arguments),
+        'results': {language: benchmark_language(
+            language, languages_to_models[language], arguments)
+            for language in arguments.languages},
+    }
+    if arguments.output is None:
+        print(json.dumps(output, indent=2))
+    else:
+        with open(arguments.output, 'w', encoding='utf-8') as output_file:
+            json.dump(output, output_file, indent=2)
@@ -0,0 +1,194 @@
+"""Measures the memory taken up by the objects Holmes creates for each stored token, each corpus
+    index posting and each structural match, using the deterministic synthetic corpora from
+    *synthetic_corpora.py*. The value classes (*HolmesDictionary*, *SemanticDependency*,
+    *Subword*, *Index*, *CorpusWordPosition*, *Match* and *WordMatch*) define *__slots__*; for
+    comparison, each measurement is repeated for dictionary-backed objects holding the same
+    attributes, which is how these classes were represented before they were slotted.
+
+    Corpus index postings are held in NumPy arrays of packed positions rather than as objects;
+    their array size is reported alongside the size of the posting tuples and position objects
+    that iterating over the corpus index creates.
+
+    Sizes are calculated with *sys.getsizeof()* over the value objects and the lists, tuples,
+    sets and dictionaries they own. Strings, numbers and spaCy objects are shared with the rest
+    of the process and are not included.
+
+    Usage: python benchmarks/memory_benchmark.py [options] (see --help)
+"""
+import argparse
+import json
+import sys
+import holmes_extractor as holmes
+from holmes_extractor.parsing import SemanticDependency, Subword, Index, CorpusWordPosition, \
+    HolmesDictionary, Mention, get_slot_state
+from holmes_extractor.matching import Match, WordMatch
+from synthetic_corpora import generate_labelled_documents, generate_search_phrases
+
+SLOTTED_CLASSES = (
+    HolmesDictionary, SemanticDependency, Subword, Index, CorpusWordPosition, Match, WordMatch)
+
+# Classes whose instances are included in the measurements but whose representation has not
+# changed
+OTHER_MEASURED_CLASSES = (Mention,)
+
+def get_dictionary_backed_size(obj, dictionary_backed_classes):
+    """ Returns the size of an instance of a plain class with the same attributes as *obj*,
+        which is created in the same attribute order so that CPython can share the dictionary
+        keys as it does for ordinary instances.
+    """
+    class_name = type(obj).__name__
+    if class_name not in dictionary_backed_classes:
+        dictionary_backed_classes[class_name] = type(class_name, (), {})
+    dictionary_backed_obj = dictionary_backed_classes[class_name]()
+    for name, value in get_slot_state(obj).items():
+        setattr(dictionary_backed_obj, name, value)
+    return sys.getsizeof(dictionary_backed_obj) + sys.getsizeof(dictionary_backed_obj.__dict__)
+
+def get_sizes(obj, seen, dictionary_backed_classes):
+    """ Returns a tuple of the size of *obj* and the objects it owns as they are currently
+        represented and the corresponding size with dictionary-backed value objects.
+    """
+    if id(obj) in seen:
+        return 0, 0
+    seen.add(id(obj))
+    if isinstance(obj, SLOTTED_CLASSES):
+        size = sys.getsizeof(obj)
+        state = get_slot_state(obj)
+        dictionary_backed_size = get_dictionary_backed_size(obj, dictionary_backed_classes)
+        values = state.values()
+    elif isinstance(obj, OTHER_MEASURED_CLASSES):
+        size = dictionary_backed_size = sys.getsizeof(obj) + sys.getsizeof(obj.__dict__)
+        values = vars(obj).values()
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size = dictionary_backed_size = sys.getsizeof(obj)
+        values = obj
+    elif isinstance(obj, dict):
+        size = dictionary_backed_size = sys.getsizeof(obj)
+        values = list(obj.keys()) + list(obj.values())
+    else:
+        return 0, 0
+    for value in values:
+        value_size, value_dictionary_backed_size = get_sizes(
+            value, seen, dictionary_backed_classes)
+        size += value_size
+        dictionary_backed_size += value_dictionary_backed_size
+    return size, dictionary_backed_size
+
+def get_array_size(corpus_index_entry):
+    """ Returns the size of the arrays in which a corpus index entry holds its postings together
+        with the list of its distinct textual representations.
+    """
+    corpus_index_entry.consolidate()
+    return corpus_index_entry.positions.nbytes + corpus_index_entry.word_codes.nbytes + \
+        corpus_index_entry.is_derivations.nbytes + sys.getsizeof(corpus_index_entry.words)
+
+def summarize(size, dictionary_backed_size, number_of_items, item_name, array_size=None):
+    if number_of_items == 0:
+        return None
+    summary = {
+        item_name: number_of_items,
+        'slotted_bytes_per_item': size / number_of_items,
+        'dictionary_backed_bytes_per_item': dictionary_backed_size / number_of_items,
+        'reduction': 1 - (size / dictionary_backed_size),
+    }
+    if array_size is not None:
+        summary['array_bytes_per_item'] = array_size / number_of_items
+        summary['array_reduction'] = 1 - (array_size / dictionary_backed_size)
+    return summary
+
+def measure_language(language, model, arguments):
+    manager = holmes.Manager(model, number_of_workers=1)
+    try:
+        labelled_texts = generate_labelled_documents(
+            language, arguments.documents, arguments.sentences_per_document, seed=arguments.seed)
+        document_labels_to_documents = {label: doc for (label, _, _), doc in zip(
+            labelled_texts, manager.nlp.pipe(text for _, _, text in labelled_texts))}
+        dictionary_backed_classes = {}
+
+        seen = set()
+        token_size = token_dictionary_backed_size = number_of_tokens = 0
+        for doc in document_labels_to_documents.values():
+            for token in doc:
+                size, dictionary_backed_size = get_sizes(
+                    token._.holmes, seen, dictionary_backed_classes)
+                token_size += size
+                token_dictionary_backed_size += dictionary_backed_size
+                number_of_tokens += 1
+
+        corpus_index_dict = {}
+        for label, doc in document_labels_to_documents.items():
+            manager.semantic_matching_helper.add_to_corpus_index(corpus_index_dict, doc, label)
+        seen = set()
+        posting_size = posting_dictionary_backed_size = posting_array_size = \
+            number_of_postings = 0
+        for corpus_index_entry in corpus_index_dict.values():
+            posting_array_size += get_array_size(corpus_index_entry)
+            # the posting tuples and position objects are created by the iteration and compared
+            # with the arrays from which they are created
+            for posting in corpus_index_entry:
+                size, dictionary_backed_size = get_sizes(
+                    posting, seen, dictionary_backed_classes)
+                posting_size += size
+                posting_dictionary_backed_size += dictionary_backed_size
+                number_of_postings += 1
+
+        search_phrases = [manager.internal_get_search_phrase(text, text) for text in
+            generate_search_phrases(language, arguments.search_phrases, seed=arguments.seed)]
+        matches = manager.structural_matcher.match(
+            document_labels_to_documents=document_labels_to_documents,
+            corpus_index_dict=corpus_index_dict,
+            search_phrases=search_phrases,
+            match_depending_on_single_words=None,
+            compare_embeddings_on_root_words=False,
+            compare_embeddings_on_non_root_words=False,
+            reverse_matching_corpus_word_positions=None,
+            embedding_reverse_matching_corpus_word_positions=None,
+            process_initial_question_words=False,
+            overall_similarity_threshold=1.0,
+            initial_question_word_overall_similarity_threshold=1.0)
+        seen = set()
+        match_size, match_dictionary_backed_size = get_sizes(
+            matches, seen, dictionary_backed_classes)
+        # do not count the list that holds the matches
+        match_size -= sys.getsizeof(matches)
+        match_dictionary_backed_size -= sys.getsizeof(matches)
+        return {
+            'model': model,
+            'stored_token': summarize(
+                token_size, token_dictionary_backed_size, number_of_tokens, 'tokens'),
+            'corpus_index_posting': summarize(
+                posting_size, posting_dictionary_backed_size, number_of_postings, 'postings',
+                posting_array_size),
+            'match': summarize(
+                match_size, match_dictionary_backed_size, len(matches), 'matches'),
+        }
+    finally:
+        manager.close()
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(description='Runs the Holmes memory benchmark.')
+    parser.add_argument('--languages', nargs='+', default=['en', 'de'], choices=['en', 'de'])
+    parser.add_argument('--english-model', default='en_core_web_sm')
+    parser.add_argument('--german-model', default='de_core_news_lg')
+    parser.add_argument('--documents', type=int, default=100)
+    parser.add_argument('--sentences-per-document', type=int, default=20)
+    parser.add_argument('--search-phrases', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='a file to write the JSON to instead of stdout')
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    arguments = parse_arguments(sys.argv[1:])
+    languages_to_models = {'en': arguments.english_model, 'de': arguments.german_model}
+    output = {
+        'python': sys.version,
+        'parameters': vars(arguments),
+        'results': {language: measure_language(
+            language, languages_to_models[language], arguments)
+            for language in arguments.languages},
+    }
+    if arguments.output is None:
+        print(json.dumps(output, indent=2))
+    else:
+        with open(arguments.output, 'w', encoding='utf-8') as output_file:
+            json.dump(output, output_file, indent=2)
@@ -0,0 +1,170 @@
+"""Generates deterministic synthetic English and German corpora for the benchmarks. Each document
+    is built from simple transitive and predicative sentences whose vocabulary is drawn mostly
+    from a single topic, so that the same texts can be used to measure parsing, registration,
+    structural matching, topic matching and supervised classification. The same seed always
+    produces the same texts, which means that timings from different commits refer to the same
+    workload.
+"""
+import random
+import re
+
+ENGLISH_TOPICS = {
+    'animals': {
+        'nouns': ['dog', 'cat', 'horse', 'lion', 'tiger', 'rabbit', 'mouse', 'elephant',
+            'monkey', 'wolf'],
+        'verbs': ['chased', 'bit', 'followed', 'watched', 'fed', 'frightened', 'caught',
+            'licked'],
+        'adjectives': ['hungry', 'small', 'wild', 'brown', 'old', 'sleepy'],
+    },
+    'vehicles': {
+        'nouns': ['car', 'lorry', 'bus', 'bicycle', 'tractor', 'train', 'van', 'motorbike',
+            'tram', 'scooter'],
+        'verbs': ['towed', 'overtook', 'pushed', 'repaired', 'hit', 'passed', 'blocked',
+            'pulled'],
+        'adjectives': ['red', 'fast', 'broken', 'new', 'heavy', 'electric'],
+    },
+    'people': {
+        'nouns': ['teacher', 'doctor', 'farmer', 'lawyer', 'baker', 'pilot', 'nurse',
+            'student', 'engineer', 'painter'],
+        'verbs': ['helped', 'visited', 'called', 'paid', 'trained', 'hired', 'thanked',
+            'met'],
+        'adjectives': ['tired', 'busy', 'young', 'famous', 'friendly', 'clever'],
+    },
+}
+
+ENGLISH_SENTENCE_TEMPLATES = [
+    'The {adjective} {noun} {verb} the {other_noun}.',
+    'A {noun} {verb} a {adjective} {other_noun}.',
+    'Yesterday the {noun} {verb} the {other_noun} again.',
+    'The {noun} was {adjective}.',
+]
+
+ENGLISH_SEARCH_PHRASE_TEMPLATE = 'A {noun} {verb} a {other_noun}'
+
+# German nouns are given as (nominative, accusative) pairs so that the generated sentences are
+# grammatical.
+GERMAN_TOPICS = {
+    'animals': {
+        'nouns': [('der Hund', 'den Hund'), ('die Katze', 'die Katze'),
+            ('das Pferd', 'das Pferd'), ('der Löwe', 'den Löwen'), ('der Tiger', 'den Tiger'),
+            ('das Kaninchen', 'das Kaninchen'), ('die Maus', 'die Maus'),
+            ('der Elefant', 'den Elefanten'), ('der Affe', 'den Affen'),
+            ('der Wolf', 'den Wolf')],
+        'verbs': ['jagte', 'biss', 'verfolgte', 'beobachtete', 'fütterte', 'erschreckte',
+            'fing', 'leckte'],
+        'adjectives': ['hungrig', 'klein', 'wild', 'braun', 'alt', 'müde'],
+    },
+    'vehicles': {
+        'nouns': [('das Auto', 'das Auto'), ('der Lastwagen', 'den Lastwagen'),
+            ('der Bus', 'den Bus'), ('das Fahrrad', 'das Fahrrad'),
+            ('der Traktor', 'den Traktor'), ('der Zug', 'den Zug'),
+            ('die Straßenbahn', 'die Straßenbahn'), ('das Motorrad', 'das Motorrad'),
+            ('der Roller', 'den Roller'), ('der Transporter', 'den Transporter')],
+        'verbs': ['schleppte', 'überholte', 'schob', 'reparierte', 'rammte', 'blockierte',
+            'zog', 'verfolgte'],
+        'adjectives': ['rot', 'schnell', 'kaputt', 'neu', 'schwer', 'elektrisch'],
+    },
+    'people': {
+        'nouns': [('der Lehrer', 'den Lehrer'), ('die Ärztin', 'die Ärztin'),
+            ('der Bauer', 'den Bauern'), ('die Anwältin', 'die Anwältin'),
+            ('der Bäcker', 'den Bäcker'), ('die Pilotin', 'die Pilotin'),
+            ('der Student', 'den Studenten'), ('die Ingenieurin', 'die Ingenieurin'),
+            ('der Maler', 'den Maler'), ('die Krankenschwester', 'die Krankenschwester')],
+        'verbs': ['besuchte', 'rief', 'bezahlte', 'trainierte', 'lobte', 'traf', 'kannte',
+            'suchte'],
+        'adjectives': ['müde', 'beschäftigt', 'jung', 'berühmt', 'freundlich', 'klug'],
+    },
+}
+
+GERMAN_SENTENCE_TEMPLATES = [
+    '{nominative} {verb} {other_accusative}.',
+    'Gestern {verb} {nominative} {other_accusative}.',
+    '{nominative} {verb} {other_accusative} wieder.',
+    '{nominative} war {adjective}.',
+]
+
+GERMAN_SEARCH_PHRASE_TEMPLATE = '{nominative} {verb} {other_accusative}'
+
+LANGUAGES_TO_VOCABULARIES = {
+    'en': (ENGLISH_TOPICS, ENGLISH_SENTENCE_TEMPLATES, ENGLISH_SEARCH_PHRASE_TEMPLATE),
+    'de': (GERMAN_TOPICS, GERMAN_SENTENCE_TEMPLATES, GERMAN_SEARCH_PHRASE_TEMPLATE),
+}
+
+def get_vocabulary(language):
+    if language not in LANGUAGES_TO_VOCABULARIES:
+        raise ValueError(''.join(('No synthetic vocabulary for language ', language)))
+    return LANGUAGES_TO_VOCABULARIES[language]
+
+def fill_template(language, template, topic_vocabulary, generator):
+    noun = generator.choice(topic_vocabulary['nouns'])
+    other_noun = generator.choice(topic_vocabulary['nouns'])
+    verb = generator.choice(topic_vocabulary['verbs'])
+    adjective = generator.choice(topic_vocabulary['adjectives'])
+    if language == 'de':
+        text = template.format(
+            nominative=noun[0], other_accusative=other_noun[1], verb=verb,
+            adjective=adjective)
+    else:
+        text = template.format(
+            noun=noun, other_noun=other_noun, verb=verb, adjective=adjective)
+        text = re.sub(r'\b([Aa]) ([aeiou])', r'\1n \2', text)
+    return ''.join((text[0].upper(), text[1:]))
+
+def generate_labelled_documents(
+        language, number_of_documents, sentences_per_document=20, off_topic_proportion=0.2,
+        seed=42):
+    """ Returns a list of *(label, topic, text)* tuples. The topics are assigned to the documents
+        in rotation; within each document, *off_topic_proportion* of the sentences are drawn from
+        the vocabulary of a randomly chosen topic rather than from that of the document topic.
+    """
+    topics_to_vocabularies, sentence_templates, _ = get_vocabulary(language)
+    topics = sorted(topics_to_vocabularies.keys())
+    generator = random.Random(seed)
+    documents = []
+    for document_index in range(number_of_documents):
+        topic = topics[document_index % len(topics)]
+        sentences = []
+        for _ in range(sentences_per_document):
+            if generator.random() < off_topic_proportion:
+                sentence_topic = generator.choice(topics)
+            else:
+                sentence_topic = topic
+            sentences.append(fill_template(
+                language, generator.choice(sentence_templates),
+                topics_to_vocabularies[sentence_topic], generator))
+        label = '-'.join((language, topic, str(document_index).zfill(6)))
+        documents.append((label, topic, ' '.join(sentences)))
+    return documents
+
+def generate_documents(
+        language, number_of_documents, sentences_per_document=20, off_topic_proportion=0.2,
+        seed=42):
+    """ Returns a dictionary from document labels to document texts. """
+    return {label: text for label, _, text in generate_labelled_documents(
+        language, number_of_documents, sentences_per_document, off_topic_proportion, seed)}
+
+def generate_search_phrases(language, number_of_search_phrases, seed=42):
+    """ Returns a list of distinct search phrase texts, or as many distinct texts as the
+        vocabulary allows if *number_of_search_phrases* exceeds that number.
+    """
+    topics_to_vocabularies, _, search_phrase_template = get_vocabulary(language)
+    topics = sorted(topics_to_vocabularies.keys())
+    generator = random.Random(seed)
+    search_phrases = []
+    seen_search_phrases = set()
+    attempts = 0
+    while len(search_phrases) < number_of_search_phrases and \
+            attempts < 100 * number_of_search_phrases:
+        attempts += 1
+        search_phrase = fill_template(
+            language, search_phrase_template,
+            topics_to_vocabularies[generator.choice(topics)], generator)
+        if search_phrase not in seen_search_phrases:
+            seen_search_phrases.add(search_phrase)
+            search_phrases.append(search_phrase)
+    return search_phrases
+
+def generate_queries(language, number_of_queries, sentences_per_query=2, seed=42):
+    """ Returns a list of topic matching query texts. """
+    return [text for _, _, text in generate_labelled_documents(
+        language, number_of_queries, sentences_per_query, 0.0, seed)]
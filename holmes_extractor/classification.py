@@ -3,6 +3,7 @@ import statistics
 import jsonpickle
 from scipy.sparse import dok_matrix
 from sklearn.neural_network import MLPClassifier
+from .parsing import SearchPhraseIndex
 from .errors import WrongModelDeserializationError, FewerThanTwoClassificationsError, \
         DuplicateDocumentError, NoPhraseletsAfterFilteringError, \
         IncompatibleAnalyzeDerivationalMorphologyDeserializationError
@@ -108,8 +109,19 @@ class SupervisedTopicTrainingUtils:
                                 increment(combined_label, match.document_label)
         return labels_to_frequencies_dict
 
+    def create_search_phrase_index(self, structural_matcher, phraselet_labels_to_search_phrases):
+        """ Returns a *SearchPhraseIndex* containing the search phrases (phraselets) in
+            *phraselet_labels_to_search_phrases*.
+        """
+        search_phrase_index = SearchPhraseIndex()
+        for search_phrase in phraselet_labels_to_search_phrases.values():
+            search_phrase_index.add(
+                search_phrase, *structural_matcher.get_search_phrase_index_information(
+                search_phrase))
+        return search_phrase_index
+
     def record_matches(
-            self, *, phraselet_labels_to_search_phrases, semantic_matching_helper,
+            self, *, search_phrase_index, semantic_matching_helper,
             structural_matcher, sorted_label_dict, doc_label, doc, matrix, row_index,
             overall_similarity_threshold):
         """ Matches a document against the currently stored phraselets and records the matches
@@ -117,8 +129,8 @@ class SupervisedTopicTrainingUtils:
 
             Parameters:
 
-            phraselet_labels_to_search_phrases -- a dictionary from search phrase (phraselet)
-                labels to search phrase objects.
+            search_phrase_index -- a *SearchPhraseIndex* containing the search phrases
+                (phraselets).
             semantic_matching_helper -- the semantic matching helper to use.
             structural_matcher -- the structural matcher to use for comparisons.
             sorted_label_dict -- a dictionary from search phrase (phraselet) labels to their own
@@ -138,7 +150,8 @@ class SupervisedTopicTrainingUtils:
                     matches=structural_matcher.match(
                         document_labels_to_documents=document_labels_to_documents,
                         corpus_index_dict=corpus_index_dict,
-                        search_phrases=phraselet_labels_to_search_phrases.values(),
+                        search_phrases=search_phrase_index.get_search_phrases(
+                            corpus_index_dict),
                         match_depending_on_single_words=None,
                         compare_embeddings_on_root_words=False,
                         compare_embeddings_on_non_root_words=True,
@@ -376,9 +389,10 @@ class SupervisedTopicModelTrainer:
                     str(cv_threshold)))
                 )
 
-        phraselet_labels_to_search_phrases = \
+        search_phrase_index = self.utils.create_search_phrase_index(
+            self.structural_matcher,
             self.linguistic_object_factory.create_search_phrases_from_phraselet_infos(
-                self.phraselet_infos)
+                self.phraselet_infos))
         self.sorted_label_dict = {}
         for index, label in enumerate(sorted(self.labels_to_classification_frequencies.keys())):
             self.sorted_label_dict[label] = index
@@ -396,7 +410,7 @@ class SupervisedTopicModelTrainer:
             self.utils.record_matches(
                 semantic_matching_helper=self.semantic_matching_helper,
                 structural_matcher=self.structural_matcher,
-                phraselet_labels_to_search_phrases=phraselet_labels_to_search_phrases,
+                search_phrase_index=search_phrase_index,
                 sorted_label_dict=self.sorted_label_dict,
                 doc_label=document_label,
                 doc=self.training_basis.training_document_labels_to_documents[document_label].doc,
@@ -576,6 +590,8 @@ class SupervisedTopicClassifier:
         self.phraselet_labels_to_search_phrases = \
             self.linguistic_object_factory.create_search_phrases_from_phraselet_infos(
                 model.phraselet_infos)
+        self.search_phrase_index = self.utils.create_search_phrase_index(
+            self.structural_matcher, self.phraselet_labels_to_search_phrases)
 
     def parse_and_classify(self, text):
         """ Returns a list containing zero, one or many document classifications. Where more
@@ -604,7 +620,7 @@ class SupervisedTopicClassifier:
         if not self.utils.record_matches(
                 semantic_matching_helper=self.semantic_matching_helper,
                 structural_matcher=self.structural_matcher,
-                phraselet_labels_to_search_phrases=self.phraselet_labels_to_search_phrases,
+                search_phrase_index=self.search_phrase_index,
                 sorted_label_dict=self.model.sorted_label_dict,
                 doc=doc,
                 doc_label='',
@@ -50,3 +50,12 @@ class EmbeddingThresholdLessThanRelationThresholdError(HolmesError):
 
 class IncompatibleAnalyzeDerivationalMorphologyDeserializationError(HolmesError):
     pass
+
+class MultiprocessingParsingNotSupportedError(HolmesError):
+    pass
+
+class SnapshotError(HolmesError):
+    pass
+
+class ParserProcessError(HolmesError):
+    pass
@@ -3,6 +3,22 @@ from spacy.tokens import Token
 from ...parsing import SemanticAnalyzer, SemanticMatchingHelper, MatchImplication,\
     PhraseletTemplate, SemanticDependency, Subword
 
+class PossibleSubword:
+    """ A subword within a possible solution.
+
+        text -- the text
+        char_start_index -- the character start index of the subword within the word.
+        fugen_s_status --
+        '1' if the preceding word has an ending that normally has a Fugen-S,
+        '2' if the preceding word has an ending that precludes using a Fugen-S,
+        '0' otherwise.
+    """
+
+    def __init__(self, text, char_start_index, fugen_s_status):
+        self.text = text
+        self.char_start_index = char_start_index
+        self.fugen_s_status = fugen_s_status
+
 class LanguageSpecificSemanticAnalyzer(SemanticAnalyzer):
 
     language_name = 'German'
@@ -151,165 +167,181 @@ class LanguageSpecificSemanticAnalyzer(SemanticAnalyzer):
         return token.dep_ == 'svp' or (token.dep_ == 'mo' and token.pos_ == 'ADP' and
             len(list(token.children)) == 0)
 
-    def add_subwords(self, token, subword_cache):
-        """ Adds any subwords to *token._.holmes*. """
-
-        class PossibleSubword:
-            """ A subword within a possible solution.
-
-                text -- the text
-                char_start_index -- the character start index of the subword within the word.
-                fugen_s_status --
-                '1' if the preceding word has an ending that normally has a Fugen-S,
-                '2' if the preceding word has an ending that precludes using a Fugen-S,
-                '0' otherwise.
-            """
-
-            def __init__(self, text, char_start_index, fugen_s_status):
-                self.text = text
-                self.char_start_index = char_start_index
-                self.fugen_s_status = fugen_s_status
-
-        def get_subword(lemma, initial_index, length):
-            # find the shortest subword longer than length.
-            for end_index in range(initial_index + length, len(lemma) + 1):
-                possible_word = lemma[initial_index: end_index]
-                if (not self.is_oov(possible_word) or possible_word in self.subword_whitelist) \
-                        and len(possible_word) >= 2 and \
-                        (
-                            possible_word[0] in self.vowels or possible_word[1] in self.vowels
-                            or
-                            possible_word[:2] in self.subword_start_consonant_bigraph_whitelist) \
-                        and (
-                            possible_word[-1] in self.vowels or possible_word[-2] in self.vowels
-                            or
-                            possible_word[-2:] in self.subword_end_consonant_bigraph_whitelist):
-                    return possible_word
-            return None
+    def get_subword(self, lemma, initial_index, length):
+        # find the shortest subword longer than length.
+        for end_index in range(initial_index + length, len(lemma) + 1):
+            possible_word = lemma[initial_index: end_index]
+            if (not self.is_oov(possible_word) or possible_word in self.subword_whitelist) \
+                    and len(possible_word) >= 2 and \
+                    (
+                        possible_word[0] in self.vowels or possible_word[1] in self.vowels
+                        or
+                        possible_word[:2] in self.subword_start_consonant_bigraph_whitelist) \
+                    and (
+                        possible_word[-1] in self.vowels or possible_word[-2] in self.vowels
+                        or
+                        possible_word[-2:] in self.subword_end_consonant_bigraph_whitelist):
+                return possible_word
+        return None
 
-        def score(possible_solution):
-            # Lower scores are better.
-            number = 0
-            for subword in possible_solution:
-                # subwords shorter than minimum_normal_subword_length: penalty of 2
-                if len(subword.text) < self.minimum_normal_subword_length:
-                    number += 2 * (self.minimum_normal_subword_length - len(subword.text))
-                # subwords longer than 12: penalty of 2
-                elif len(subword.text) > self.maximum_realistic_subword_length:
-                    number += 2 * (len(subword.text) - self.maximum_realistic_subword_length)
-                # fugen-s after a whitelist ending
-                if subword.fugen_s_status == 2:
-                    number -= self.fugen_s_after_whitelisted_ending_bonus
-                # fugen-s after an ending that is neither whitelist nor blacklist
-                elif subword.fugen_s_status == 1:
-                    number -= self.fugen_s_after_non_whitelisted_non_blacklisted_ending_bonus
-            return number
-
-        def scan_recursively_for_subwords(lemma, initial_index=0):
-
-            if initial_index == 0: # only need to check on the initial (outermost) call
-                for char in lemma:
-                    if not char.isalpha() and char != '-':
-                        return None
-            if initial_index + 1 < len(lemma) and lemma[initial_index] == '-':
-                return scan_recursively_for_subwords(lemma, initial_index + 1)
-            lengths = list(range(self.minimum_subword_length, 1 + len(lemma) - initial_index))
-            possible_solutions = []
-            working_subword = None
-            for length in lengths:
-                if working_subword is not None and len(working_subword) >= length:
-                    # we are catching up with the length already returned by get_subword
-                    continue
-                working_subword = get_subword(lemma, initial_index, length)
-                if working_subword is None or working_subword in self.subword_blacklist or \
-                        '-' in working_subword:
-                    continue
-                possible_solution = [PossibleSubword(working_subword, initial_index, 0)]
-                if \
-                        (
-                            initial_index + len(working_subword) == len(lemma)) or (
-                                initial_index + len(working_subword)
-                            + 1 == len(lemma) and lemma[-1] == '-') \
-                        or (
-                            initial_index + len(working_subword) + 2 == len(lemma) and lemma[-2:] ==
-                            's-'):
-                    # we have reached the end of the word
-                    possible_solutions.append(possible_solution)
-                    break
-                following_subwords = scan_recursively_for_subwords(
-                    lemma, initial_index + len(working_subword))
-                if following_subwords is not None:
-                    possible_solution.extend(following_subwords)
-                    possible_solutions.append(possible_solution)
-                if initial_index + len(working_subword) + 2 < len(lemma) and lemma[
-                        initial_index + len(working_subword): initial_index +
-                        len(working_subword) + 2] == 's-':
-                    following_initial_index = initial_index + len(working_subword) + 2
-                elif initial_index + len(working_subword) + 1 < len(lemma) and \
-                        lemma[initial_index + len(working_subword)] == 's':
-                    following_initial_index = initial_index + len(working_subword) + 1
-                else:
-                    continue
-                possible_solution = [PossibleSubword(working_subword, initial_index, 0)]
-                following_subwords = scan_recursively_for_subwords(lemma, following_initial_index)
-                if following_subwords is not None:
-                    for ending in self.fugen_s_ending_whitelist:
+    def score_possible_subwords(self, possible_solution):
+        # Lower scores are better.
+        number = 0
+        for subword in possible_solution:
+            # subwords shorter than minimum_normal_subword_length: penalty of 2
+            if len(subword.text) < self.minimum_normal_subword_length:
+                number += 2 * (self.minimum_normal_subword_length - len(subword.text))
+            # subwords longer than 12: penalty of 2
+            elif len(subword.text) > self.maximum_realistic_subword_length:
+                number += 2 * (len(subword.text) - self.maximum_realistic_subword_length)
+            # fugen-s after a whitelist ending
+            if subword.fugen_s_status == 2:
+                number -= self.fugen_s_after_whitelisted_ending_bonus
+            # fugen-s after an ending that is neither whitelist nor blacklist
+            elif subword.fugen_s_status == 1:
+                number -= self.fugen_s_after_non_whitelisted_non_blacklisted_ending_bonus
+        return number
+
+    def scan_recursively_for_subwords(self, lemma, initial_index=0):
+
+        if initial_index == 0: # only need to check on the initial (outermost) call
+            for char in lemma:
+                if not char.isalpha() and char != '-':
+                    return None
+        if initial_index + 1 < len(lemma) and lemma[initial_index] == '-':
+            return self.scan_recursively_for_subwords(lemma, initial_index + 1)
+        lengths = list(range(self.minimum_subword_length, 1 + len(lemma) - initial_index))
+        possible_solutions = []
+        working_subword = None
+        for length in lengths:
+            if working_subword is not None and len(working_subword) >= length:
+                # we are catching up with the length already returned by get_subword
+                continue
+            working_subword = self.get_subword(lemma, initial_index, length)
+            if working_subword is None or working_subword in self.subword_blacklist or \
+                    '-' in working_subword:
+                continue
+            possible_solution = [PossibleSubword(working_subword, initial_index, 0)]
+            if \
+                    (
+                        initial_index + len(working_subword) == len(lemma)) or (
+                            initial_index + len(working_subword)
+                        + 1 == len(lemma) and lemma[-1] == '-') \
+                    or (
+                        initial_index + len(working_subword) + 2 == len(lemma) and lemma[-2:] ==
+                        's-'):
+                # we have reached the end of the word
+                possible_solutions.append(possible_solution)
+                break
+            following_subwords = self.scan_recursively_for_subwords(
+                lemma, initial_index + len(working_subword))
+            if following_subwords is not None:
+                possible_solution.extend(following_subwords)
+                possible_solutions.append(possible_solution)
+            if initial_index + len(working_subword) + 2 < len(lemma) and lemma[
+                    initial_index + len(working_subword): initial_index +
+                    len(working_subword) + 2] == 's-':
+                following_initial_index = initial_index + len(working_subword) + 2
+            elif initial_index + len(working_subword) + 1 < len(lemma) and \
+                    lemma[initial_index + len(working_subword)] == 's':
+                following_initial_index = initial_index + len(working_subword) + 1
+            else:
+                continue
+            possible_solution = [PossibleSubword(working_subword, initial_index, 0)]
+            following_subwords = self.scan_recursively_for_subwords(lemma, following_initial_index)
+            if following_subwords is not None:
+                for ending in self.fugen_s_ending_whitelist:
+                    if working_subword.endswith(ending):
+                        following_subwords[0].fugen_s_status = 2
+                if following_subwords[0].fugen_s_status == 0 and len(working_subword) >= \
+                        self.fugen_s_whitelist_bonus_surrounding_word_minimum_length and \
+                        len(following_subwords[0].text) >= \
+                        self.fugen_s_whitelist_bonus_surrounding_word_minimum_length:
+                    # if the first does not have a whitelist ending and one of the words is
+                    # short, do not give the score bonus
+                    following_subwords[0].fugen_s_status = 1
+                    for ending in self.fugen_s_ending_blacklist:
+                        # blacklist ending: take the bonus away again
                         if working_subword.endswith(ending):
-                            following_subwords[0].fugen_s_status = 2
-                    if following_subwords[0].fugen_s_status == 0 and len(working_subword) >= \
-                            self.fugen_s_whitelist_bonus_surrounding_word_minimum_length and \
-                            len(following_subwords[0].text) >= \
-                            self.fugen_s_whitelist_bonus_surrounding_word_minimum_length:
-                        # if the first does not have a whitelist ending and one of the words is
-                        # short, do not give the score bonus
-                        following_subwords[0].fugen_s_status = 1
-                        for ending in self.fugen_s_ending_blacklist:
-                            # blacklist ending: take the bonus away again
-                            if working_subword.endswith(ending):
-                                following_subwords[0].fugen_s_status = 0
-                    possible_solution.extend(following_subwords)
-                    possible_solutions.append(possible_solution)
-            if len(possible_solutions) > 0:
-                possible_solutions = sorted(
-                    possible_solutions, key=score)
-                return possible_solutions[0]
+                            following_subwords[0].fugen_s_status = 0
+                possible_solution.extend(following_subwords)
+                possible_solutions.append(possible_solution)
+        if len(possible_solutions) > 0:
+            possible_solutions = sorted(
+                possible_solutions, key=self.score_possible_subwords)
+            return possible_solutions[0]
+
+    def get_lemmatization_string(self, possible_subwords, pos):
+        """ We retrieve the lemma for each subword by calling spaCy. To reduce the
+            overhead, we concatenate the subwords in the form:
+            Subword1. Subword2. Subword3
+        """
+        entry_words = []
+        for counter, _ in enumerate(possible_subwords):
+            if counter + 1 == len(possible_subwords) and pos == 'ADJ':
+                entry_words.append(possible_subwords[counter].text)
+            else:
+                entry_words.append(possible_subwords[counter].text.capitalize())
+        return ' . '.join(entry_words)
+
+    def is_subword_search_candidate(self, token):
+        return (token.tag_ in self.tag_for_subword_search or token.pos_ in
+                self.pos_for_subword_search) and not (
+                len(token._.holmes.lemma) < self.minimum_length_for_subword_search and
+                '-' not in token._.holmes.lemma) and token._.holmes.lemma not in punctuation
+
+    def lemmatize_subwords(self, spacy_doc, subword_cache):
+        """ Finds the words within *spacy_doc* whose subwords are not yet cached and lemmatizes
+            the candidate subwords of all of them in a single *nlp.pipe()* batch.
+        """
+        lemmatization_strings = set()
+        for token in spacy_doc:
+            if not self.is_subword_search_candidate(token) or \
+                    (token.text, token.pos_) in subword_cache:
+                continue
+            possible_subwords = self.scan_recursively_for_subwords(token._.holmes.lemma)
+            if possible_subwords is None or self.score_possible_subwords(possible_subwords) > \
+                    self.maximum_acceptable_subword_score:
+                continue
+            if len(possible_subwords) == 1 and token._.holmes.lemma.isalpha():
+                continue
+            lemmatization_strings.add(self.get_lemmatization_string(possible_subwords, token.pos_))
+        if len(lemmatization_strings) == 0:
+            return {}
+        lemmatization_strings = list(lemmatization_strings)
+        return dict(zip(lemmatization_strings, self.nlp.pipe(
+            lemmatization_strings, disable=['coreferee', 'holmes'])))
+
+    def add_subwords(self, token, subword_cache, lemmatization_strings_to_docs):
+        """ Adds any subwords to *token._.holmes*. """
 
         def get_lemmatization_doc(possible_subwords, pos):
-            # We retrieve the lemma for each subword by calling spaCy. To reduce the
-            # overhead, we concatenate the subwords in the form:
-            # Subword1. Subword2. Subword3
-            entry_words = []
-            for counter, _ in enumerate(possible_subwords):
-                if counter + 1 == len(possible_subwords) and pos == 'ADJ':
-                    entry_words.append(possible_subwords[counter].text)
-                else:
-                    entry_words.append(possible_subwords[counter].text.capitalize())
-            subword_lemmatization_string = ' . '.join(entry_words)
+            subword_lemmatization_string = self.get_lemmatization_string(possible_subwords, pos)
+            if subword_lemmatization_string in lemmatization_strings_to_docs:
+                return lemmatization_strings_to_docs[subword_lemmatization_string]
             return self.spacy_parse(subword_lemmatization_string)
 
-        if not (token.tag_ in self.tag_for_subword_search or token.pos_ in
-                self.pos_for_subword_search) or (
-                len(token._.holmes.lemma) < self.minimum_length_for_subword_search and
-                '-' not in token._.holmes.lemma) or token._.holmes.lemma in punctuation:
+        if not self.is_subword_search_candidate(token):
             return
-        if token.text in subword_cache:
-            cached_subwords = subword_cache[token.text]
-            for cached_subword in cached_subwords:
+        cache_key = (token.text, token.pos_)
+        cached_subwords = subword_cache.get(cache_key)
+        if cached_subwords is not None:
+            for index, text, lemma, derived_lemma, char_start_index, dependent_index, \
+                    dependency_label, governor_index, governing_dependency_label in \
+                    cached_subwords:
                 token._.holmes.subwords.append(Subword(
-                    token.i, cached_subword.index, cached_subword.text, cached_subword.lemma,
-                    cached_subword.derived_lemma, self.get_vector(cached_subword.lemma),
-                    cached_subword.char_start_index, cached_subword.dependent_index,
-                    cached_subword.dependency_label, cached_subword.governor_index,
-                    cached_subword.governing_dependency_label))
+                    token.i, index, text, lemma, derived_lemma, self.vectors_nlp.vocab,
+                    char_start_index, dependent_index, dependency_label, governor_index,
+                    governing_dependency_label))
         else:
             working_subwords = []
-            possible_subwords = scan_recursively_for_subwords(token._.holmes.lemma)
-            if possible_subwords is None or score(possible_subwords) > \
+            possible_subwords = self.scan_recursively_for_subwords(token._.holmes.lemma)
+            if possible_subwords is None or self.score_possible_subwords(possible_subwords) > \
                     self.maximum_acceptable_subword_score:
                 return
             if len(possible_subwords) == 1 and token._.holmes.lemma.isalpha():
                 # not ... isalpha(): hyphenation
-                subword_cache[token.text] = []
+                subword_cache.put(cache_key, ())
             else:
                 index = 0
                 if token._.holmes.lemma[0] == '-':
@@ -320,7 +352,7 @@ class LanguageSpecificSemanticAnalyzer(SemanticAnalyzer):
                         indexes = token._.holmes.get_sibling_indexes(token.doc)
                         first_sibling = token.doc[indexes[0]]
                         first_sibling_possible_subwords = \
-                                scan_recursively_for_subwords(first_sibling._.holmes.lemma)
+                                self.scan_recursively_for_subwords(first_sibling._.holmes.lemma)
                         if first_sibling_possible_subwords is not None:
                             first_sibling_lemmatization_doc = get_lemmatization_doc(
                                 first_sibling_possible_subwords, token.pos_)
@@ -344,7 +376,7 @@ class LanguageSpecificSemanticAnalyzer(SemanticAnalyzer):
                                 derived_lemma = self.derived_holmes_lemma(None, lemma)
                                 working_subwords.append(Subword(
                                     first_sibling.i, index, text, lemma, derived_lemma,
-                                    self.get_vector(lemma),
+                                    self.vectors_nlp.vocab,
                                     first_sibling_possible_subword.char_start_index,
                                     None, None, None, None))
                                 index += 1
@@ -359,7 +391,7 @@ class LanguageSpecificSemanticAnalyzer(SemanticAnalyzer):
                     lemma = lemmatization_doc[counter*2].lemma_.lower()
                     derived_lemma = self.derived_holmes_lemma(None, lemma)
                     working_subwords.append(Subword(
-                        token.i, index, text, lemma, derived_lemma, self.get_vector(lemma),
+                        token.i, index, text, lemma, derived_lemma, self.vectors_nlp.vocab,
                         possible_subword.char_start_index, None, None, None, None))
                     index += 1
                 if token._.holmes.lemma[-1] == '-':
@@ -372,7 +404,7 @@ class LanguageSpecificSemanticAnalyzer(SemanticAnalyzer):
                         if token.i != last_sibling_index:
                             last_sibling = token.doc[last_sibling_index]
                             last_sibling_possible_subwords = \
-                                scan_recursively_for_subwords(last_sibling._.holmes.lemma)
+                                self.scan_recursively_for_subwords(last_sibling._.holmes.lemma)
                             if last_sibling_possible_subwords is not None:
                                 last_sibling_lemmatization_doc = get_lemmatization_doc(
                                     last_sibling_possible_subwords, token.pos_)
@@ -390,7 +422,7 @@ class LanguageSpecificSemanticAnalyzer(SemanticAnalyzer):
                                     derived_lemma = self.derived_holmes_lemma(None, lemma)
                                     working_subwords.append(Subword(
                                         last_sibling.i, index, text, lemma, derived_lemma,
-                                        self.get_vector(lemma),
+                                        self.vectors_nlp.vocab,
                                         last_sibling_possible_subword.char_start_index,
                                         None, None, None, None))
                                     index += 1
@@ -413,12 +445,17 @@ class LanguageSpecificSemanticAnalyzer(SemanticAnalyzer):
                         token._.holmes.subwords.append(Subword(
                             working_subword.containing_token_index,
                             working_subword.index, working_subword.text, working_subword.lemma,
-                            working_subword.derived_lemma, self.get_vector(working_subword.lemma),
+                            working_subword.derived_lemma, self.vectors_nlp.vocab,
                             working_subword.char_start_index,
                             dependent_index, dependency_label, governor_index,
                             governing_dependency_label))
                 if token._.holmes.lemma.isalpha(): # caching only where no hyphenation
-                    subword_cache[token.text] = token._.holmes.subwords
+                    subword_cache.put(cache_key, tuple((
+                        subword.index, subword.text, subword.lemma, subword.derived_lemma,
+                        subword.char_start_index, subword.dependent_index,
+                        subword.dependency_label, subword.governor_index,
+                        subword.governing_dependency_label)
+                        for subword in token._.holmes.subwords))
         if len(token._.holmes.subwords) > 1 and 'nicht' in (
                 subword.lemma for subword in token._.holmes.subwords):
             token._.holmes.is_negated = True
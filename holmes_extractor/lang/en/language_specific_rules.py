@@ -103,7 +103,7 @@ class LanguageSpecificSemanticAnalyzer(SemanticAnalyzer):
 
     whose_lemma = 'whose'
 
-    def add_subwords(self, token, subword_cache):
+    def add_subwords(self, token, subword_cache, lemmatization_strings_to_docs):
         """ Analyses the internal structure of the word to find atomic semantic elements. Is
             relevant for German but not implemented for English.
         """
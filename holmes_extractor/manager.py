@@ -1,10 +1,19 @@
-from multiprocessing import Process, Queue, Manager as MultiprocessingManager, cpu_count
-from threading import Lock
+from multiprocessing import Process, cpu_count, get_context
+from threading import Lock, RLock, Thread
+from queue import Queue, Empty
 from string import punctuation
 from math import sqrt
+from bisect import bisect_left
+from time import perf_counter
 import traceback
 import sys
 import os
+import mmap
+import pickle
+import tempfile
+from inspect import signature
+from collections import OrderedDict
+from copy import deepcopy
 import jsonpickle
 import pkg_resources
 import spacy
@@ -13,16 +22,32 @@ from spacy import Language
 from spacy.tokens import Doc, Token
 from thinc.api import Config
 from .errors import *
-from .matching import StructuralMatcher
+from .matching import StructuralMatcher, CorpusEmbeddingMatrix
 from .ontology import Ontology
 from .parsing import SemanticAnalyzerFactory, SemanticAnalyzer, SemanticMatchingHelperFactory,\
-    LinguisticObjectFactory, SearchPhrase, SERIALIZED_DOCUMENT_VERSION
+    LinguisticObjectFactory, SearchPhrase, DocumentLabelIndex, DependencyEdgeIndex,\
+    SearchPhraseIndex, SERIALIZED_DOCUMENT_VERSION, READABLE_SERIALIZED_DOCUMENT_VERSIONS,\
+    serialize_holmes_document, deserialize_holmes_document
 from .classification import SupervisedTopicTrainingBasis, SupervisedTopicClassifier,\
     SupervisedTopicClassifierModel
 from .topic_matching import TopicMatcher, TopicMatchDictionaryOrderer
 from .consoles import HolmesConsoles
 
 TIMEOUT_SECONDS = 180
+# How often the liveness of parser processes is checked while waiting for their replies
+PARSER_CHECK_INTERVAL_SECONDS = 1
+MAXIMUM_PHRASELET_SEARCH_PHRASE_CACHE_SIZE = 10000
+# Used to estimate the number of tokens in serialized documents before any worker has reported
+# the size of a document it registered
+DEFAULT_SERIALIZED_DOCUMENT_BYTES_PER_TOKEN = 200
+# A document arena is rewritten once removed documents account for at least this many bytes
+# and at least half of the file
+MINIMUM_DOCUMENT_ARENA_DEAD_BYTES_FOR_COMPACTION = 16 * 1024 * 1024
+SNAPSHOT_VERSION = '1.0'
+SNAPSHOT_MANAGER_FILENAME = 'manager.snapshot'
+# The upper bounds of the buckets of the latency histograms maintained by each worker for each
+# method; the last bucket holds the calls that took longer than the highest bound
+LATENCY_HISTOGRAM_BOUNDS_SECONDS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
 
 absolute_config_filename = pkg_resources.resource_filename(__name__, 'config.cfg')
 config = Config().from_disk(absolute_config_filename)
@@ -42,6 +67,15 @@ def get_nlp(model_name:str) -> Language:
                 model_names_to_nlps[model_name] = spacy.load(model_name)
         return model_names_to_nlps[model_name]
 
+def get_holmes_nlp(model_name:str) -> Language:
+    nlp = get_nlp(model_name)
+    with pipeline_components_lock:
+        if not nlp.has_pipe('coreferee'):
+            nlp.add_pipe('coreferee')
+        if not nlp.has_pipe('holmes'):
+            nlp.add_pipe('holmes')
+    return nlp
+
 def get_semantic_analyzer(nlp:Language) -> SemanticAnalyzer:
     global MODEL_NAMES_TO_SEMANTIC_ANALYZERS
     model_name = '_'.join((nlp.meta['lang'], nlp.meta['name']))
@@ -53,6 +87,170 @@ def get_semantic_analyzer(nlp:Language) -> SemanticAnalyzer:
                 SemanticAnalyzerFactory().semantic_analyzer(nlp=nlp, vectors_nlp=vectors_nlp)
         return MODEL_NAMES_TO_SEMANTIC_ANALYZERS[model_name]
 
+class DocumentArena:
+    """An append-only file of serialized documents written by a single process. Each document is
+        identified by a location *(filename, offset, length)* that can be sent to other processes
+        in place of the document itself.
+
+    Parameters:
+
+    directory -- the directory in which to create the file.
+    """
+
+    def __init__(self, directory):
+        file_descriptor, self.filename = tempfile.mkstemp(
+            prefix='holmes-', suffix='.documents', dir=directory)
+        self.file = os.fdopen(file_descriptor, 'wb')
+        self.lock = Lock()
+
+    def append(self, serialized_doc):
+        """ Writes *serialized_doc* to the arena and returns its location. """
+        with self.lock:
+            offset = self.file.tell()
+            self.file.write(serialized_doc)
+            self.file.flush()
+        return self.filename, offset, len(serialized_doc)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+class DocumentArenaReader:
+    """Reads serialized documents from document arenas. Each arena file is memory-mapped once
+        per process, so that the operating system shares its pages between all processes reading
+        it; the mapping is renewed when a location beyond its end is requested.
+    """
+
+    def __init__(self):
+        self.filenames_to_mmaps = {}
+        self.lock = Lock()
+
+    def read(self, location):
+        """ Returns the serialized document at *location*. """
+        filename, offset, length = location
+        with self.lock:
+            working_mmap = self.filenames_to_mmaps.get(filename)
+            if working_mmap is None or len(working_mmap) < offset + length:
+                if working_mmap is not None:
+                    working_mmap.close()
+                with open(filename, 'rb') as file:
+                    working_mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                self.filenames_to_mmaps[filename] = working_mmap
+            return working_mmap[offset:offset + length]
+
+    def close(self):
+        with self.lock:
+            for working_mmap in self.filenames_to_mmaps.values():
+                working_mmap.close()
+            self.filenames_to_mmaps = {}
+
+class StopRouting:
+    """Put on the reply queue by *ReplyRouter.close()* in place of a request id to stop the
+        routing thread. A class is used rather than a sentinel object because the queue pickles
+        what it transports, so that only the type and not the identity survives.
+    """
+
+class ReplyRouter:
+    """Distributes the replies that the worker and parser processes put on a single reply queue
+        to the threads in the manager process that are waiting for them. Each request is identified
+        by a request id that is sent to the worker processes with the message and returned with the
+        reply. Replies to requests that are no longer open, e.g. because they timed out, are
+        discarded.
+
+    Parameters:
+
+    reply_queue -- the queue shared by the manager process and the worker and parser processes.
+    """
+
+    def __init__(self, reply_queue):
+        self.reply_queue = reply_queue
+        self.request_ids_to_local_queues = {}
+        self.next_request_id = 0
+        self.lock = Lock()
+        self.thread = Thread(target=self.route, daemon=True)
+        self.thread.start()
+
+    def open_request(self):
+        """ Returns a new request id whose replies can then be retrieved with *get()*. """
+        with self.lock:
+            request_id = self.next_request_id
+            self.next_request_id += 1
+            self.request_ids_to_local_queues[request_id] = Queue()
+        return request_id
+
+    def get(self, request_id, timeout):
+        return self.request_ids_to_local_queues[request_id].get(timeout=timeout)
+
+    def close_request(self, request_id):
+        with self.lock:
+            self.request_ids_to_local_queues.pop(request_id, None)
+
+    def close(self):
+        """ Stops the routing thread once the replies already on the queue have been routed. """
+        self.reply_queue.put((StopRouting(), None), timeout=TIMEOUT_SECONDS)
+        self.thread.join(TIMEOUT_SECONDS)
+
+    def route(self):
+        while True:
+            request_id, reply = self.reply_queue.get()
+            if isinstance(request_id, StopRouting):
+                return
+            with self.lock:
+                local_queue = self.request_ids_to_local_queues.get(request_id)
+            if local_queue is not None:
+                local_queue.put(reply)
+
+class TopicMatchCache:
+    """A size-bounded least-recently-used cache of topic match results. Keys include the
+        corpus generation so that results are never returned once documents have been registered
+        or removed. Results are copied on the way in and out so that callers cannot change them.
+
+    Parameters:
+
+    maximum_size -- the maximum number of results to hold, or *0* if nothing should be cached.
+    """
+
+    def __init__(self, maximum_size):
+        self.maximum_size = maximum_size
+        self.keys_to_results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = Lock()
+
+    def get(self, key):
+        """ Returns the result for *key*, or *None* if no result is cached. """
+        if self.maximum_size == 0:
+            return None
+        with self.lock:
+            if key in self.keys_to_results:
+                self.keys_to_results.move_to_end(key)
+                self.hits += 1
+                return deepcopy(self.keys_to_results[key])
+            self.misses += 1
+            return None
+
+    def put(self, key, result):
+        if self.maximum_size == 0:
+            return
+        result = deepcopy(result)
+        with self.lock:
+            self.keys_to_results[key] = result
+            self.keys_to_results.move_to_end(key)
+            while len(self.keys_to_results) > self.maximum_size:
+                self.keys_to_results.popitem(last=False)
+                self.evictions += 1
+
+    def get_statistics(self):
+        with self.lock:
+            return {
+                'size': len(self.keys_to_results),
+                'maximum_size': self.maximum_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
 class Manager:
     """The facade class for the Holmes library.
 
@@ -79,6 +277,20 @@ class Manager:
         processes should depend on the number of available cores. Defaults to *None*
     verbose -- a boolean value specifying whether multiprocessing messages should be outputted to
         the console. Defaults to *False*
+    subword_cache_filename -- the name of a file previously written by *save_subword_cache()*
+        from which the subword cache should be warm-loaded, or *None*. Nothing is loaded if the
+        file does not exist. Defaults to *None*.
+    document_store_directory -- a directory, typically on a memory-backed file system such as
+        */dev/shm*, in which serialized documents should be held in memory-mapped files shared
+        by this process and the worker processes, or *None* if serialized documents should be
+        sent to the worker processes through their queues. Files in which most of the space
+        belongs to removed documents are rewritten. Defaults to *None*.
+    topic_match_cache_size -- the maximum number of results of *topic_match_documents_against()*
+        to cache, or *0* if results should not be cached. Defaults to *0*.
+    snapshot -- a directory previously written by *save_snapshot()* from which the documents,
+        corpus indexes and corpus frequencies should be loaded, or *None*. The manager must use
+        the same model, ontology and derivational morphology setting as the manager that saved
+        the snapshot, but may use a different number of workers. Defaults to *None*.
     """
 
     def __init__(
@@ -86,15 +298,16 @@ class Manager:
             embedding_based_matching_on_root_words:bool=False, ontology:Ontology=None,
             analyze_derivational_morphology:bool=True, perform_coreference_resolution:bool=True,
             use_reverse_dependency_matching:bool=True, number_of_workers:int=None,
-            verbose:bool=False):
+            verbose:bool=False, subword_cache_filename:str=None,
+            document_store_directory:str=None, topic_match_cache_size:int=0, snapshot:str=None):
         self.verbose = verbose
-        self.nlp = get_nlp(model)
-        with pipeline_components_lock:
-            if not self.nlp.has_pipe('coreferee'):
-                self.nlp.add_pipe('coreferee')
-            if not self.nlp.has_pipe('holmes'):
-                self.nlp.add_pipe('holmes')
+        self.model = model
+        self.nlp = get_holmes_nlp(model)
         self.semantic_analyzer = get_semantic_analyzer(self.nlp)
+        self.subword_cache_filename = subword_cache_filename
+        if subword_cache_filename is not None and os.path.isfile(subword_cache_filename):
+            self.semantic_analyzer.subword_cache.load(
+                subword_cache_filename, self.semantic_analyzer.model)
         if not self.semantic_analyzer.model_supports_embeddings():
             overall_similarity_threshold = 1.0
         if overall_similarity_threshold < 0.0 or overall_similarity_threshold > 1.0:
@@ -125,6 +338,7 @@ class Manager:
             self.semantic_analyzer.get_entity_label_to_vector_dict() if
             self.semantic_analyzer.model_supports_embeddings() else {})
         self.document_labels_to_worker_queues = {}
+        self.document_label_index = DocumentLabelIndex()
         self.search_phrases = []
         HolmesBroker.set_extensions()
         for phraselet_template in self.semantic_matching_helper.phraselet_templates:
@@ -136,27 +350,73 @@ class Manager:
             raise ValueError('number_of_workers must be a positive integer.')
         self.number_of_workers = number_of_workers
         self.next_worker_to_use = 0
-        self.multiprocessing_manager = MultiprocessingManager()
+        # New documents are placed on the worker holding the fewest tokens. The size of a document
+        # is estimated when it is placed and replaced by the actual numbers of tokens and
+        # corpus index postings once its worker has registered it.
+        self.worker_token_counts = [0] * number_of_workers
+        self.worker_posting_counts = [0] * number_of_workers
+        self.document_labels_to_sizes = {}
+        self.serialized_document_bytes = 0
+        self.serialized_document_tokens = 0
         self.worker = Worker() # will be copied to worker processes by value (Windows) or
                                 # by reference (Linux)
         self.workers = []
         self.input_queues = []
+        self.worker_labels = []
+        # Corpus frequencies are updated with the changes reported by the workers when documents
+        # are registered or removed. They are only rebuilt from the workers' corpus indexes if
+        # a worker failed to report changes.
         self.word_dictionaries_need_rebuilding = False
         self.words_to_corpus_frequencies = {}
         self.maximum_corpus_frequency = 0
-
+        self.maximum_corpus_frequency_needs_recalculating = False
+        if topic_match_cache_size < 0:
+            raise ValueError('topic_match_cache_size must not be negative.')
+        self.topic_match_cache = TopicMatchCache(topic_match_cache_size)
+        self.corpus_generation = 0 # incremented once documents have been registered or removed
+        # Search phrases created from topic matching phraselets are cached by key both here and
+        # within the worker processes. The worker caches are kept identical to this cache by
+        # sending them the new and evicted keys together with each query.
+        self.phraselet_search_phrase_cache = OrderedDict()
+        self.phraselet_search_phrase_cache_lock = Lock()
+        self.document_store_directory = document_store_directory
+        self.document_labels_to_arena_locations = {}
+        self.document_arena_filenames = set()
+        # the number of bytes in each arena file that belong to documents no longer registered
+        self.document_arena_filenames_to_dead_bytes = {}
+        # registrations whose workers may still have to read the current arena, which must not
+        # be deleted in the meantime
+        self.arena_registrations_in_progress = 0
+        if document_store_directory is not None:
+            self.document_arena = DocumentArena(document_store_directory)
+            self.document_arena_filenames.add(self.document_arena.filename)
+            self.document_arena_reader = DocumentArenaReader()
+        else:
+            self.document_arena = None
+
+        # The input queues are created in the spawn context so that they can also be passed to
+        # the parser processes started by parse_and_register_documents()
+        spawn_context = get_context('spawn')
+        # Replies from all worker and parser processes are sent to a single queue and distributed
+        # to the waiting threads by *reply_router*
+        self.reply_queue = spawn_context.Queue()
+        self.reply_router = ReplyRouter(self.reply_queue)
         for counter in range(0, self.number_of_workers):
-            input_queue = Queue()
+            input_queue = spawn_context.Queue()
             self.input_queues.append(input_queue)
             worker_label = ' '.join(('Worker', str(counter)))
+            self.worker_labels.append(worker_label)
             this_worker = Process(
                 target=self.worker.listen, args=(
-                self.structural_matcher, self.overall_similarity_threshold, self.nlp.vocab, model,
-                SERIALIZED_DOCUMENT_VERSION, input_queue, worker_label),
+                self.structural_matcher, self.overall_similarity_threshold, self.nlp.vocab,
+                self.semantic_analyzer.vectors_nlp.vocab, model,
+                READABLE_SERIALIZED_DOCUMENT_VERSIONS, input_queue, self.reply_queue, worker_label),
                 daemon=True)
             self.workers.append(this_worker)
             this_worker.start()
-        self.lock = Lock()
+        self.lock = RLock() # reentrant because rebalance() waits for replies while holding it
+        if snapshot is not None:
+            self.load_snapshot(snapshot)
 
     def next_worker_queue_number(self):
         self.next_worker_to_use += 1
@@ -164,11 +424,118 @@ class Manager:
             self.next_worker_to_use = 0
         return self.next_worker_to_use
 
-    def handle_response(self, reply_queue, number_of_messages, method_name):
+    def place_document(self, label, estimated_number_of_tokens):
+        """ Assigns a new document to the worker currently holding the fewest tokens and returns
+            the number of that worker's queue. Must be called with *self.lock* held.
+        """
+        worker_queue_number = min(
+            range(self.number_of_workers), key=lambda index: self.worker_token_counts[index])
+        self.document_labels_to_worker_queues[label] = worker_queue_number
+        self.document_label_index.add(label)
+        self.set_document_size(label, estimated_number_of_tokens, 0)
+        return worker_queue_number
+
+    def estimate_number_of_tokens(self, serialized_doc):
+        if self.serialized_document_tokens == 0:
+            return len(serialized_doc) // DEFAULT_SERIALIZED_DOCUMENT_BYTES_PER_TOKEN
+        return len(serialized_doc) * self.serialized_document_tokens // \
+            self.serialized_document_bytes
+
+    def set_document_size(self, label, number_of_tokens, number_of_postings):
+        """ Records the size of a document and adds the change to the load of the worker that
+            holds it. Must be called with *self.lock* held.
+        """
+        worker_queue_number = self.document_labels_to_worker_queues[label]
+        old_number_of_tokens, old_number_of_postings = self.document_labels_to_sizes.get(
+            label, (0, 0))
+        self.worker_token_counts[worker_queue_number] += number_of_tokens - old_number_of_tokens
+        self.worker_posting_counts[worker_queue_number] += \
+            number_of_postings - old_number_of_postings
+        self.document_labels_to_sizes[label] = (number_of_tokens, number_of_postings)
+
+    def forget_document(self, label):
+        """ Removes a document from the manager's records and returns the number of the queue of
+            the worker that held it. Must be called with *self.lock* held.
+        """
+        self.set_document_size(label, 0, 0)
+        del self.document_labels_to_sizes[label]
+        self.document_label_index.remove(label)
+        location = self.document_labels_to_arena_locations.pop(label, None)
+        if location is not None:
+            self.record_dead_document_arena_bytes(location)
+        return self.document_labels_to_worker_queues.pop(label)
+
+    def record_dead_document_arena_bytes(self, location):
+        """ Records that the document at *location* is no longer needed. Must be called with
+            *self.lock* held.
+        """
+        filename, _, length = location
+        self.document_arena_filenames_to_dead_bytes[filename] = \
+            self.document_arena_filenames_to_dead_bytes.get(filename, 0) + length
+
+    def compact_document_arenas(self):
+        """ Copies the documents still registered from each arena file in which removed
+            documents account for at least *MINIMUM_DOCUMENT_ARENA_DEAD_BYTES_FOR_COMPACTION* bytes
+            and at least half of the file to the current arena and deletes the file, starting a
+            new current arena first if the current arena is among those to be compacted. Nothing
+            is done while registrations are in progress, as their workers may not yet have read
+            the current arena. Must be called with *self.lock* held.
+        """
+        if self.document_arena is None or self.arena_registrations_in_progress > 0:
+            return
+        filenames_to_compact = set()
+        for filename, dead_bytes in self.document_arena_filenames_to_dead_bytes.items():
+            if dead_bytes < MINIMUM_DOCUMENT_ARENA_DEAD_BYTES_FOR_COMPACTION:
+                continue
+            try:
+                if 2 * dead_bytes >= os.path.getsize(filename):
+                    filenames_to_compact.add(filename)
+            except OSError:
+                filenames_to_compact.add(filename)
+        if len(filenames_to_compact) == 0:
+            return
+        if self.document_arena.filename in filenames_to_compact:
+            self.document_arena.close()
+            self.document_arena = DocumentArena(self.document_store_directory)
+            self.document_arena_filenames.add(self.document_arena.filename)
+        for label, location in self.document_labels_to_arena_locations.items():
+            if location[0] in filenames_to_compact:
+                self.document_labels_to_arena_locations[label] = self.document_arena.append(
+                    self.document_arena_reader.read(location))
+        # The workers map the arena files when they register documents and must release the
+        # mappings for the memory of the deleted files to be freed
+        request_id = self.reply_router.open_request()
+        for worker_index in range(self.number_of_workers):
+            self.input_queues[worker_index].put((
+                self.worker.release_document_arenas, None, request_id), timeout=TIMEOUT_SECONDS)
+        self.handle_response(request_id, self.number_of_workers, 'compact_document_arenas')
+        self.document_arena_reader.close()
+        for filename in filenames_to_compact:
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            self.document_arena_filenames.discard(filename)
+            del self.document_arena_filenames_to_dead_bytes[filename]
+
+    def handle_response(self, request_id, number_of_messages, method_name, parsers=None):
+        """ Waits for *number_of_messages* replies to *request_id* and returns the values
+            returned by the calls that succeeded. Where *parsers* is not *None*, it is a list of
+            parser processes that send messages on behalf of the request; a *ParserProcessError*
+            is raised as soon as one of them has exited without reporting its documents, e.g.
+            because it was killed.
+        """
+        try:
+            if parsers is None:
+                replies = [self.reply_router.get(request_id, TIMEOUT_SECONDS) for _ in
+                    range(number_of_messages)]
+            else:
+                replies = self.get_replies_from_parsers(request_id, number_of_messages, parsers)
+        finally:
+            self.reply_router.close_request(request_id)
         return_values = []
         exception_worker_label = None
-        for _ in range(number_of_messages):
-            worker_label, return_value, return_info = reply_queue.get(timeout=TIMEOUT_SECONDS)
+        for worker_label, return_value, return_info in replies:
             if isinstance(return_info, (WrongModelDeserializationError,
                     WrongVersionDeserializationError)):
                 raise return_info
@@ -187,24 +554,122 @@ class Manager:
                 '. Please examine the output from the worker processes to identify the problem.')))
         return return_values
 
+    def get_replies_from_parsers(self, request_id, number_of_messages, parsers):
+        replies = []
+        last_reply_time = perf_counter()
+        while len(replies) < number_of_messages:
+            try:
+                replies.append(self.reply_router.get(request_id, PARSER_CHECK_INTERVAL_SECONDS))
+                last_reply_time = perf_counter()
+            except Empty:
+                # A parser that fails with an exception still reports its documents and exits
+                # normally, so any other exit code means that replies will never arrive
+                for parser in parsers:
+                    if parser.exitcode is not None and parser.exitcode != 0:
+                        raise ParserProcessError(' '.join((
+                            parser.name, 'exited with code', str(parser.exitcode))))
+                if perf_counter() - last_reply_time >= TIMEOUT_SECONDS:
+                    raise
+        return replies
+
     def register_serialized_documents(self, document_dictionary:dict[str, Doc]) -> None:
         """Parameters:
 
         document_dictionary -- a dictionary from labels to serialized documents.
         """
-        reply_queue = self.multiprocessing_manager.Queue()
         with self.lock:
-            for label, serialized_doc in document_dictionary.items():
+            for label in document_dictionary:
                 if label in self.document_labels_to_worker_queues:
                     raise DuplicateDocumentError(label)
+            request_id = self.reply_router.open_request()
+            for label, serialized_doc in document_dictionary.items():
+                worker_queue_number = self.place_document(
+                    label, self.estimate_number_of_tokens(serialized_doc))
+                if self.document_arena is not None:
+                    location = self.document_arena.append(serialized_doc)
+                    self.document_labels_to_arena_locations[label] = location
+                    self.input_queues[worker_queue_number].put((
+                        self.worker.register_document_from_arena,
+                        (location, label), request_id), TIMEOUT_SECONDS)
                 else:
-                    worker_queue_number = self.next_worker_queue_number()
-                    self.document_labels_to_worker_queues[label] = worker_queue_number
-                    self.word_dictionaries_need_rebuilding = True
                     self.input_queues[worker_queue_number].put((
                         self.worker.register_serialized_document,
-                        (serialized_doc, label), reply_queue), TIMEOUT_SECONDS)
-        self.handle_response(reply_queue, len(document_dictionary), 'register_serialized_documents')
+                        (serialized_doc, label), request_id), TIMEOUT_SECONDS)
+            self.arena_registrations_in_progress += 1
+        return_values = []
+        try:
+            return_values = self.handle_response(
+                request_id, len(document_dictionary), 'register_serialized_documents')
+        finally:
+            with self.lock:
+                self.arena_registrations_in_progress -= 1
+                self.corpus_generation += 1
+                self.record_registrations(return_values, document_dictionary.keys())
+                for label, _, _, number_of_tokens, _ in return_values:
+                    self.serialized_document_bytes += len(document_dictionary[label])
+                    self.serialized_document_tokens += number_of_tokens
+                self.compact_document_arenas()
+
+    def record_registrations(self, return_values, labels):
+        """ Applies the corpus frequency changes, document sizes and document arena locations
+            returned by the workers for newly registered documents. The documents among *labels*,
+            the labels whose registration was requested, for which no worker reported a
+            registration are forgotten, so that the labels can be registered again. Must be called
+            with *self.lock* held.
+        """
+        self.update_corpus_frequencies(
+            [return_value[2] for return_value in return_values], 1)
+        for label, location, _, number_of_tokens, number_of_postings in return_values:
+            if location is not None:
+                self.document_arena_filenames.add(location[0])
+            if label in self.document_labels_to_worker_queues:
+                self.set_document_size(label, number_of_tokens, number_of_postings)
+                if location is not None:
+                    self.document_labels_to_arena_locations[label] = location
+            elif location is not None and location[0] != self.document_arena.filename:
+                # a document written by a parser process was removed before it was registered
+                self.record_dead_document_arena_bytes(location)
+        registered_labels = {return_value[0] for return_value in return_values}
+        worker_queue_numbers_to_unregistered_labels = {}
+        for label in labels:
+            if label not in registered_labels and label in self.document_labels_to_worker_queues:
+                worker_queue_number = self.forget_document(label)
+                if worker_queue_number in worker_queue_numbers_to_unregistered_labels:
+                    worker_queue_numbers_to_unregistered_labels[worker_queue_number].append(label)
+                else:
+                    worker_queue_numbers_to_unregistered_labels[worker_queue_number] = [label]
+        # A worker may still register a document whose reply did not arrive in time; no
+        # reply is awaited as the corpus frequencies are rebuilt in any case
+        for worker_queue_number, worker_labels in \
+                worker_queue_numbers_to_unregistered_labels.items():
+            self.input_queues[worker_queue_number].put((
+                self.worker.discard_documents, (worker_labels,), None), timeout=TIMEOUT_SECONDS)
+        if len(registered_labels) < len(labels):
+            self.word_dictionaries_need_rebuilding = True
+
+    def update_corpus_frequencies(self, words_to_frequency_changes_list, sign):
+        """ Adds (*sign=1*) or subtracts (*sign=-1*) the frequencies in each dictionary in
+            *words_to_frequency_changes_list* from the corpus frequencies. The changes are applied
+            to a copy that then replaces the corpus frequency dictionary, so that a dictionary
+            already returned by *get_corpus_frequency_information()* never changes and always
+            agrees with the maximum returned with it. Must be called with *self.lock* held.
+        """
+        if len(words_to_frequency_changes_list) == 0:
+            return
+        words_to_corpus_frequencies = self.words_to_corpus_frequencies.copy()
+        for words_to_frequency_changes in words_to_frequency_changes_list:
+            for word, frequency_change in words_to_frequency_changes.items():
+                frequency = words_to_corpus_frequencies.get(word, 0)
+                if sign < 0 and frequency == self.maximum_corpus_frequency:
+                    self.maximum_corpus_frequency_needs_recalculating = True
+                frequency += sign * frequency_change
+                if frequency > 0:
+                    words_to_corpus_frequencies[word] = frequency
+                    if frequency > self.maximum_corpus_frequency:
+                        self.maximum_corpus_frequency = frequency
+                else:
+                    words_to_corpus_frequencies.pop(word, None)
+        self.words_to_corpus_frequencies = words_to_corpus_frequencies
 
     def register_serialized_document(self, serialized_document:bytes, label:str) -> None:
         """Note that this function is the most efficient way of loading documents.
@@ -226,39 +691,353 @@ class Manager:
         """
 
         doc = self.nlp(document_text)
-        self.register_serialized_document(doc.to_bytes(), label)
+        self.register_serialized_document(serialize_holmes_document(doc), label)
+
+    def parse_and_register_documents(self, texts_by_label:dict[str, str], batch_size:int=100,
+            n_process:int=1) -> None:
+        """Parses and registers several documents. Where *n_process* is greater than 1, the
+            documents are parsed by a pool of newly started parser processes that each load
+            their own copy of the model and send the serialized documents directly to the
+            worker processes. Because of the time taken to load the model, this is only worthwhile
+            for large numbers of documents. Documents that could not be registered, e.g. because
+            a parser process failed, are not retained, so that their labels can be registered
+            again; a parser process that exits without reporting on its documents causes a
+            *ParserProcessError*.
+
+        Parameters:
+
+        texts_by_label -- a dictionary from labels to raw document texts. Each label must be
+            unique.
+        batch_size -- the number of texts to parse together with *nlp.pipe()*.
+        n_process -- the number of parser processes to use, or *1* if the documents should be
+            parsed in the current process.
+        """
+        if n_process <= 0:
+            raise ValueError('n_process must be a positive integer.')
+        if n_process == 1:
+            labels = list(texts_by_label.keys())
+            with self.lock:
+                for label in labels:
+                    if label in self.document_labels_to_worker_queues:
+                        raise DuplicateDocumentError(label)
+            self.register_serialized_documents({
+                label: serialize_holmes_document(doc) for label, doc in zip(
+                labels, self.nlp.pipe(texts_by_label.values(), batch_size=batch_size))})
+            return
+        with self.lock:
+            for label in texts_by_label:
+                if label in self.document_labels_to_worker_queues:
+                    raise DuplicateDocumentError(label)
+            labels_texts_and_worker_queue_numbers = []
+            for label, text in texts_by_label.items():
+                worker_queue_number = self.place_document(label, len(text.split()))
+                labels_texts_and_worker_queue_numbers.append((label, text, worker_queue_number))
+        request_id = self.reply_router.open_request()
+        spawn_context = get_context('spawn')
+        parsers = []
+        return_values = []
+        try:
+            for counter in range(n_process):
+                parser = spawn_context.Process(
+                    target=parse_documents, args=(
+                    self.model, labels_texts_and_worker_queue_numbers[counter::n_process],
+                    batch_size, self.subword_cache_filename, self.document_store_directory,
+                    self.input_queues, self.reply_queue, request_id,
+                    ' '.join(('Parser', str(counter)))), daemon=True)
+                parsers.append(parser)
+                parser.start()
+            return_values = self.handle_response(
+                request_id, len(labels_texts_and_worker_queue_numbers),
+                'parse_and_register_documents', parsers)
+        finally:
+            # Parsers still running after a failure must not send further documents to the
+            # workers once their labels have been forgotten
+            for parser in parsers:
+                if len(return_values) < len(labels_texts_and_worker_queue_numbers):
+                    parser.terminate()
+                parser.join()
+            with self.lock:
+                self.corpus_generation += 1
+                self.record_registrations(return_values, texts_by_label.keys())
 
     def remove_document(self, label:str) -> None:
         """Parameters:
 
         label -- the label of the document to be removed.
         """
-        reply_queue = self.multiprocessing_manager.Queue()
+        self.remove_documents([label])
+
+    def remove_documents(self, labels:list[str]) -> None:
+        """Removes several documents, sending at most one message to each worker. Labels that do
+            not belong to registered documents are ignored.
+
+        Parameters:
+
+        labels -- the labels of the documents to be removed.
+        """
         with self.lock:
-            if label in self.document_labels_to_worker_queues:
-                self.input_queues[self.document_labels_to_worker_queues[label]].put((
-                    self.worker.remove_document, (label,), reply_queue), timeout=TIMEOUT_SECONDS)
-                del self.document_labels_to_worker_queues[label]
-                self.word_dictionaries_need_rebuilding = True
-            else:
+            worker_queue_numbers_to_labels = {}
+            for label in labels:
+                if label in self.document_labels_to_worker_queues:
+                    worker_queue_number = self.forget_document(label)
+                    if worker_queue_number in worker_queue_numbers_to_labels:
+                        worker_queue_numbers_to_labels[worker_queue_number].append(label)
+                    else:
+                        worker_queue_numbers_to_labels[worker_queue_number] = [label]
+            if len(worker_queue_numbers_to_labels) == 0:
                 return
-        self.handle_response(reply_queue, 1, 'remove_document')
+            request_id = self.reply_router.open_request()
+            for worker_queue_number, worker_labels in worker_queue_numbers_to_labels.items():
+                self.input_queues[worker_queue_number].put((
+                    self.worker.remove_documents, (worker_labels,), request_id),
+                    timeout=TIMEOUT_SECONDS)
+        return_values = self.handle_response(
+            request_id, len(worker_queue_numbers_to_labels), 'remove_documents')
+        with self.lock:
+            self.corpus_generation += 1
+            self.update_corpus_frequencies(return_values, -1)
+            if len(return_values) < len(worker_queue_numbers_to_labels):
+                self.word_dictionaries_need_rebuilding = True
+            self.compact_document_arenas()
 
     def remove_all_documents(self) -> None:
-        reply_queue = self.multiprocessing_manager.Queue()
+        request_id = self.reply_router.open_request()
         with self.lock:
             for worker_index in range(self.number_of_workers):
                 self.input_queues[worker_index].put((
-                    self.worker.remove_all_documents, None, reply_queue), timeout=TIMEOUT_SECONDS)
-            self.word_dictionaries_need_rebuilding = True
+                    self.worker.remove_all_documents, None, request_id), timeout=TIMEOUT_SECONDS)
             self.document_labels_to_worker_queues = {}
-        self.handle_response(reply_queue, self.number_of_workers, 'remove_all_documents')
+            self.document_label_index = DocumentLabelIndex()
+            self.document_labels_to_arena_locations = {}
+            self.document_labels_to_sizes = {}
+            self.worker_token_counts = [0] * self.number_of_workers
+            self.worker_posting_counts = [0] * self.number_of_workers
+        self.handle_response(request_id, self.number_of_workers, 'remove_all_documents')
+        with self.lock:
+            self.corpus_generation += 1
+            self.words_to_corpus_frequencies = {}
+            self.maximum_corpus_frequency = 0
+            self.maximum_corpus_frequency_needs_recalculating = False
+            self.word_dictionaries_need_rebuilding = False
+            if self.document_arena is not None:
+                self.remove_document_arenas()
+                self.document_arena_filenames_to_dead_bytes = {}
+                self.document_arena = DocumentArena(self.document_store_directory)
+                self.document_arena_filenames.add(self.document_arena.filename)
+
+    def rebalance(self, target_spread:float=0.1) -> int:
+        """Moves documents between workers until the difference between the numbers of tokens held
+            by the most and least loaded workers, divided by the mean number of tokens per worker,
+            no longer exceeds *target_spread*, or until no move would bring the two closer together.
+            Other calls wait until the documents have been moved. Returns the number of documents
+            moved.
+
+        Parameters:
+
+        target_spread -- the spread at or below which no more documents are moved.
+        """
+        if target_spread < 0.0:
+            raise ValueError('target_spread must not be negative.')
+        with self.lock:
+            worker_token_counts = list(self.worker_token_counts)
+            worker_queue_numbers_to_labels = {
+                index: set() for index in range(self.number_of_workers)}
+            for label, worker_queue_number in self.document_labels_to_worker_queues.items():
+                worker_queue_numbers_to_labels[worker_queue_number].add(label)
+            labels_to_target_worker_queue_numbers = {}
+            while True:
+                mean_number_of_tokens = sum(worker_token_counts) / self.number_of_workers
+                if mean_number_of_tokens == 0:
+                    break
+                source = max(
+                    range(self.number_of_workers), key=lambda index: worker_token_counts[index])
+                target = min(
+                    range(self.number_of_workers), key=lambda index: worker_token_counts[index])
+                difference = worker_token_counts[source] - worker_token_counts[target]
+                if difference / mean_number_of_tokens <= target_spread:
+                    break
+                # Moving a document reduces the difference as long as it is smaller than the
+                # difference, and reduces it most when it is half the size of the difference
+                candidate_labels = [label for label in worker_queue_numbers_to_labels[source] if
+                    0 < self.document_labels_to_sizes[label][0] < difference]
+                if len(candidate_labels) == 0:
+                    break
+                label = min(candidate_labels, key=lambda label: abs(
+                    difference - 2 * self.document_labels_to_sizes[label][0]))
+                number_of_tokens = self.document_labels_to_sizes[label][0]
+                worker_token_counts[source] -= number_of_tokens
+                worker_token_counts[target] += number_of_tokens
+                worker_queue_numbers_to_labels[source].remove(label)
+                worker_queue_numbers_to_labels[target].add(label)
+                labels_to_target_worker_queue_numbers[label] = target
+            if len(labels_to_target_worker_queue_numbers) == 0:
+                return 0
+            source_worker_queue_numbers_to_labels = {}
+            for label in labels_to_target_worker_queue_numbers:
+                worker_queue_number = self.document_labels_to_worker_queues[label]
+                if worker_queue_number in source_worker_queue_numbers_to_labels:
+                    source_worker_queue_numbers_to_labels[worker_queue_number].append(label)
+                else:
+                    source_worker_queue_numbers_to_labels[worker_queue_number] = [label]
+            request_id = self.reply_router.open_request()
+            for worker_queue_number, labels in source_worker_queue_numbers_to_labels.items():
+                self.input_queues[worker_queue_number].put((
+                    self.worker.export_documents, (labels, self.document_arena is None),
+                    request_id), timeout=TIMEOUT_SECONDS)
+            return_values = self.handle_response(
+                request_id, len(source_worker_queue_numbers_to_labels), 'rebalance')
+            if len(return_values) < len(source_worker_queue_numbers_to_labels):
+                self.word_dictionaries_need_rebuilding = True
+            request_id = self.reply_router.open_request()
+            number_of_documents_moved = 0
+            self.update_corpus_frequencies(
+                [return_value[1] for return_value in return_values], -1)
+            for labels_to_serialized_docs, _ in return_values:
+                for label, serialized_doc in labels_to_serialized_docs.items():
+                    number_of_tokens, number_of_postings = self.document_labels_to_sizes[label]
+                    self.set_document_size(label, 0, 0)
+                    target = labels_to_target_worker_queue_numbers[label]
+                    self.document_labels_to_worker_queues[label] = target
+                    self.set_document_size(label, number_of_tokens, number_of_postings)
+                    if serialized_doc is None:
+                        self.input_queues[target].put((
+                            self.worker.register_document_from_arena,
+                            (self.document_labels_to_arena_locations[label], label), request_id),
+                            timeout=TIMEOUT_SECONDS)
+                    else:
+                        self.input_queues[target].put((
+                            self.worker.register_serialized_document, (serialized_doc, label),
+                            request_id), timeout=TIMEOUT_SECONDS)
+                    number_of_documents_moved += 1
+            self.record_registrations(self.handle_response(
+                request_id, number_of_documents_moved, 'rebalance'), [label for
+                labels_to_serialized_docs, _ in return_values for label in
+                labels_to_serialized_docs])
+            self.corpus_generation += 1
+            return number_of_documents_moved
+
+    def save_snapshot(self, directory:str) -> None:
+        """Writes the registered documents together with the workers' corpus indexes and the
+            corpus frequencies to *directory* so that a later *Manager* can be started with
+            *snapshot=directory* without reindexing the documents. Each worker writes its
+            documents to a single file that is memory-mapped when the snapshot is loaded. Search
+            phrases are not included. Other calls wait until the snapshot has been written.
+
+        Parameters:
+
+        directory -- the directory to write, which is created if it does not exist. Any snapshot
+            already in the directory is overwritten.
+        """
+        os.makedirs(directory, exist_ok=True)
+        with self.lock:
+            request_id = self.reply_router.open_request()
+            for worker_index in range(self.number_of_workers):
+                worker_filename_stem = os.sep.join((directory, ''.join(('worker_',
+                    str(worker_index)))))
+                self.input_queues[worker_index].put((
+                    self.worker.save_snapshot, (''.join((worker_filename_stem, '.documents')),
+                    ''.join((worker_filename_stem, '.index'))), request_id),
+                    timeout=TIMEOUT_SECONDS)
+            return_values = self.handle_response(
+                request_id, self.number_of_workers, 'save_snapshot')
+            if len(return_values) < self.number_of_workers:
+                raise SnapshotError(' '.join(('Snapshot could not be written to', directory)))
+            manager_snapshot = {
+                'version': SNAPSHOT_VERSION,
+                'model': self.model,
+                # file names are stored without the directory so that the snapshot can be moved
+                'worker_snapshots': [(os.path.basename(documents_filename),
+                    os.path.basename(index_filename), document_labels_to_locations) for
+                    documents_filename, index_filename, document_labels_to_locations in
+                    sorted(return_values)],
+                'document_labels_to_sizes': self.document_labels_to_sizes,
+                'words_to_corpus_frequencies': None if self.word_dictionaries_need_rebuilding
+                    else self.words_to_corpus_frequencies,
+                'maximum_corpus_frequency': self.maximum_corpus_frequency,
+                'maximum_corpus_frequency_needs_recalculating':
+                    self.maximum_corpus_frequency_needs_recalculating,
+                'serialized_document_bytes': self.serialized_document_bytes,
+                'serialized_document_tokens': self.serialized_document_tokens,
+            }
+            with open(os.sep.join((directory, SNAPSHOT_MANAGER_FILENAME)), 'wb') as file:
+                pickle.dump(manager_snapshot, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load_snapshot(self, directory):
+        """ Loads a snapshot written by *save_snapshot()* into a manager without documents.
+            Where the snapshot was written by more workers than this manager has, each worker
+            loads several of the workers' files.
+        """
+        with open(os.sep.join((directory, SNAPSHOT_MANAGER_FILENAME)), 'rb') as file:
+            manager_snapshot = pickle.load(file)
+        if manager_snapshot['version'] != SNAPSHOT_VERSION:
+            raise WrongVersionDeserializationError('; '.join((
+                SNAPSHOT_VERSION, str(manager_snapshot['version']))))
+        if manager_snapshot['model'] != self.model:
+            raise WrongModelDeserializationError('; '.join((
+                self.model, manager_snapshot['model'])))
+        with self.lock:
+            worker_queue_numbers_to_snapshot_files = {}
+            for snapshot_worker_index, (documents_filename, index_filename,
+                    document_labels_to_locations) in enumerate(
+                    manager_snapshot['worker_snapshots']):
+                if len(document_labels_to_locations) == 0:
+                    continue
+                worker_queue_number = snapshot_worker_index % self.number_of_workers
+                snapshot_file = (os.sep.join((directory, documents_filename)),
+                    os.sep.join((directory, index_filename)), document_labels_to_locations)
+                if worker_queue_number in worker_queue_numbers_to_snapshot_files:
+                    worker_queue_numbers_to_snapshot_files[worker_queue_number].append(
+                        snapshot_file)
+                else:
+                    worker_queue_numbers_to_snapshot_files[worker_queue_number] = [snapshot_file]
+                for label in document_labels_to_locations:
+                    self.document_labels_to_worker_queues[label] = worker_queue_number
+                    self.document_label_index.add(label)
+                    self.set_document_size(
+                        label, *manager_snapshot['document_labels_to_sizes'].get(label, (0, 0)))
+                    if self.document_arena is not None:
+                        self.document_labels_to_arena_locations[label] = \
+                            self.document_arena.append(self.document_arena_reader.read(
+                            (snapshot_file[0],) + document_labels_to_locations[label]))
+            if self.document_arena is not None:
+                self.document_arena_reader.close() # releases the snapshot files
+            request_id = self.reply_router.open_request()
+            for worker_queue_number, snapshot_files in \
+                    worker_queue_numbers_to_snapshot_files.items():
+                self.input_queues[worker_queue_number].put((
+                    self.worker.load_snapshot, (snapshot_files,), request_id),
+                    timeout=TIMEOUT_SECONDS)
+            if len(self.handle_response(request_id, len(worker_queue_numbers_to_snapshot_files),
+                    'load_snapshot')) < len(worker_queue_numbers_to_snapshot_files):
+                raise SnapshotError(' '.join(('Snapshot could not be loaded from', directory)))
+            if manager_snapshot['words_to_corpus_frequencies'] is None:
+                self.word_dictionaries_need_rebuilding = True
+            else:
+                self.words_to_corpus_frequencies = manager_snapshot['words_to_corpus_frequencies']
+                self.maximum_corpus_frequency = manager_snapshot['maximum_corpus_frequency']
+                self.maximum_corpus_frequency_needs_recalculating = \
+                    manager_snapshot['maximum_corpus_frequency_needs_recalculating']
+            self.serialized_document_bytes = manager_snapshot['serialized_document_bytes']
+            self.serialized_document_tokens = manager_snapshot['serialized_document_tokens']
+            self.corpus_generation += 1
+
+    def remove_document_arenas(self):
+        """ Deletes the document arena files. Processes that have mapped them can still
+            read them until they close their mappings.
+        """
+        self.document_arena.close()
+        self.document_arena_reader.close()
+        for filename in self.document_arena_filenames:
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+        self.document_arena_filenames = set()
 
     def document_labels(self) -> list[str]:
         """Returns a list of the labels of the currently registered documents."""
         with self.lock:
-            unsorted_labels = self.document_labels_to_worker_queues.keys()
-        return sorted(unsorted_labels)
+            return list(self.document_label_index)
 
     def serialize_document(self, label:str) -> bytes:
         """Returns a serialized representation of a Holmes document that can be persisted to
@@ -269,14 +1048,19 @@ class Manager:
 
         label -- the label of the document to be serialized.
         """
-        reply_queue = self.multiprocessing_manager.Queue()
+        if self.document_arena is not None:
+            # read with the lock held because compaction may otherwise delete the file first
+            with self.lock:
+                location = self.document_labels_to_arena_locations.get(label)
+                return None if location is None else self.document_arena_reader.read(location)
         with self.lock:
             if label in self.document_labels_to_worker_queues:
+                request_id = self.reply_router.open_request()
                 self.input_queues[self.document_labels_to_worker_queues[label]].put((
-                    self.worker.get_serialized_document, (label,), reply_queue), TIMEOUT_SECONDS)
+                    self.worker.get_serialized_document, (label,), request_id), TIMEOUT_SECONDS)
             else:
                 return None
-        return self.handle_response(reply_queue, 1, 'serialize_document')[0]
+        return self.handle_response(request_id, 1, 'serialize_document')[0]
 
     def get_document(self, label:str='') -> Doc:
         """Returns a Holmes document. If *label* is not the label of a registered document, *None*
@@ -287,15 +1071,16 @@ class Manager:
         label -- the label of the document to be serialized.
         """
         serialized_document = self.serialize_document(label)
-        return None if serialized_document is None else \
-            Doc(self.nlp.vocab).from_bytes(serialized_document)
+        return None if serialized_document is None else deserialize_holmes_document(
+            serialized_document, self.nlp.vocab, self.semantic_analyzer.vectors_nlp.vocab)
 
     def debug_document(self, label:str='') -> None:
         """Outputs a debug representation for a loaded document.
         """
         serialized_document = self.serialize_document(label)
         if serialized_document is not None:
-            doc = Doc(self.nlp.vocab).from_bytes(serialized_document)
+            doc = deserialize_holmes_document(
+                serialized_document, self.nlp.vocab, self.semantic_analyzer.vectors_nlp.vocab)
             self.semantic_analyzer.debug_structures(doc)
         else:
             print('No document with label', label)
@@ -319,37 +1104,37 @@ class Manager:
         """
         search_phrase = self.internal_get_search_phrase(search_phrase_text, label)
         search_phrase.pack()
-        reply_queue = self.multiprocessing_manager.Queue()
+        request_id = self.reply_router.open_request()
         with self.lock:
             for worker_index in range(self.number_of_workers):
                 self.input_queues[worker_index].put((
                     self.worker.register_search_phrase,
-                    (search_phrase,), reply_queue), timeout=TIMEOUT_SECONDS)
+                    (search_phrase,), request_id), timeout=TIMEOUT_SECONDS)
             self.search_phrases.append(search_phrase)
-        self.handle_response(reply_queue, self.number_of_workers, 'register_search_phrase')
+        self.handle_response(request_id, self.number_of_workers, 'register_search_phrase')
         return search_phrase
 
     def remove_all_search_phrases_with_label(self, label:str) -> None:
-        reply_queue = self.multiprocessing_manager.Queue()
+        request_id = self.reply_router.open_request()
         with self.lock:
             for worker_index in range(self.number_of_workers):
                 self.input_queues[worker_index].put((
                     self.worker.remove_all_search_phrases_with_label,
-                    (label,), reply_queue), timeout=TIMEOUT_SECONDS)
+                    (label,), request_id), timeout=TIMEOUT_SECONDS)
             self.search_phrases = [search_phrase for search_phrase in self.search_phrases
                 if search_phrase.label != label]
-        self.handle_response(reply_queue, self.number_of_workers,
+        self.handle_response(request_id, self.number_of_workers,
             'remove_all_search_phrases_with_label')
 
     def remove_all_search_phrases(self) -> None:
-        reply_queue = self.multiprocessing_manager.Queue()
+        request_id = self.reply_router.open_request()
         with self.lock:
             for worker_index in range(self.number_of_workers):
                 self.input_queues[worker_index].put((
-                    self.worker.remove_all_search_phrases, None, reply_queue),
+                    self.worker.remove_all_search_phrases, None, request_id),
                     timeout=TIMEOUT_SECONDS)
             self.search_phrases = []
-        self.handle_response(reply_queue, self.number_of_workers, 'remove_all_search_phrases')
+        self.handle_response(request_id, self.number_of_workers, 'remove_all_search_phrases')
 
     def list_search_phrase_labels(self) -> list[str]:
         with self.lock:
@@ -373,7 +1158,7 @@ class Manager:
         else:
             search_phrase = None
         if document_text is not None:
-            serialized_document = self.nlp(document_text).to_bytes()
+            serialized_document = serialize_holmes_document(self.nlp(document_text))
             with self.lock:
                 worker_queue_number = self.next_worker_queue_number()
             worker_range = range(worker_queue_number, worker_queue_number + 1)
@@ -385,12 +1170,12 @@ class Manager:
             serialized_document = None
             number_of_workers = self.number_of_workers
             worker_range = range(number_of_workers)
-        reply_queue = self.multiprocessing_manager.Queue()
+        request_id = self.reply_router.open_request()
         for worker_index in worker_range:
             self.input_queues[worker_index].put((
-                self.worker.match, (serialized_document, search_phrase), reply_queue),
+                self.worker.match, (serialized_document, search_phrase), request_id),
                 timeout=TIMEOUT_SECONDS)
-        worker_match_dictss = self.handle_response(reply_queue, number_of_workers,
+        worker_match_dictss = self.handle_response(request_id, number_of_workers,
             'match')
         match_dicts = []
         for worker_match_dicts in worker_match_dictss:
@@ -408,16 +1193,19 @@ class Manager:
 
         with self.lock:
             if self.word_dictionaries_need_rebuilding:
-                reply_queue = self.multiprocessing_manager.Queue()
+                request_id = self.reply_router.open_request()
                 worker_frequency_dict = {}
                 for worker_index in range(self.number_of_workers):
                     self.input_queues[worker_index].put((
-                        self.worker.get_words_to_corpus_frequencies, None, reply_queue),
+                        self.worker.get_words_to_corpus_frequencies, None, request_id),
                         timeout=TIMEOUT_SECONDS)
                 exception_worker_label = None
-                for _ in range(self.number_of_workers):
-                    worker_label, return_value, return_info = reply_queue.get(
-                        timeout=TIMEOUT_SECONDS)
+                try:
+                    replies = [self.reply_router.get(request_id, TIMEOUT_SECONDS) for _ in
+                        range(self.number_of_workers)]
+                finally:
+                    self.reply_router.close_request(request_id)
+                for worker_label, return_value, return_info in replies:
                     if isinstance(return_info, Exception):
                         if exception_worker_label is None:
                             exception_worker_label = worker_label
@@ -426,20 +1214,17 @@ class Manager:
                             worker_frequency_dict, return_value)
                         if self.verbose:
                             print(return_info)
-                    if exception_worker_label is not None:
-                        print(''.join(('ERROR executing ', method_name, '() on ',
-                        exception_worker_label,
-                        '. Please examine the output from the worker processes to identify the problem.')))
-                self.words_to_corpus_frequencies = {}
-                for word in worker_frequency_dict:
-                    if word in self.words_to_corpus_frequencies:
-                        self.words_to_corpus_frequencies[word] += \
-                            worker_frequency_dict[word]
-                    else:
-                        self.words_to_corpus_frequencies[word] = \
-                            worker_frequency_dict[word]
-                self.maximum_corpus_frequency = max(self.words_to_corpus_frequencies.values())
+                if exception_worker_label is not None:
+                    print(''.join(('ERROR executing get_words_to_corpus_frequencies() on ',
+                    exception_worker_label,
+                    '. Please examine the output from the worker processes to identify the problem.')))
+                self.words_to_corpus_frequencies = worker_frequency_dict
+                self.maximum_corpus_frequency_needs_recalculating = True
                 self.word_dictionaries_need_rebuilding = False
+            if self.maximum_corpus_frequency_needs_recalculating:
+                self.maximum_corpus_frequency = max(
+                    self.words_to_corpus_frequencies.values(), default=0)
+                self.maximum_corpus_frequency_needs_recalculating = False
             return self.words_to_corpus_frequencies, self.maximum_corpus_frequency
 
     def topic_match_documents_against(
@@ -457,7 +1242,7 @@ class Manager:
             embedding_matching_frequency_threshold:float=0.5,
             sideways_match_extent:int=100, only_one_result_per_document:bool=False,
             number_of_results:int=10, document_label_filter:str=None,
-            tied_result_quotient:float=0.9) -> list[dict]:
+            tied_result_quotient:float=0.9, use_document_score_bounds:bool=False) -> list[dict]:
 
         """Returns a list of dictionaries representing the results of a topic match between an
         entered text and the loaded documents.
@@ -515,6 +1300,45 @@ class Manager:
             be considered for inclusion in the results.
         tied_result_quotient -- the quotient between a result and following results above which
             the results are interpreted as tied.
+        use_document_score_bounds -- if 'True', each worker calculates an upper bound on the
+            activation each document can achieve from the corpus index, matches and scores its
+            documents in batches in descending order of these bounds and stops once no remaining
+            document could be included in the results. The results are the same as when 'False'.
+        """
+        arguments = locals()
+        del arguments['self']
+        return self.run_topic_match_query(False, **arguments)
+
+    def profile_topic_match_documents_against(
+            self, text_to_match:str, **kwargs) -> tuple[list[dict], dict]:
+        """Performs the same topic match as *topic_match_documents_against()*, bypassing the
+        topic match cache, and returns a tuple whose first element is the list of dictionaries and
+        whose second element is a dictionary recording the time spent in and the numbers of items
+        processed by each stage of the query, both within the manager process and within each
+        worker that was queried.
+
+        Properties:
+
+        text_to_match -- the text to match against the loaded documents.
+        kwargs -- any of the keyword arguments accepted by *topic_match_documents_against()*.
+        """
+        arguments = signature(self.topic_match_documents_against).bind(text_to_match, **kwargs)
+        arguments.apply_defaults()
+        return self.run_topic_match_query(True, **arguments.arguments)
+
+    def run_topic_match_query(
+            self, profile, text_to_match, *,
+            use_frequency_factor, maximum_activation_distance, word_embedding_match_threshold,
+            initial_question_word_embedding_match_threshold, relation_score,
+            reverse_only_relation_score, single_word_score, single_word_any_tag_score,
+            initial_question_word_answer_score, initial_question_word_behaviour,
+            different_match_cutoff_score, overlapping_relation_multiplier, embedding_penalty,
+            ontology_penalty, relation_matching_frequency_threshold,
+            embedding_matching_frequency_threshold, sideways_match_extent,
+            only_one_result_per_document, number_of_results, document_label_filter,
+            tied_result_quotient, use_document_score_bounds):
+        """ Performs a topic match for *topic_match_documents_against()* or, where *profile*
+            is 'True', *profile_topic_match_documents_against()*.
         """
         if word_embedding_match_threshold < 0.0 or word_embedding_match_threshold > 1.0:
             raise ValueError(
@@ -548,14 +1372,44 @@ class Manager:
                 str(embedding_matching_frequency_threshold),
                 'relation',
                 str(relation_matching_frequency_threshold))))
+        query_start_time = perf_counter()
+        manager_profile = {}
         with self.lock:
             if len(self.document_labels_to_worker_queues) == 0:
                 raise NoDocumentError('At least one document is required for matching.')
+            topic_match_cache_key = (
+                ' '.join(text_to_match.split()), use_frequency_factor, maximum_activation_distance,
+                word_embedding_match_threshold, initial_question_word_embedding_match_threshold,
+                relation_score, reverse_only_relation_score, single_word_score,
+                single_word_any_tag_score, initial_question_word_answer_score,
+                initial_question_word_behaviour, different_match_cutoff_score,
+                overlapping_relation_multiplier, embedding_penalty, ontology_penalty,
+                relation_matching_frequency_threshold, embedding_matching_frequency_threshold,
+                sideways_match_extent, only_one_result_per_document, number_of_results,
+                document_label_filter, tied_result_quotient, use_document_score_bounds,
+                self.corpus_generation)
+            if document_label_filter is None:
+                worker_indexes_to_query = set(range(self.number_of_workers))
+            else:
+                # Workers holding no documents that pass the filter are not sent the query
+                worker_indexes_to_query = {
+                    self.document_labels_to_worker_queues[label] for label in
+                    self.document_label_index.get_labels_with_prefix(str(document_label_filter))}
+        if not profile:
+            cached_topic_match_dicts = self.topic_match_cache.get(topic_match_cache_key)
+            if cached_topic_match_dicts is not None:
+                return cached_topic_match_dicts
+        if len(worker_indexes_to_query) == 0:
+            return self.finish_topic_match_query(
+                topic_match_cache_key, [], profile, manager_profile, {}, query_start_time)
         words_to_corpus_frequencies, maximum_corpus_frequency = \
             self.get_corpus_frequency_information()
 
-        reply_queue = self.multiprocessing_manager.Queue()
+        start_time = perf_counter()
         text_to_match_doc = self.semantic_analyzer.parse(text_to_match)
+        manager_profile['parse'] = {
+            'seconds': perf_counter() - start_time, 'tokens': len(text_to_match_doc)}
+        start_time = perf_counter()
         phraselet_labels_to_phraselet_infos = \
             self.linguistic_object_factory.get_phraselet_labels_to_phraselet_infos(
             text_to_match_doc=text_to_match_doc,
@@ -563,36 +1417,117 @@ class Manager:
             maximum_corpus_frequency=maximum_corpus_frequency,
             process_initial_question_words=initial_question_word_behaviour in ('process',
                 'exclusive'))
+        manager_profile['phraselet_creation'] = {
+            'seconds': perf_counter() - start_time,
+            'phraselets': len(phraselet_labels_to_phraselet_infos)}
         if len(phraselet_labels_to_phraselet_infos) == 0:
-            return []
-        phraselet_labels_to_search_phrases = \
-            self.linguistic_object_factory.create_search_phrases_from_phraselet_infos(
-                phraselet_labels_to_phraselet_infos.values(), relation_matching_frequency_threshold)
-        for search_phrase in phraselet_labels_to_search_phrases.values():
-            search_phrase.pack()
-
-        for worker_index in range(self.number_of_workers):
-            self.input_queues[worker_index].put((
-                self.worker.get_topic_matches,
-                (text_to_match, phraselet_labels_to_phraselet_infos,
-                phraselet_labels_to_search_phrases, maximum_activation_distance,
-                overall_similarity_threshold, initial_question_word_overall_similarity_threshold,
-                relation_score, reverse_only_relation_score, single_word_score,
-                single_word_any_tag_score, initial_question_word_answer_score,
-                initial_question_word_behaviour, different_match_cutoff_score,
-                overlapping_relation_multiplier, embedding_penalty,
-                ontology_penalty, relation_matching_frequency_threshold,
-                embedding_matching_frequency_threshold, sideways_match_extent,
-                only_one_result_per_document, number_of_results, document_label_filter,
-                use_frequency_factor), reply_queue), timeout=TIMEOUT_SECONDS)
-        worker_topic_match_dictss = self.handle_response(reply_queue,
-            self.number_of_workers, 'match')
+            return self.finish_topic_match_query(
+                topic_match_cache_key, [], profile, manager_profile, {}, query_start_time)
+
+        request_id = self.reply_router.open_request()
+        # The cache must be updated and the messages sent while holding the lock so that all
+        # workers receive the cache changes in the same order
+        with self.phraselet_search_phrase_cache_lock:
+            start_time = perf_counter()
+            phraselet_labels_to_search_phrase_keys = {
+                label: phraselet_info.get_search_phrase_key(relation_matching_frequency_threshold)
+                for label, phraselet_info in phraselet_labels_to_phraselet_infos.items()}
+            for key in phraselet_labels_to_search_phrase_keys.values():
+                if key in self.phraselet_search_phrase_cache:
+                    self.phraselet_search_phrase_cache.move_to_end(key)
+            uncached_phraselet_infos = [phraselet_labels_to_phraselet_infos[label] for label, key
+                in phraselet_labels_to_search_phrase_keys.items() if key not in
+                self.phraselet_search_phrase_cache]
+            new_search_phrase_keys_to_search_phrases = {}
+            for label, search_phrase in \
+                    self.linguistic_object_factory.create_search_phrases_from_phraselet_infos(
+                    uncached_phraselet_infos, relation_matching_frequency_threshold).items():
+                search_phrase.pack()
+                key = phraselet_labels_to_search_phrase_keys[label]
+                new_search_phrase_keys_to_search_phrases[key] = search_phrase
+                self.phraselet_search_phrase_cache[key] = search_phrase
+            evicted_search_phrase_keys = []
+            while len(self.phraselet_search_phrase_cache) > \
+                    MAXIMUM_PHRASELET_SEARCH_PHRASE_CACHE_SIZE:
+                evicted_search_phrase_keys.append(
+                    self.phraselet_search_phrase_cache.popitem(last=False)[0])
+            manager_profile['search_phrase_creation'] = {
+                'seconds': perf_counter() - start_time,
+                'search_phrases': len(new_search_phrase_keys_to_search_phrases),
+                'search_phrases_evicted': len(evicted_search_phrase_keys)}
+            start_time = perf_counter()
+            for worker_index in range(self.number_of_workers):
+                if worker_index not in worker_indexes_to_query:
+                    # The workers' caches must stay in step with the manager's cache. No reply
+                    # is awaited; the worker's input queue ensures the changes are made before
+                    # it processes any later query.
+                    if len(new_search_phrase_keys_to_search_phrases) > 0 or \
+                            len(evicted_search_phrase_keys) > 0:
+                        self.input_queues[worker_index].put((
+                            self.worker.update_phraselet_search_phrase_cache,
+                            (new_search_phrase_keys_to_search_phrases,
+                            evicted_search_phrase_keys), None), timeout=TIMEOUT_SECONDS)
+                    continue
+                self.input_queues[worker_index].put((
+                    self.worker.get_topic_matches,
+                    (text_to_match, phraselet_labels_to_phraselet_infos,
+                    phraselet_labels_to_search_phrase_keys,
+                    new_search_phrase_keys_to_search_phrases, evicted_search_phrase_keys,
+                    maximum_activation_distance, overall_similarity_threshold,
+                    initial_question_word_overall_similarity_threshold,
+                    relation_score, reverse_only_relation_score, single_word_score,
+                    single_word_any_tag_score, initial_question_word_answer_score,
+                    initial_question_word_behaviour, different_match_cutoff_score,
+                    overlapping_relation_multiplier, embedding_penalty,
+                    ontology_penalty, relation_matching_frequency_threshold,
+                    embedding_matching_frequency_threshold, sideways_match_extent,
+                    only_one_result_per_document, number_of_results, document_label_filter,
+                    use_frequency_factor, use_document_score_bounds, profile), request_id),
+                    timeout=TIMEOUT_SECONDS)
+        worker_return_values = self.handle_response(request_id,
+            len(worker_indexes_to_query), 'match')
+        worker_round_trip_seconds = perf_counter() - start_time
+        start_time = perf_counter()
         topic_match_dicts = []
-        for worker_topic_match_dicts in worker_topic_match_dictss:
+        worker_labels_to_profiles = {}
+        for worker_return_value in worker_return_values:
+            if profile:
+                worker_topic_match_dicts, worker_profile = worker_return_value
+                worker_labels_to_profiles[worker_profile['worker']] = worker_profile['stages']
+            else:
+                worker_topic_match_dicts = worker_return_value
             if worker_topic_match_dicts is not None:
                 topic_match_dicts.extend(worker_topic_match_dicts)
-        return TopicMatchDictionaryOrderer().order(
+        topic_match_dicts = TopicMatchDictionaryOrderer().order(
             topic_match_dicts, number_of_results, tied_result_quotient)
+        manager_profile['worker_round_trip'] = {
+            'seconds': worker_round_trip_seconds, 'workers': len(worker_indexes_to_query)}
+        # The time the slowest worker spent processing the query was part of the round trip;
+        # the rest of the round trip was spent on pickling, queue transfer and waiting
+        manager_profile['ipc'] = {'seconds': worker_round_trip_seconds - max(
+            (worker_profile['total']['seconds'] for worker_profile in
+            worker_labels_to_profiles.values()), default=0.0)}
+        manager_profile['ordering'] = {
+            'seconds': perf_counter() - start_time, 'topic_matches': len(topic_match_dicts)}
+        return self.finish_topic_match_query(
+            topic_match_cache_key, topic_match_dicts, profile, manager_profile,
+            worker_labels_to_profiles, query_start_time)
+
+    def finish_topic_match_query(
+            self, topic_match_cache_key, topic_match_dicts, profile, manager_profile,
+            worker_labels_to_profiles, query_start_time):
+        """ Returns the result of *topic_match_documents_against()*, which is the topic match
+            dictionaries together with the profile if profiling was requested and otherwise
+            the topic match dictionaries alone after they have been added to the cache.
+        """
+        if not profile:
+            self.topic_match_cache.put(topic_match_cache_key, topic_match_dicts)
+            return topic_match_dicts
+        manager_profile['total'] = {'seconds': perf_counter() - query_start_time}
+        return topic_match_dicts, {
+            'manager': manager_profile,
+            'workers': worker_labels_to_profiles
+        }
 
     def get_supervised_topic_training_basis(
             self, *, classification_ontology:Ontology=None,
@@ -673,10 +1608,142 @@ class Manager:
             word_embedding_match_threshold,
             initial_question_word_embedding_match_threshold)
 
+    def save_subword_cache(self, filename:str=None) -> None:
+        """Writes the subword cache to disk so that it can be warm-loaded by a later *Manager*.
+            The subword cache is only populated for languages that analyse subwords (German).
+
+        Parameters:
+
+        filename -- the name of the file to write, or *None* if the *subword_cache_filename*
+            passed to the constructor should be used.
+        """
+        if filename is None:
+            filename = self.subword_cache_filename
+        if filename is None:
+            raise ValueError('No filename specified for the subword cache.')
+        self.semantic_analyzer.subword_cache.save(filename, self.semantic_analyzer.model)
+
+    def get_subword_cache_statistics(self) -> dict:
+        """Returns a dictionary with the keys *size*, *maximum_size*, *hits* and *misses* describing
+            the subword cache, which is shared by all managers using the same model within a
+            process.
+        """
+        return self.semantic_analyzer.subword_cache.get_statistics()
+
+    def get_statistics(self) -> dict:
+        """Returns a dictionary describing the load on and the activity of each worker process
+            together with the statistics for the topic match and subword caches. Because the
+            request for each worker's statistics is queued behind any work the worker has still
+            to do, the call takes longer when workers are busy.
+
+            The dictionary has the keys *workers*, a list with one dictionary for each worker;
+            *latency_histogram_bounds_seconds*, the upper bounds of the latency histogram buckets;
+            *topic_match_cache*; and *subword_cache*. Each worker dictionary has the keys
+            *worker*, *alive*, *input_queue_depth* (*None* on platforms that do not support
+            measuring it), *estimated_tokens* (the manager's estimate used for placing documents),
+            *documents*, *tokens*, *corpus_index_keys*, *postings*, *resident_memory_bytes*
+            (*None* on platforms that do not support measuring it) and *methods*, which maps the
+            name of each method the worker has executed to a dictionary with the keys *calls*,
+            *errors*, *total_seconds*, *maximum_seconds* and *latency_histogram*.
+        """
+        input_queue_depths = []
+        for input_queue in self.input_queues:
+            try:
+                input_queue_depths.append(input_queue.qsize())
+            except NotImplementedError:
+                input_queue_depths.append(None)
+        request_id = self.reply_router.open_request()
+        for input_queue in self.input_queues:
+            input_queue.put((self.worker.get_statistics, None, request_id), timeout=TIMEOUT_SECONDS)
+        worker_labels_to_statistics = {worker_statistics['worker']: worker_statistics for
+            worker_statistics in self.handle_response(
+            request_id, self.number_of_workers, 'get_statistics')}
+        workers = []
+        with self.lock:
+            for worker_index, worker_label in enumerate(self.worker_labels):
+                worker_statistics = {
+                    'worker': worker_label,
+                    'alive': self.workers[worker_index].is_alive(),
+                    'input_queue_depth': input_queue_depths[worker_index],
+                    'estimated_tokens': self.worker_token_counts[worker_index],
+                }
+                if worker_label in worker_labels_to_statistics:
+                    worker_statistics.update(worker_labels_to_statistics[worker_label])
+                workers.append(worker_statistics)
+        return {
+            'workers': workers,
+            'latency_histogram_bounds_seconds': list(LATENCY_HISTOGRAM_BOUNDS_SECONDS),
+            'topic_match_cache': self.get_topic_match_cache_statistics(),
+            'subword_cache': self.get_subword_cache_statistics()
+        }
+
+    def get_topic_match_cache_statistics(self) -> dict:
+        """Returns a dictionary with the keys *size*, *maximum_size*, *hits*, *misses* and
+            *evictions* describing the cache of topic match results.
+        """
+        return self.topic_match_cache.get_statistics()
+
     def close(self) -> None:
         """ Terminates the worker processes. """
         for worker in self.workers:
             worker.terminate()
+        self.reply_router.close()
+        if self.document_arena is not None:
+            with self.lock:
+                self.remove_document_arenas()
+
+def get_resident_memory_bytes():
+    """ Returns the resident set size of the current process, or *None* where it cannot be
+        determined because the platform does not provide */proc*.
+    """
+    try:
+        with open('/proc/self/statm', encoding='utf-8') as statm_file:
+            return int(statm_file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def parse_documents(model_name, labels_texts_and_worker_queue_numbers, batch_size,
+        subword_cache_filename, document_store_directory, input_queues, reply_queue, request_id,
+        parser_label):
+    """Entry point for the parser processes started by *Manager.parse_and_register_documents()*.
+        Each parsed document is sent to the input queue of the worker that is to hold it, or, where
+        *document_store_directory* is not *None*, written to a document arena owned by the parser
+        process whose location is sent instead. If an error occurs, it is reported on
+        *reply_queue* under *request_id* for each document not yet sent so that the manager
+        receives the number of replies it expects.
+    """
+    worker = Worker()
+    number_of_documents_sent = 0
+    document_arena = None
+    try:
+        if document_store_directory is not None:
+            document_arena = DocumentArena(document_store_directory)
+        nlp = get_holmes_nlp(model_name)
+        semantic_analyzer = get_semantic_analyzer(nlp)
+        if subword_cache_filename is not None and os.path.isfile(subword_cache_filename):
+            semantic_analyzer.subword_cache.load(subword_cache_filename, semantic_analyzer.model)
+        docs = nlp.pipe((text for _, text, _ in labels_texts_and_worker_queue_numbers),
+            batch_size=batch_size)
+        for (label, _, worker_queue_number), doc in zip(
+                labels_texts_and_worker_queue_numbers, docs):
+            if document_arena is not None:
+                input_queues[worker_queue_number].put((
+                    worker.register_document_from_arena,
+                    (document_arena.append(serialize_holmes_document(doc)), label), request_id),
+                    timeout=TIMEOUT_SECONDS)
+            else:
+                input_queues[worker_queue_number].put((
+                    worker.register_serialized_document, (serialize_holmes_document(doc), label),
+                    request_id), timeout=TIMEOUT_SECONDS)
+            number_of_documents_sent += 1
+    except Exception as err:
+        print(''.join((parser_label, ' - error:')))
+        print(traceback.format_exc())
+        for _ in range(number_of_documents_sent, len(labels_texts_and_worker_queue_numbers)):
+            reply_queue.put((request_id, (parser_label, None, err)), timeout=TIMEOUT_SECONDS)
+    finally:
+        if document_arena is not None:
+            document_arena.close()
 
 class Worker:
     """Worker implementation used by *Manager*.
@@ -687,111 +1754,336 @@ class Worker:
             worker_label,
             ' - error:'))
 
-    def listen(self, structural_matcher, overall_similarity_threshold, vocab, model_name,
-            serialized_document_version, input_queue, worker_label):
+    def listen(self, structural_matcher, overall_similarity_threshold, vocab, vectors_vocab,
+            model_name, readable_serialized_document_versions, input_queue, reply_queue,
+            worker_label):
         state = {
             'structural_matcher': structural_matcher,
             'overall_similarity_threshold': overall_similarity_threshold,
             'vocab': vocab,
+            'vectors_vocab': vectors_vocab,
             'model_name': model_name,
-            'serialized_document_version': serialized_document_version,
+            'readable_serialized_document_versions': readable_serialized_document_versions,
             'document_labels_to_documents': {},
+            'document_label_index': DocumentLabelIndex(),
             'corpus_index_dict': {},
-            'search_phrases': [],
+            'document_labels_to_corpus_index_keys': {},
+            'corpus_embedding_matrix': CorpusEmbeddingMatrix(structural_matcher),
+            'dependency_edge_index': self.create_dependency_edge_index(structural_matcher),
+            'document_arena_reader': DocumentArenaReader(),
+            'search_phrase_index': SearchPhraseIndex(),
+            'phraselet_search_phrase_cache': {},
+            'worker_label': worker_label,
+            'method_names_to_call_statistics': {},
         }
         HolmesBroker.set_extensions()
         while True:
-            method, args, reply_queue = input_queue.get()
+            method, args, request_id = input_queue.get()
+            start_time = perf_counter()
+            # Messages sent without a request id expect no reply
             try:
                 if args is not None:
                     return_value, return_info = method(state, *args)
                 else:
                     return_value, return_info = method(state)
-                reply_queue.put((worker_label, return_value, return_info), timeout=TIMEOUT_SECONDS)
+                self.record_call(state, method, start_time, False)
+                if request_id is not None:
+                    reply_queue.put((request_id, (worker_label, return_value, return_info)),
+                        timeout=TIMEOUT_SECONDS)
             except Exception as err:
+                self.record_call(state, method, start_time, True)
                 print(self.error_header(method, args, worker_label))
                 print(traceback.format_exc())
-                reply_queue.put((worker_label, None, err), timeout=TIMEOUT_SECONDS)
+                if request_id is not None:
+                    reply_queue.put((request_id, (worker_label, None, err)),
+                        timeout=TIMEOUT_SECONDS)
             except:
+                self.record_call(state, method, start_time, True)
                 print(self.error_header(method, args, worker_label))
                 print(traceback.format_exc())
                 err_identifier = str(sys.exc_info()[0])
-                reply_queue.put((worker_label, None, err_identifier), timeout=TIMEOUT_SECONDS)
+                if request_id is not None:
+                    reply_queue.put((request_id, (worker_label, None, err_identifier)),
+                        timeout=TIMEOUT_SECONDS)
 
-    def load_document(self, state, serialized_doc, document_label, corpus_index_dict):
-        doc = Doc(state['vocab']).from_bytes(serialized_doc)
+    def record_call(self, state, method, start_time, failed):
+        """ Adds a call to *method* that started at *start_time* to the call statistics. """
+        seconds = perf_counter() - start_time
+        method_names_to_call_statistics = state['method_names_to_call_statistics']
+        if method.__name__ not in method_names_to_call_statistics:
+            method_names_to_call_statistics[method.__name__] = {
+                'calls': 0,
+                'errors': 0,
+                'total_seconds': 0.0,
+                'maximum_seconds': 0.0,
+                'latency_histogram': [0] * (len(LATENCY_HISTOGRAM_BOUNDS_SECONDS) + 1)
+            }
+        call_statistics = method_names_to_call_statistics[method.__name__]
+        call_statistics['calls'] += 1
+        if failed:
+            call_statistics['errors'] += 1
+        call_statistics['total_seconds'] += seconds
+        if seconds > call_statistics['maximum_seconds']:
+            call_statistics['maximum_seconds'] = seconds
+        call_statistics['latency_histogram'][
+            bisect_left(LATENCY_HISTOGRAM_BOUNDS_SECONDS, seconds)] += 1
+
+    def deserialize_document(self, state, serialized_doc):
+        doc = deserialize_holmes_document(serialized_doc, state['vocab'], state['vectors_vocab'])
         if doc._.holmes_document_info.model != state['model_name']:
             raise WrongModelDeserializationError('; '.join((
                 state['model_name'], doc._.holmes_document_info.model)))
-        if doc._.holmes_document_info.serialized_document_version != \
-                state['serialized_document_version']:
+        if doc._.holmes_document_info.serialized_document_version not in \
+                state['readable_serialized_document_versions']:
             raise WrongVersionDeserializationError('; '.join((
-                str(state['serialized_document_version']),
+                '/'.join(state['readable_serialized_document_versions']),
                 str(doc._.holmes_document_info.serialized_document_version))))
+        return doc
+
+    def create_dependency_edge_index(self, structural_matcher):
+        """ Returns a new *DependencyEdgeIndex*, or *None* where an ontology is in use because
+            ontology-based matching does not depend on the textual representations of words the
+            index holds.
+        """
+        return DependencyEdgeIndex() if structural_matcher.ontology is None else None
+
+    def add_to_dependency_edge_index(self, state, doc, document_label, key_words):
+        if state['dependency_edge_index'] is not None:
+            state['dependency_edge_index'].add_document(
+                document_label, state['structural_matcher'].get_dependency_edges(
+                doc, document_label, state['corpus_index_dict'], key_words))
+
+    def load_document(self, state, serialized_doc, document_label, corpus_index_dict):
+        doc = self.deserialize_document(state, serialized_doc)
         state['document_labels_to_documents'][document_label] = doc
-        state['structural_matcher'].semantic_matching_helper.add_to_corpus_index(
+        key_words = state['structural_matcher'].semantic_matching_helper.add_to_corpus_index(
             corpus_index_dict, doc, document_label)
-        return doc
+        return doc, key_words
+
+    def get_document_corpus_frequencies(self, state, document_label, key_words):
+        """ Returns the contribution of a document to the corpus frequencies of *key_words*. """
+        words_to_frequencies = {}
+        for word in key_words:
+            if word in punctuation:
+                continue
+            frequency = state['corpus_index_dict'][word].\
+                get_number_of_corpus_word_positions_in_document(document_label)
+            if frequency > 0:
+                words_to_frequencies[word] = frequency
+        return words_to_frequencies
 
     def register_serialized_document(self, state, serialized_doc, document_label):
-        self.load_document(state, serialized_doc, document_label, state['corpus_index_dict'])
-        return None, ' '.join(('Registered document', document_label))
+        """ Returns the label, *None* in place of a document arena location, the document's
+            contribution to the corpus frequencies and the numbers of tokens and corpus index
+            postings in the document.
+        """
+        doc, key_words = self.load_document(
+            state, serialized_doc, document_label, state['corpus_index_dict'])
+        state['document_labels_to_corpus_index_keys'][document_label] = key_words
+        state['document_label_index'].add(document_label)
+        state['corpus_embedding_matrix'].add_key_words(
+            state['corpus_index_dict'], state['document_labels_to_documents'], key_words)
+        self.add_to_dependency_edge_index(state, doc, document_label, key_words)
+        number_of_postings = sum(
+            state['corpus_index_dict'][word].get_number_of_postings_in_document(document_label)
+            for word in key_words)
+        return (document_label, None,
+            self.get_document_corpus_frequencies(state, document_label, key_words), len(doc),
+            number_of_postings), ' '.join(('Registered document', document_label))
+
+    def register_document_from_arena(self, state, location, document_label):
+        (_, _, words_to_frequencies, number_of_tokens, number_of_postings), _ = \
+            self.register_serialized_document(
+            state, state['document_arena_reader'].read(location), document_label)
+        return (document_label, location, words_to_frequencies, number_of_tokens,
+            number_of_postings), ' '.join(('Registered document', document_label))
 
     def remove_document(self, state, document_label):
         state['document_labels_to_documents'].pop(document_label)
-        state['corpus_index_dict'] = \
-            state['structural_matcher'].semantic_matching_helper.get_corpus_index_removing_document(
-                state['corpus_index_dict'], document_label)
-        return None, ' '.join(('Removed document', document_label))
+        state['document_label_index'].remove(document_label)
+        key_words = state['document_labels_to_corpus_index_keys'].pop(document_label)
+        words_to_frequencies = self.get_document_corpus_frequencies(
+            state, document_label, key_words)
+        state['structural_matcher'].semantic_matching_helper.remove_from_corpus_index(
+            state['corpus_index_dict'], document_label, key_words)
+        state['corpus_embedding_matrix'].remove_document(
+            state['corpus_index_dict'], state['document_labels_to_documents'], document_label,
+            key_words)
+        if state['dependency_edge_index'] is not None:
+            state['dependency_edge_index'].remove_document(document_label)
+        return words_to_frequencies, ' '.join(('Removed document', document_label))
+
+    def remove_documents(self, state, document_labels):
+        words_to_frequencies = {}
+        for document_label in document_labels:
+            document_words_to_frequencies, _ = self.remove_document(state, document_label)
+            for word, frequency in document_words_to_frequencies.items():
+                words_to_frequencies[word] = words_to_frequencies.get(word, 0) + frequency
+        return words_to_frequencies, ' '.join(('Removed documents', ', '.join(document_labels)))
+
+    def discard_documents(self, state, document_labels):
+        """ Removes those of *document_labels* that this worker holds. Used for documents whose
+            registration the manager has given up on.
+        """
+        for document_label in document_labels:
+            if document_label in state['document_labels_to_documents']:
+                self.remove_document(state, document_label)
+        return None, ' '.join(('Discarded documents', ', '.join(document_labels)))
 
     def remove_all_documents(self, state):
         state['document_labels_to_documents'] = {}
+        state['document_label_index'] = DocumentLabelIndex()
         state['corpus_index_dict'] = {}
+        state['document_labels_to_corpus_index_keys'] = {}
+        state['corpus_embedding_matrix'] = CorpusEmbeddingMatrix(state['structural_matcher'])
+        state['dependency_edge_index'] = self.create_dependency_edge_index(
+            state['structural_matcher'])
+        state['document_arena_reader'].close()
         return None, 'Removed all documents'
 
+    def release_document_arenas(self, state):
+        state['document_arena_reader'].close()
+        return None, 'Released document arenas'
+
+    def get_statistics(self, state):
+        """ Returns a dictionary describing the documents, corpus index, memory use and method
+            calls of this worker. Documents registered temporarily by *match()* are not counted.
+        """
+        document_labels_to_documents = state['document_labels_to_documents']
+        return {
+            'worker': state['worker_label'],
+            'documents': len(state['document_labels_to_corpus_index_keys']),
+            'tokens': sum(len(document_labels_to_documents[document_label]) for document_label in
+                state['document_labels_to_corpus_index_keys']),
+            'corpus_index_keys': len(state['corpus_index_dict']),
+            'postings': sum(len(corpus_index_entry) for corpus_index_entry in
+                state['corpus_index_dict'].values()),
+            'resident_memory_bytes': get_resident_memory_bytes(),
+            'methods': deepcopy(state['method_names_to_call_statistics'])
+        }, 'Returned statistics'
+
+    def export_documents(self, state, document_labels, serialize):
+        """ Removes documents so that they can be registered with another worker. Returns a
+            dictionary from the labels to the serialized documents, or to *None* where *serialize*
+            is *False* because the documents can be reread from a document arena, together with
+            the changes to the corpus frequencies.
+        """
+        labels_to_serialized_docs = {document_label: serialize_holmes_document(
+            state['document_labels_to_documents'][document_label]) if serialize else None
+            for document_label in document_labels}
+        words_to_frequencies, _ = self.remove_documents(state, document_labels)
+        return (labels_to_serialized_docs, words_to_frequencies), \
+            ' '.join(('Exported documents', ', '.join(document_labels)))
+
+    def save_snapshot(self, state, documents_filename, index_filename):
+        """ Writes the registered documents one after another to *documents_filename* and the
+            corpus index to *index_filename*. Returns the file names together with a dictionary
+            from document labels to the offsets and lengths of the documents within the first file.
+        """
+        document_labels_to_locations = {}
+        with open(documents_filename, 'wb') as documents_file:
+            for document_label in state['document_labels_to_corpus_index_keys']:
+                serialized_doc = serialize_holmes_document(
+                    state['document_labels_to_documents'][document_label])
+                document_labels_to_locations[document_label] = \
+                    (documents_file.tell(), len(serialized_doc))
+                documents_file.write(serialized_doc)
+        with open(index_filename, 'wb') as index_file:
+            pickle.dump({
+                'corpus_index_dict': state['corpus_index_dict'],
+                'document_labels_to_corpus_index_keys':
+                    state['document_labels_to_corpus_index_keys']
+            }, index_file, protocol=pickle.HIGHEST_PROTOCOL)
+        return (documents_filename, index_filename, document_labels_to_locations), \
+            ' '.join(('Saved snapshot to', documents_filename, 'and', index_filename))
+
+    def load_snapshot(self, state, snapshot_files):
+        """ Registers the documents from snapshot files written by *save_snapshot()*, adopting the
+            saved corpus indexes rather than indexing the documents again.
+        """
+        corpus_index_dict = state['corpus_index_dict']
+        for documents_filename, index_filename, document_labels_to_locations in snapshot_files:
+            with open(index_filename, 'rb') as index_file:
+                snapshot_index = pickle.load(index_file)
+            for document_label, (offset, length) in document_labels_to_locations.items():
+                state['document_labels_to_documents'][document_label] = \
+                    self.deserialize_document(state, state['document_arena_reader'].read(
+                    (documents_filename, offset, length)))
+                state['document_label_index'].add(document_label)
+            state['document_labels_to_corpus_index_keys'].update(
+                snapshot_index['document_labels_to_corpus_index_keys'])
+            for word, corpus_index_entry in snapshot_index['corpus_index_dict'].items():
+                if word in corpus_index_dict:
+                    for corpus_word_position, document_word, is_derivation in \
+                            corpus_index_entry:
+                        corpus_index_dict[word].add(
+                            corpus_word_position, document_word, is_derivation)
+                else:
+                    corpus_index_dict[word] = corpus_index_entry
+            state['corpus_embedding_matrix'].add_key_words(
+                corpus_index_dict, state['document_labels_to_documents'],
+                snapshot_index['corpus_index_dict'])
+            # The dependency edges are not saved in snapshots as they can be derived from the
+            # documents and the corpus index
+            for document_label, key_words in \
+                    snapshot_index['document_labels_to_corpus_index_keys'].items():
+                self.add_to_dependency_edge_index(
+                    state, state['document_labels_to_documents'][document_label], document_label,
+                    key_words)
+        state['document_arena_reader'].close() # releases the snapshot files
+        return None, 'Loaded snapshot'
+
     def get_serialized_document(self, state, label):
         if label in state['document_labels_to_documents']:
-            return state['document_labels_to_documents'][label].to_bytes(), \
+            return serialize_holmes_document(state['document_labels_to_documents'][label]), \
                 ' '.join(('Returned serialized document with label', label))
         else:
             return None, ' '.join(('No document found with label', label))
 
     def register_search_phrase(self, state, search_phrase):
         search_phrase.unpack(state['vocab'])
-        state['search_phrases'].append(search_phrase)
+        state['search_phrase_index'].add(
+            search_phrase, *state['structural_matcher'].get_search_phrase_index_information(
+            search_phrase))
         return None, ' '.join(('Registered search phrase with label', search_phrase.label))
 
     def remove_all_search_phrases_with_label(self, state, label):
-        state['search_phrases'] = [search_phrase for search_phrase in state['search_phrases']
-            if search_phrase.label != label]
+        state['search_phrase_index'].remove_with_label(label)
         return None, ' '.join(("Removed all search phrases with label '", label, "'"))
 
     def remove_all_search_phrases(self, state):
-        state['search_phrases'] = []
+        state['search_phrase_index'] = SearchPhraseIndex()
         return None, 'Removed all search phrases'
 
     def get_words_to_corpus_frequencies(self, state):
         words_to_corpus_frequencies = {}
-        for word, token_info_tuples in state['corpus_index_dict'].items():
+        for word, corpus_index_entry in state['corpus_index_dict'].items():
             if word in punctuation:
                 continue
-            cwps = [corpus_word_position for corpus_word_position, _, _ in token_info_tuples]
-            if word in words_to_corpus_frequencies:
-                words_to_corpus_frequencies[word] += len(set(cwps))
-            else:
-                words_to_corpus_frequencies[word] = len(set(cwps))
+            words_to_corpus_frequencies[word] = \
+                corpus_index_entry.get_number_of_corpus_word_positions()
         return words_to_corpus_frequencies, 'Retrieved words to corpus frequencies'
 
     def match(self, state, serialized_doc, search_phrase):
         if serialized_doc is not None:
             corpus_index_dict = {}
-            doc = self.load_document(state, serialized_doc, '', corpus_index_dict)
+            doc, _ = self.load_document(state, serialized_doc, '', corpus_index_dict)
             document_labels_to_documents = {'': doc}
+            corpus_embedding_matrix = None
+            dependency_edge_index = None
         else:
             corpus_index_dict = state['corpus_index_dict']
             document_labels_to_documents = state['document_labels_to_documents']
-        search_phrases = [search_phrase] if search_phrase is not None \
-            else state['search_phrases']
+            corpus_embedding_matrix = state['corpus_embedding_matrix']
+            dependency_edge_index = state['dependency_edge_index']
+        if search_phrase is not None:
+            search_phrases = [search_phrase]
+        else:
+            # Only the search phrases whose root words occur in the documents can match
+            search_phrases = state['search_phrase_index'].get_search_phrases(
+                corpus_index_dict, state['structural_matcher'].
+                embedding_based_matching_on_root_words and
+                state['overall_similarity_threshold'] < 1.0)
         if len(document_labels_to_documents) > 0 and len(search_phrases) > 0:
             matches = state['structural_matcher'].match(
                 document_labels_to_documents=document_labels_to_documents,
@@ -805,14 +2097,27 @@ class Worker:
                 embedding_reverse_matching_corpus_word_positions=None,
                 process_initial_question_words=False,
                 overall_similarity_threshold=state['overall_similarity_threshold'],
-                initial_question_word_overall_similarity_threshold=1.0)
+                initial_question_word_overall_similarity_threshold=1.0,
+                corpus_embedding_matrix=corpus_embedding_matrix,
+                dependency_edge_index=dependency_edge_index)
             return state['structural_matcher'].build_match_dictionaries(matches), \
                 'Returned matches'
         else:
             return [], 'No stored objects to match against'
 
+    def update_phraselet_search_phrase_cache(
+            self, state, new_search_phrase_keys_to_search_phrases, evicted_search_phrase_keys):
+        phraselet_search_phrase_cache = state['phraselet_search_phrase_cache']
+        for key, search_phrase in new_search_phrase_keys_to_search_phrases.items():
+            search_phrase.unpack(state['vocab'])
+            phraselet_search_phrase_cache[key] = search_phrase
+        for key in evicted_search_phrase_keys:
+            phraselet_search_phrase_cache.pop(key, None)
+        return None, 'Updated phraselet search phrase cache'
+
     def get_topic_matches(self, state, text_to_match,
-            phraselet_labels_to_phraselet_infos, phraselet_labels_to_search_phrases,
+            phraselet_labels_to_phraselet_infos, phraselet_labels_to_search_phrase_keys,
+            new_search_phrase_keys_to_search_phrases, evicted_search_phrase_keys,
             maximum_activation_distance, overall_similarity_threshold,
             initial_question_word_overall_similarity_threshold, relation_score,
             reverse_only_relation_score, single_word_score, single_word_any_tag_score,
@@ -821,15 +2126,29 @@ class Worker:
             ontology_penalty, relation_matching_frequency_threshold,
             embedding_matching_frequency_threshold,
             sideways_match_extent, only_one_result_per_document, number_of_results,
-            document_label_filter, use_frequency_factor):
+            document_label_filter, use_frequency_factor, use_document_score_bounds, profile):
+        start_time = perf_counter()
+        phraselet_search_phrase_cache = state['phraselet_search_phrase_cache']
+        for key, search_phrase in new_search_phrase_keys_to_search_phrases.items():
+            search_phrase.unpack(state['vocab'])
+            phraselet_search_phrase_cache[key] = search_phrase
+        phraselet_labels_to_search_phrases = {
+            label: phraselet_search_phrase_cache[key] for label, key in
+            phraselet_labels_to_search_phrase_keys.items()}
+        for key in evicted_search_phrase_keys:
+            phraselet_search_phrase_cache.pop(key, None)
         if len(state['document_labels_to_documents']) == 0:
+            if profile:
+                return ([], {'worker': state['worker_label'], 'stages': {
+                    'total': {'seconds': perf_counter() - start_time}}}), \
+                    'No stored documents to match against'
             return [], 'No stored documents to match against'
-        for search_phrase in phraselet_labels_to_search_phrases.values():
-            search_phrase.unpack(state['vocab'])
+        search_phrase_update_seconds = perf_counter() - start_time
         topic_matcher = TopicMatcher(
             structural_matcher=state['structural_matcher'],
             document_labels_to_documents=state['document_labels_to_documents'],
             corpus_index_dict=state['corpus_index_dict'],
+            corpus_embedding_matrix=state['corpus_embedding_matrix'],
             text_to_match=text_to_match,
             phraselet_labels_to_phraselet_infos=phraselet_labels_to_phraselet_infos,
             phraselet_labels_to_search_phrases=phraselet_labels_to_search_phrases,
@@ -853,9 +2172,25 @@ class Worker:
             only_one_result_per_document=only_one_result_per_document,
             number_of_results=number_of_results,
             document_label_filter=document_label_filter,
-            use_frequency_factor=use_frequency_factor)
-        return topic_matcher.get_topic_match_dictionaries(), \
-            'Returned topic match dictionaries'
+            use_frequency_factor=use_frequency_factor,
+            use_document_score_bounds=use_document_score_bounds,
+            document_label_index=state['document_label_index'],
+            dependency_edge_index=state['dependency_edge_index'],
+            profile=profile)
+        dictionaries_start_time = perf_counter()
+        topic_match_dicts = topic_matcher.get_topic_match_dictionaries()
+        if not profile:
+            return topic_match_dicts, 'Returned topic match dictionaries'
+        stages = {'search_phrase_update': {
+            'seconds': search_phrase_update_seconds,
+            'search_phrases': len(new_search_phrase_keys_to_search_phrases)}}
+        stages.update(topic_matcher.stage_profile)
+        stages['get_topic_match_dictionaries'] = {
+            'seconds': perf_counter() - dictionaries_start_time,
+            'topic_matches': len(topic_match_dicts)}
+        stages['total'] = {'seconds': perf_counter() - start_time}
+        return (topic_match_dicts, {'worker': state['worker_label'], 'stages': stages}), \
+            'Returned topic match dictionaries with profile'
 
 @Language.factory("holmes")
 class HolmesBroker:
@@ -868,7 +2203,8 @@ class HolmesBroker:
     def __call__(self, doc:Doc) -> Doc:
         if os.getpid() != self.pid:
             raise MultiprocessingParsingNotSupportedError(
-                'Unfortunately at present parsing cannot be shared between forked processes.')
+                ' '.join(('Unfortunately at present parsing cannot be shared between forked',
+                'processes. Use Manager.parse_and_register_documents() to parse in parallel.')))
         try:
             self.semantic_analyzer.holmes_parse(doc)
         except:
@@ -1,8 +1,10 @@
 import copy
 import sys
+from numpy import float32, zeros, vstack, flatnonzero
+from numpy.linalg import norm
 from spacy.tokens import Token
 from .errors import DuplicateDocumentError, NoSearchPhraseError, NoDocumentError
-from .parsing import Subword, Index
+from .parsing import Subword, Index, get_annotation_store, PackedCorpusWordPositions
 
 ONTOLOGY_DEPTHS_TO_NAMES = {
     -4: 'an ancestor', -3: 'a great-grandparent', -2: 'a grandparent', -1: 'a parent',
@@ -43,6 +45,12 @@ class WordMatch:
         word or governs an initial question word.
     """
 
+    __slots__ = (
+        'search_phrase_token', 'search_phrase_word', 'document_token', 'first_document_token',
+        'last_document_token', 'document_subword', 'document_word', 'word_match_type',
+        'similarity_measure', 'is_negated', 'is_uncertain', 'structurally_matched_document_token',
+        'extracted_word', 'depth', 'search_phrase_initial_question_word')
+
     def __init__(
             self, search_phrase_token, search_phrase_word, document_token,
             first_document_token, last_document_token, document_subword, document_word,
@@ -132,8 +140,18 @@ class Match:
         strategy was not involved in the match.
     index_within_document -- the index of the document token that matched the search phrase
         root token.
+    original_index_within_list, is_overlapping_relation, topic_score -- set on matches found
+        during topic matching by *TopicMatcher*.
     """
 
+    __slots__ = (
+        'word_matches', 'is_negated', 'is_uncertain', 'search_phrase_label', 'search_phrase_text',
+        'document_label', 'from_single_word_phraselet',
+        'from_topic_match_phraselet_created_without_matching_tags',
+        'from_reverse_only_topic_match_phraselet', 'index_within_document',
+        'overall_similarity_measure', 'original_index_within_list', 'is_overlapping_relation',
+        'topic_score')
+
     def __init__(
             self, search_phrase_label, search_phrase_text, document_label,
             from_single_word_phraselet, from_topic_match_phraselet_created_without_matching_tags,
@@ -184,6 +202,119 @@ class Match:
         subword_index = self.get_subword_index()
         return subword_index if subword_index is not None else -1
 
+class CorpusEmbeddingMatrix:
+    """A matrix holding the L2-normalised vectors of the words in a corpus index, which allows a
+        search phrase root word to be compared with every document word in a single operation.
+
+        The vector for each key word is taken from the first document position indexed under it.
+        Key words whose example position is not permitted to take part in embedding-based
+        matching or that have no vector are not assigned a row. The matrix is only built the first
+        time it is required and is then maintained incrementally as documents are added to and
+        removed from the corpus index.
+    """
+
+    def __init__(self, structural_matcher):
+        self.structural_matcher = structural_matcher
+        self.is_built = False
+        self.clear()
+
+    def clear(self):
+        self.key_words_to_rows = {}
+        self.row_key_words = []
+        self.row_document_labels = []
+        self.free_rows = []
+        self.matrix = None
+
+    def build(self, corpus_index_dict, document_labels_to_documents):
+        """Populates the matrix from a complete corpus index."""
+        self.clear()
+        self.is_built = True
+        self.add_key_words(corpus_index_dict, document_labels_to_documents, corpus_index_dict)
+
+    def add_key_words(self, corpus_index_dict, document_labels_to_documents, key_words):
+        """Assigns rows to those key words from *key_words* that do not yet have one. Does nothing
+            if the matrix has not been built.
+        """
+        if not self.is_built:
+            return
+        for key_word in key_words:
+            if key_word not in self.key_words_to_rows and key_word in corpus_index_dict:
+                self.assign_row(
+                    key_word, corpus_index_dict[key_word], document_labels_to_documents)
+
+    def remove_document(
+            self, corpus_index_dict, document_labels_to_documents, document_label, key_words):
+        """Frees the rows of key words that are no longer in the corpus index after the removal of
+            the document *document_label* and reassigns the rows of key words whose example
+            position was within that document. Does nothing if the matrix has not been built.
+        """
+        if not self.is_built:
+            return
+        for key_word in key_words:
+            if key_word in self.key_words_to_rows:
+                row = self.key_words_to_rows[key_word]
+                if key_word in corpus_index_dict and \
+                        self.row_document_labels[row] != document_label:
+                    continue
+                self.free_row(key_word)
+            if key_word in corpus_index_dict:
+                self.assign_row(
+                    key_word, corpus_index_dict[key_word], document_labels_to_documents)
+
+    def assign_row(self, key_word, corpus_index_entry, document_labels_to_documents):
+        example_cwp = corpus_index_entry.get_first_corpus_word_position()
+        example_document_token = document_labels_to_documents[example_cwp.document_label][
+            example_cwp.index.token_index]
+        if example_cwp.index.is_subword():
+            example_obj = example_document_token._.holmes.subwords[
+                example_cwp.index.subword_index]
+        else:
+            example_obj = example_document_token
+        if not self.structural_matcher.embedding_matching_permitted(example_obj):
+            return
+        vector = example_obj.vector if example_cwp.index.is_subword() else \
+            example_document_token._.holmes.vector
+        if vector is None:
+            return
+        vector_norm = norm(vector)
+        if vector_norm == 0:
+            return
+        if self.matrix is None:
+            self.matrix = zeros((16, len(vector)), dtype=float32)
+        if len(self.free_rows) > 0:
+            row = self.free_rows.pop()
+            self.row_key_words[row] = key_word
+            self.row_document_labels[row] = example_cwp.document_label
+        else:
+            row = len(self.row_key_words)
+            if row == self.matrix.shape[0]:
+                self.matrix = vstack((self.matrix, zeros(self.matrix.shape, dtype=float32)))
+            self.row_key_words.append(key_word)
+            self.row_document_labels.append(example_cwp.document_label)
+        self.matrix[row] = vector / vector_norm
+        self.key_words_to_rows[key_word] = row
+
+    def free_row(self, key_word):
+        row = self.key_words_to_rows.pop(key_word)
+        self.matrix[row] = 0.0
+        self.row_key_words[row] = None
+        self.row_document_labels[row] = None
+        self.free_rows.append(row)
+
+    def get_similar_key_words(self, vector, threshold):
+        """Returns the key words whose vectors have a cosine similarity with *vector* of at least
+            *threshold*.
+        """
+        if len(self.key_words_to_rows) == 0:
+            return []
+        vector_norm = norm(vector)
+        if vector_norm == 0:
+            return []
+        similarities = self.matrix[:len(self.row_key_words)].dot(
+            (vector / vector_norm).astype(float32))
+        return [self.row_key_words[row] for row in flatnonzero(similarities >= threshold)
+            if self.row_key_words[row] is not None]
+
 class StructuralMatcher:
     """The class responsible for matching search phrases with documents."""
 
@@ -229,6 +360,111 @@ class StructuralMatcher:
         else:
             return 'direct'
 
+    def loop_search_phrase_word_representations(self, search_phrase, search_phrase_token):
+        """ Yields the textual representations with which *search_phrase_token* can match
+            directly together with their match types and derived lemmas.
+        """
+        search_phrase_token_holmes = get_annotation_store(
+            search_phrase.doc).holmes_dictionaries[search_phrase_token.i]
+        yield search_phrase_token_holmes.lemma, 'direct', \
+            search_phrase_token_holmes.lemma_or_derived_lemma()
+        hyphen_normalized_word = self.semantic_matching_helper.normalize_hyphens(
+            search_phrase_token_holmes.lemma)
+        if hyphen_normalized_word != search_phrase_token_holmes.lemma:
+            yield hyphen_normalized_word, 'direct', \
+                search_phrase_token_holmes.lemma_or_derived_lemma()
+        if self.analyze_derivational_morphology and \
+                search_phrase_token_holmes.derived_lemma is not None:
+            yield search_phrase_token_holmes.derived_lemma, 'derivation', \
+                search_phrase_token_holmes.lemma_or_derived_lemma()
+        if not search_phrase.topic_match_phraselet and \
+                search_phrase_token_holmes.lemma == search_phrase_token.lemma_ and \
+                search_phrase_token_holmes.lemma != search_phrase_token.text:
+            # search phrase word is not multiword, phrasal or separable verb, so we can match
+            # against its text as well as its lemma
+            yield search_phrase_token.text, 'direct', \
+                search_phrase_token_holmes.lemma_or_derived_lemma()
+        if self.analyze_derivational_morphology and self.ontology is not None:
+            for reverse_lemma in self.semantic_matching_helper.\
+                    reverse_derived_lemmas_in_ontology(search_phrase_token):
+                yield reverse_lemma, 'ontology', \
+                    search_phrase_token_holmes.lemma_or_derived_lemma()
+
+    def get_document_word_representations(self, document_token, document_subword_index):
+        """ Returns the textual representations of the document token or subword together with
+            their match types and derived lemmas.
+        """
+        document_token_holmes = get_annotation_store(
+            document_token.doc).holmes_dictionaries[document_token.i]
+        list_to_return = []
+        if document_subword_index is not None:
+            working_document_subword = document_token_holmes.subwords[document_subword_index]
+            list_to_return.append((
+                working_document_subword.text, 'direct',
+                working_document_subword.lemma_or_derived_lemma()))
+            hyphen_normalized_word = self.semantic_matching_helper.normalize_hyphens(
+                working_document_subword.text)
+            if hyphen_normalized_word != working_document_subword.text:
+                list_to_return.append((
+                    hyphen_normalized_word, 'direct',
+                    working_document_subword.lemma_or_derived_lemma()))
+            if working_document_subword.lemma != working_document_subword.text:
+                list_to_return.append((
+                    working_document_subword.lemma, 'direct',
+                    working_document_subword.lemma_or_derived_lemma()))
+            if self.analyze_derivational_morphology and \
+                    working_document_subword.derived_lemma is not None:
+                list_to_return.append((
+                    working_document_subword.derived_lemma,
+                    'derivation', working_document_subword.lemma_or_derived_lemma()))
+            if self.analyze_derivational_morphology and self.ontology is not None:
+                for reverse_lemma in self.semantic_matching_helper.\
+                        reverse_derived_lemmas_in_ontology(working_document_subword):
+                    list_to_return.append((
+                        reverse_lemma, 'ontology',
+                        working_document_subword.lemma_or_derived_lemma()))
+        else:
+            list_to_return.append((
+                document_token.text, 'direct',
+                document_token_holmes.lemma_or_derived_lemma()))
+            hyphen_normalized_word = self.semantic_matching_helper.normalize_hyphens(
+                document_token.text)
+            if hyphen_normalized_word != document_token.text:
+                list_to_return.append((
+                    hyphen_normalized_word, 'direct',
+                    document_token_holmes.lemma_or_derived_lemma()))
+            if document_token_holmes.lemma != document_token.text:
+                list_to_return.append((
+                    document_token_holmes.lemma, 'direct',
+                    document_token_holmes.lemma_or_derived_lemma()))
+            if self.analyze_derivational_morphology:
+                if document_token_holmes.derived_lemma is not None:
+                    list_to_return.append((
+                        document_token_holmes.derived_lemma,
+                        'derivation', document_token_holmes.lemma_or_derived_lemma()))
+            if self.analyze_derivational_morphology and self.ontology is not None:
+                for reverse_lemma in self.semantic_matching_helper.\
+                        reverse_derived_lemmas_in_ontology(document_token):
+                    list_to_return.append((
+                        reverse_lemma, 'ontology',
+                        document_token_holmes.lemma_or_derived_lemma()))
+        return list_to_return
+
+    def loop_document_multiword_representations(self, multiword_span):
+        yield multiword_span.text, 'direct', multiword_span.derived_lemma
+        hyphen_normalized_word = \
+            self.semantic_matching_helper.normalize_hyphens(multiword_span.text)
+        if hyphen_normalized_word != multiword_span.text:
+            yield hyphen_normalized_word, 'direct', multiword_span.derived_lemma
+        if multiword_span.text != multiword_span.lemma:
+            yield multiword_span.lemma, 'direct', multiword_span.derived_lemma
+        if multiword_span.derived_lemma != multiword_span.lemma:
+            yield multiword_span.derived_lemma, 'derivation', multiword_span.derived_lemma
+        if self.analyze_derivational_morphology and self.ontology is not None:
+            for reverse_lemma in self.semantic_matching_helper.\
+                    reverse_derived_lemmas_in_ontology(multiword_span):
+                yield reverse_lemma, 'ontology', multiword_span.derived_lemma
+
     def match_recursively(
             self, *, search_phrase, search_phrase_token, document, document_token,
             document_subword_index, search_phrase_tokens_to_word_matches,
@@ -239,6 +475,12 @@ class StructuralMatcher:
         """Called whenever matching is attempted between a search phrase token and a document
             token."""
 
+        document_holmes_dictionaries = get_annotation_store(document).holmes_dictionaries
+        search_phrase_annotation_store = get_annotation_store(search_phrase.doc)
+        search_phrase_token_holmes = \
+            search_phrase_annotation_store.holmes_dictionaries[search_phrase_token.i]
+        document_token_holmes = document_holmes_dictionaries[document_token.i]
+
         def handle_match(
                 search_phrase_word, document_word, match_type, depth,
                 *, similarity_measure=1.0, first_document_token=document_token,
@@ -257,27 +499,27 @@ class StructuralMatcher:
                 question word or governs an initial question word.
             """
             for dependency in (
-                    dependency for dependency in search_phrase_token._.holmes.children
-                    if dependency.child_token(search_phrase_token.doc)._.holmes.is_matchable or
+                    dependency for dependency in search_phrase_token_holmes.children
+                    if search_phrase_annotation_store.child_dictionary(dependency).is_matchable or
                     (process_initial_question_words and
-                    dependency.child_token(
-                    search_phrase_token.doc)._.holmes.is_initial_question_word)):
+                    search_phrase_annotation_store.child_dictionary(
+                    dependency).is_initial_question_word)):
                 at_least_one_document_dependency_tried = False
                 at_least_one_document_dependency_matched = False
                 # Loop through this token and any tokens linked to it by coreference
                 parents = [Index(document_token.i, document_subword_index)]
                 if self.perform_coreference_resolution and (document_subword_index is None or
-                        document_token._.holmes.subwords[document_subword_index].is_head):
+                        document_token_holmes.subwords[document_subword_index].is_head):
                     parents.extend([
                         Index(token_index, None) for token_index in
-                        document_token._.holmes.token_and_coreference_chain_indexes
+                        document_token_holmes.token_and_coreference_chain_indexes
                         if token_index != document_token.i])
                 for working_document_parent_index in parents:
                     working_document_child_indexes = []
-                    document_parent_token = document_token.doc[
+                    document_parent_holmes = document_holmes_dictionaries[
                         working_document_parent_index.token_index]
                     if not working_document_parent_index.is_subword() or \
-                            document_parent_token._.holmes.subwords[
+                            document_parent_holmes.subwords[
                             working_document_parent_index.subword_index].is_head:
                             # is_head: e.g. 'Polizeiinformation über Kriminelle' should match
                             # 'Information über Kriminelle'
@@ -286,14 +528,14 @@ class StructuralMatcher:
                         # dependency has been matched backwards
                         document_dependencies_to_inverse_polarity_booleans = {
                             document_dependency: False for document_dependency in
-                            document_parent_token._.holmes.children if
+                            document_parent_holmes.children if
                             self.semantic_matching_helper.dependency_labels_match(
                             search_phrase_dependency_label=dependency.label,
                             document_dependency_label=document_dependency.label,
                             inverse_polarity=False)}
                         document_dependencies_to_inverse_polarity_booleans.update({
                             document_dependency: True for document_dependency in
-                            document_parent_token._.holmes.parents if
+                            document_parent_holmes.parents if
                             self.use_reverse_dependency_matching and
                             self.semantic_matching_helper.dependency_labels_match(
                             search_phrase_dependency_label=dependency.label,
@@ -311,9 +553,10 @@ class StructuralMatcher:
                                 # to the child by coreference
                                 working_document_child_indexes = [
                                     Index(token_index, None) for token_index in
-                                    document_child._.holmes.token_and_coreference_chain_indexes
+                                    document_holmes_dictionaries[document_child.i].\
+                                    token_and_coreference_chain_indexes
                                     if document_token.doc[token_index].pos_ != 'PRON' or not
-                                    document_token.doc[token_index]._.holmes.\
+                                    document_holmes_dictionaries[token_index].\
                                     is_involved_in_coreference()]
                                         # otherwise where matching starts with a noun and there is
                                         # a dependency pointing back to the noun, matching will be
@@ -328,14 +571,12 @@ class StructuralMatcher:
                             # the head subword as well as the entire word
                             for working_document_child_index in \
                                     working_document_child_indexes.copy():
-                                working_document_child = \
-                                    document_token.doc[working_document_child_index.token_index]
                                 for subword in (
-                                        subword for subword in
-                                        working_document_child._.holmes.subwords
+                                        subword for subword in document_holmes_dictionaries[
+                                        working_document_child_index.token_index].subwords
                                         if subword.is_head):
                                     working_document_child_indexes.append(Index(
-                                        working_document_child.i, subword.index))
+                                        working_document_child_index.token_index, subword.index))
                             # Loop through the dependencies from each token
                             for working_document_child_index in (
                                     working_index for working_index
@@ -380,9 +621,8 @@ class StructuralMatcher:
                                     at_least_one_document_dependency_matched = True
                     if working_document_parent_index.is_subword():
                         # examine relationship to dependent subword in the same word
-                        document_parent_subword = document_token.doc[
-                            working_document_parent_index.token_index]._.holmes.\
-                            subwords[working_document_parent_index.subword_index]
+                        document_parent_subword = document_parent_holmes.subwords[
+                            working_document_parent_index.subword_index]
                         if document_parent_subword.dependent_index is not None and \
                                 self.semantic_matching_helper.dependency_labels_match(
                                     search_phrase_dependency_label=dependency.label,
@@ -414,9 +654,8 @@ class StructuralMatcher:
                                     initial_question_word_overall_similarity_threshold):
                                 at_least_one_document_dependency_matched = True
                         # examine relationship to governing subword in the same word
-                        document_child_subword = document_token.doc[
-                            working_document_parent_index.token_index]._.holmes.\
-                            subwords[working_document_parent_index.subword_index]
+                        document_child_subword = document_parent_holmes.subwords[
+                            working_document_parent_index.subword_index]
                         if document_child_subword.governor_index is not None and \
                                 self.use_reverse_dependency_matching and \
                                 self.semantic_matching_helper.dependency_labels_match(
@@ -457,7 +696,7 @@ class StructuralMatcher:
             if document_subword_index is None:
                 document_subword = None
             else:
-                document_subword = document_token._.holmes.subwords[document_subword_index]
+                document_subword = document_token_holmes.subwords[document_subword_index]
             search_phrase_tokens_to_word_matches[search_phrase_token.i].append(WordMatch(
                 search_phrase_token, search_phrase_word, document_token,
                 first_document_token, last_document_token, document_subword,
@@ -465,109 +704,14 @@ class StructuralMatcher:
                 structurally_matched_document_token, document_word, depth,
                 search_phrase_initial_question_word))
 
-        def loop_search_phrase_word_representations():
-            yield search_phrase_token._.holmes.lemma, 'direct', \
-                search_phrase_token._.holmes.lemma_or_derived_lemma()
-            hyphen_normalized_word = self.semantic_matching_helper.normalize_hyphens(
-                search_phrase_token._.holmes.lemma)
-            if hyphen_normalized_word != search_phrase_token._.holmes.lemma:
-                yield hyphen_normalized_word, 'direct', \
-                    search_phrase_token._.holmes.lemma_or_derived_lemma()
-            if self.analyze_derivational_morphology and \
-                    search_phrase_token._.holmes.derived_lemma is not None:
-                yield search_phrase_token._.holmes.derived_lemma, 'derivation', \
-                    search_phrase_token._.holmes.lemma_or_derived_lemma()
-            if not search_phrase.topic_match_phraselet and \
-                    search_phrase_token._.holmes.lemma == search_phrase_token.lemma_ and \
-                    search_phrase_token._.holmes.lemma != search_phrase_token.text:
-                # search phrase word is not multiword, phrasal or separable verb, so we can match
-                # against its text as well as its lemma
-                yield search_phrase_token.text, 'direct', \
-                    search_phrase_token._.holmes.lemma_or_derived_lemma()
-            if self.analyze_derivational_morphology and self.ontology is not None:
-                for reverse_lemma in self.semantic_matching_helper.\
-                        reverse_derived_lemmas_in_ontology(search_phrase_token):
-                    yield reverse_lemma, 'ontology', \
-                        search_phrase_token._.holmes.lemma_or_derived_lemma()
-
-        def document_word_representations():
-            list_to_return = []
-            if document_subword_index is not None:
-                working_document_subword = document_token._.holmes.subwords[document_subword_index]
-                list_to_return.append((
-                    working_document_subword.text, 'direct',
-                    working_document_subword.lemma_or_derived_lemma()))
-                hyphen_normalized_word = self.semantic_matching_helper.normalize_hyphens(
-                    working_document_subword.text)
-                if hyphen_normalized_word != working_document_subword.text:
-                    list_to_return.append((
-                        hyphen_normalized_word, 'direct',
-                        working_document_subword.lemma_or_derived_lemma()))
-                if working_document_subword.lemma != working_document_subword.text:
-                    list_to_return.append((
-                        working_document_subword.lemma, 'direct',
-                        working_document_subword.lemma_or_derived_lemma()))
-                if self.analyze_derivational_morphology and \
-                        working_document_subword.derived_lemma is not None:
-                    list_to_return.append((
-                        working_document_subword.derived_lemma,
-                        'derivation', working_document_subword.lemma_or_derived_lemma()))
-                if self.analyze_derivational_morphology and self.ontology is not None:
-                    for reverse_lemma in self.semantic_matching_helper.\
-                            reverse_derived_lemmas_in_ontology(working_document_subword):
-                        list_to_return.append((
-                            reverse_lemma, 'ontology',
-                            working_document_subword.lemma_or_derived_lemma()))
-            else:
-                list_to_return.append((
-                    document_token.text, 'direct',
-                    document_token._.holmes.lemma_or_derived_lemma()))
-                hyphen_normalized_word = self.semantic_matching_helper.normalize_hyphens(
-                    document_token.text)
-                if hyphen_normalized_word != document_token.text:
-                    list_to_return.append((
-                        hyphen_normalized_word, 'direct',
-                        document_token._.holmes.lemma_or_derived_lemma()))
-                if document_token._.holmes.lemma != document_token.text:
-                    list_to_return.append((
-                        document_token._.holmes.lemma, 'direct',
-                        document_token._.holmes.lemma_or_derived_lemma()))
-                if self.analyze_derivational_morphology:
-                    if document_token._.holmes.derived_lemma is not None:
-                        list_to_return.append((
-                            document_token._.holmes.derived_lemma,
-                            'derivation', document_token._.holmes.lemma_or_derived_lemma()))
-                if self.analyze_derivational_morphology and self.ontology is not None:
-                    for reverse_lemma in self.semantic_matching_helper.\
-                            reverse_derived_lemmas_in_ontology(document_token):
-                        list_to_return.append((
-                            reverse_lemma, 'ontology',
-                            document_token._.holmes.lemma_or_derived_lemma()))
-            return list_to_return
-
-        def loop_document_multiword_representations(multiword_span):
-            yield multiword_span.text, 'direct', multiword_span.derived_lemma
-            hyphen_normalized_word = \
-                self.semantic_matching_helper.normalize_hyphens(multiword_span.text)
-            if hyphen_normalized_word != multiword_span.text:
-                yield hyphen_normalized_word, 'direct', multiword_span.derived_lemma
-            if multiword_span.text != multiword_span.lemma:
-                yield multiword_span.lemma, 'direct', multiword_span.derived_lemma
-            if multiword_span.derived_lemma != multiword_span.lemma:
-                yield multiword_span.derived_lemma, 'derivation', multiword_span.derived_lemma
-            if self.analyze_derivational_morphology and self.ontology is not None:
-                for reverse_lemma in self.semantic_matching_helper.\
-                        reverse_derived_lemmas_in_ontology(multiword_span):
-                    yield reverse_lemma, 'ontology', multiword_span.derived_lemma
-
         index = Index(document_token.i, document_subword_index)
         search_phrase_and_document_visited_table[search_phrase_token.i].add(index)
-        is_negated = document_token._.holmes.is_negated
-        if document_token._.holmes.is_uncertain:
+        is_negated = document_token_holmes.is_negated
+        if document_token_holmes.is_uncertain:
             is_uncertain = True
 
         search_phrase_initial_question_word = process_initial_question_words and \
-            search_phrase_token._.holmes.has_initial_question_word_in_phrase
+            search_phrase_token_holmes.has_initial_question_word_in_phrase
         if self.semantic_matching_helper.is_entity_search_phrase_token(
                 search_phrase_token, search_phrase.topic_match_phraselet) and \
                 document_subword_index is None:
@@ -598,9 +742,11 @@ class StructuralMatcher:
                 return True
             return False
 
-        document_word_representations = document_word_representations()
+        document_word_representations = self.get_document_word_representations(
+            document_token, document_subword_index)
         for search_phrase_word_representation, search_phrase_match_type, \
-                search_phrase_derived_lemma in loop_search_phrase_word_representations():
+                search_phrase_derived_lemma in self.loop_search_phrase_word_representations(
+                search_phrase, search_phrase_token):
             # multiword matches
             if document_subword_index is None:
                 for multiword_span in \
@@ -608,14 +754,14 @@ class StructuralMatcher:
                         document_token):
                     for multiword_span_representation, document_match_type, \
                             multispan_derived_lemma in \
-                            loop_document_multiword_representations(multiword_span):
+                            self.loop_document_multiword_representations(multiword_span):
                         if search_phrase_word_representation.lower() == \
                                 multiword_span_representation.lower():
                             for working_token in multiword_span.tokens:
                                 search_phrase_and_document_visited_table[search_phrase_token.i].add(
                                     working_token.i)
                             handle_match(
-                                search_phrase_token._.holmes.lemma,
+                                search_phrase_token_holmes.lemma,
                                 multiword_span_representation,
                                 self.match_type(
                                     search_phrase_derived_lemma == multispan_derived_lemma,
@@ -666,13 +812,13 @@ class StructuralMatcher:
                         return True
 
         if document_subword_index is not None:
-            document_word_to_use = document_token._.holmes.subwords[document_subword_index].lemma
-            document_vector = document_token._.holmes.subwords[document_subword_index].vector if \
+            document_word_to_use = document_token_holmes.subwords[document_subword_index].lemma
+            document_vector = document_token_holmes.subwords[document_subword_index].vector if \
                 self.embedding_matching_permitted(
-                document_token._.holmes.subwords[document_subword_index]) else None
+                document_token_holmes.subwords[document_subword_index]) else None
         else:
             document_word_to_use = document_token.lemma_
-            document_vector = document_vector = document_token._.holmes.vector if \
+            document_vector = document_vector = document_token_holmes.vector if \
                 self.embedding_matching_permitted(document_token) else None
 
         if (overall_similarity_threshold < 1.0 or (search_phrase_initial_question_word and
@@ -685,7 +831,7 @@ class StructuralMatcher:
                 search_phrase_token.i]
             if document_subword_index is not None:
                 if not self.embedding_matching_permitted(
-                        document_token._.holmes.subwords[document_subword_index]):
+                        document_token_holmes.subwords[document_subword_index]):
                     return False
             else:
                 if not self.embedding_matching_permitted(document_token):
@@ -700,10 +846,10 @@ class StructuralMatcher:
                     document_vector)
                 if similarity_measure > single_token_similarity_threshold:
                     if not search_phrase.topic_match_phraselet and \
-                            len(search_phrase_token._.holmes.lemma.split()) > 1:
+                            len(search_phrase_token_holmes.lemma.split()) > 1:
                         search_phrase_word_to_use = search_phrase_token.lemma_
                     else:
-                        search_phrase_word_to_use = search_phrase_token._.holmes.lemma
+                        search_phrase_word_to_use = search_phrase_token_holmes.lemma
                     handle_match(
                         search_phrase_word_to_use, document_word_to_use, 'embedding', 0,
                         similarity_measure=similarity_measure,
@@ -734,7 +880,7 @@ class StructuralMatcher:
                         search_phrase_initial_question_word=search_phrase_initial_question_word)
                     return True
 
-        if process_initial_question_words and search_phrase_token._.holmes.is_initial_question_word:
+        if process_initial_question_words and search_phrase_token_holmes.is_initial_question_word:
             if document_vector is not None:
                 question_word_matches = self.semantic_matching_helper.question_word_matches(
                     search_phrase.label, search_phrase_token, document_token, document_vector,
@@ -759,7 +905,7 @@ class StructuralMatcher:
                             last_document_token_index = last_document_token_index + 1
                         else:
                             break
-                handle_match(search_phrase_token._.holmes.lemma, document_word_to_use, 'question',
+                handle_match(search_phrase_token_holmes.lemma, document_word_to_use, 'question',
                     0, first_document_token=document_token.doc[first_document_token_index],
                     last_document_token=document_token.doc[last_document_token_index],
                     search_phrase_initial_question_word=True)
@@ -784,14 +930,19 @@ class StructuralMatcher:
             raise RuntimeError("'obj' must be either a Token or a Subword")
 
     def build_matches(
-            self, *, search_phrase, search_phrase_tokens_to_word_matches, document_label,
-            overall_similarity_threshold, initial_question_word_overall_similarity_threshold):
+            self, *, search_phrase, search_phrase_tokens_to_word_matches, document,
+            document_label, overall_similarity_threshold,
+            initial_question_word_overall_similarity_threshold):
         """Investigate possible matches when recursion is complete."""
 
+        document_annotation_store = get_annotation_store(document)
+        document_holmes_dictionaries = document_annotation_store.holmes_dictionaries
+
         def mention_root_or_token_index(token):
-            if len(token._.coref_chains) == 0:
+            coref_chains = document_annotation_store.coref_chains[token.i]
+            if len(coref_chains) == 0:
                 return token.i
-            for mention in (m for m in token._.coref_chains[0].mentions if token.i in
+            for mention in (m for m in coref_chains[0].mentions if token.i in
                     m.token_indexes):
                 return mention.root_index
 
@@ -812,10 +963,8 @@ class StructuralMatcher:
             for structural_index in structural_indexes_to_word_matches:
                 # For each structural token, find the best matching coreference mention
                 relevant_word_matches = structural_indexes_to_word_matches[structural_index]
-                structurally_matched_document_token = \
-                    relevant_word_matches[0].document_token.doc[structural_index]
                 already_added_document_token_indexes = set()
-                if structurally_matched_document_token._.holmes.is_involved_in_coreference():
+                if document_holmes_dictionaries[structural_index].is_involved_in_coreference():
                     working_index = -1
                     for relevant_word_match in relevant_word_matches:
                         this_index = mention_root_or_token_index(relevant_word_match.document_token)
@@ -852,17 +1001,16 @@ class StructuralMatcher:
                     word_match for word_match in word_matches
                     if word_match.word_match_type in ('direct', 'derivation', 'ontology')
                     and word_match.document_subword is None and
-                    word_match.document_token._.holmes.most_specific_coreferring_term_index
-                    is not None):
-                most_specific_document_token = word_match.document_token.doc[
-                    word_match.document_token._.holmes.most_specific_coreferring_term_index]
-                if word_match.document_token._.holmes.lemma != \
-                        most_specific_document_token._.holmes.lemma:
+                    document_holmes_dictionaries[word_match.document_token.i].
+                    most_specific_coreferring_term_index is not None):
+                most_specific_coreferring_term_index = document_holmes_dictionaries[
+                    word_match.document_token.i].most_specific_coreferring_term_index
+                most_specific_document_token = document[most_specific_coreferring_term_index]
+                if document_holmes_dictionaries[word_match.document_token.i].lemma != \
+                        document_holmes_dictionaries[most_specific_coreferring_term_index].lemma:
                     for multiword_span in \
                             self.semantic_matching_helper.multiword_spans_with_head_token(
-                            word_match.document_token.doc[
-                            word_match.document_token._.holmes.
-                            most_specific_coreferring_term_index]):
+                            most_specific_document_token):
                         word_match.extracted_word = multiword_span.text
                         break
                     else:
@@ -905,16 +1053,18 @@ class StructuralMatcher:
                 return False
             if self.perform_coreference_resolution and (parent_subword is None
                     or parent_subword.is_head):
-                parents = parent_token._.holmes.token_and_coreference_chain_indexes
-                children = child_token._.holmes.token_and_coreference_chain_indexes
+                parents = document_holmes_dictionaries[
+                    parent_token.i].token_and_coreference_chain_indexes
+                children = document_holmes_dictionaries[
+                    child_token.i].token_and_coreference_chain_indexes
             else:
                 parents = [parent_token.i]
                 children = [child_token.i]
             for parent in parents:
                 for child in children:
-                    if parent_token.doc[parent]._.holmes.has_dependency_with_child_index(child):
+                    if document_holmes_dictionaries[parent].has_dependency_with_child_index(child):
                         return True
-                    if child_token.doc[child]._.holmes.has_dependency_with_child_index(parent):
+                    if document_holmes_dictionaries[child].has_dependency_with_child_index(parent):
                         return True
             return False
 
@@ -974,6 +1124,8 @@ class StructuralMatcher:
                         working_matches.append(working_match)
             matches = working_matches
 
+        search_phrase_holmes_dictionaries = \
+            get_annotation_store(search_phrase.doc).holmes_dictionaries
         matches_to_return = []
         for match in matches:
             failed = False
@@ -983,7 +1135,8 @@ class StructuralMatcher:
             if len(match.word_matches) > 2:
                 for parent_word_match in match.word_matches:
                     for search_phrase_dependency in \
-                            parent_word_match.search_phrase_token._.holmes.children:
+                            search_phrase_holmes_dictionaries[
+                            parent_word_match.search_phrase_token.i].children:
                         for child_word_match in (
                                 cwm for cwm in match.word_matches if cwm.search_phrase_token.i ==
                                 search_phrase_dependency.child_index):
@@ -1049,7 +1202,8 @@ class StructuralMatcher:
             document_subword_index=document_subword_index,
             search_phrase_tokens_to_word_matches=search_phrase_tokens_to_word_matches,
             search_phrase_and_document_visited_table=search_phrase_and_document_visited_table,
-            is_uncertain=document_token._.holmes.is_uncertain,
+            is_uncertain=get_annotation_store(document).holmes_dictionaries[
+                document_token.i].is_uncertain,
             structurally_matched_document_token=document_token,
             compare_embeddings_on_non_root_words=compare_embeddings_on_non_root_words,
             process_initial_question_words=process_initial_question_words,
@@ -1059,6 +1213,7 @@ class StructuralMatcher:
         working_matches = self.build_matches(
             search_phrase=search_phrase,
             search_phrase_tokens_to_word_matches=search_phrase_tokens_to_word_matches,
+            document=document,
             document_label=document_label,
             overall_similarity_threshold=overall_similarity_threshold,
             initial_question_word_overall_similarity_threshold=
@@ -1066,6 +1221,176 @@ class StructuralMatcher:
         matches_to_return.extend(working_matches)
         return matches_to_return
 
+    def get_dependency_edges(self, document, document_label, corpus_index_dict, key_words):
+        """ Returns a dictionary from the dependency edges within *document* to the sets of corpus
+            word positions at which they occur, for adding to a *DependencyEdgeIndex*. The
+            dependencies, coreference chains and subwords examined for each position are the ones
+            *match_recursively()* examines when it looks for the child of a search phrase root
+            word, so that every position at which a two-word search phrase can match directly is
+            held under at least one edge the search phrase looks up.
+
+            Parameters:
+
+            document -- the parsed document.
+            document_label -- the label of the document.
+            corpus_index_dict -- the corpus index to which the document has already been added.
+            key_words -- the key words under which the document was added to *corpus_index_dict*.
+        """
+
+        def get_child_words(child_index):
+            if child_index not in child_indexes_to_words:
+                document_token = document[child_index.token_index]
+                child_words = {representation.lower() for representation, _, _ in
+                    self.get_document_word_representations(
+                    document_token, child_index.subword_index)}
+                if child_index.subword_index is None:
+                    for multiword_span in \
+                            self.semantic_matching_helper.multiword_spans_with_head_token(
+                            document_token):
+                        child_words.update(representation.lower() for representation, _, _ in
+                            self.loop_document_multiword_representations(multiword_span))
+                child_indexes_to_words[child_index] = child_words
+            return child_indexes_to_words[child_index]
+
+        def get_label_classes_and_child_indexes(index):
+            label_classes_and_child_indexes = []
+            document_token = document[index.token_index]
+            parent_indexes = [index]
+            if self.perform_coreference_resolution and (not index.is_subword() or
+                    document_token._.holmes.subwords[index.subword_index].is_head):
+                parent_indexes.extend([
+                    Index(token_index, None) for token_index in
+                    document_token._.holmes.token_and_coreference_chain_indexes
+                    if token_index != document_token.i])
+            for parent_index in parent_indexes:
+                document_parent_token = document[parent_index.token_index]
+                if parent_index.is_subword() and not document_parent_token._.holmes.subwords[
+                        parent_index.subword_index].is_head:
+                    continue
+                document_dependencies_and_inverse_polarity_booleans = [
+                    (document_dependency, False) for document_dependency in
+                    document_parent_token._.holmes.children]
+                if self.use_reverse_dependency_matching:
+                    document_dependencies_and_inverse_polarity_booleans.extend([
+                        (document_dependency, True) for document_dependency in
+                        document_parent_token._.holmes.parents])
+                for document_dependency, inverse_polarity in \
+                        document_dependencies_and_inverse_polarity_booleans:
+                    if not inverse_polarity:
+                        document_child = document_dependency.child_token(document)
+                    else:
+                        document_child = document_dependency.parent_token(document)
+                    if self.perform_coreference_resolution:
+                        child_indexes = [
+                            Index(token_index, None) for token_index in
+                            document_child._.holmes.token_and_coreference_chain_indexes
+                            if document[token_index].pos_ != 'PRON' or not
+                            document[token_index]._.holmes.is_involved_in_coreference()]
+                    elif not inverse_polarity:
+                        child_indexes = [Index(document_dependency.child_index, None)]
+                    else:
+                        child_indexes = [Index(document_dependency.parent_index, None)]
+                    for child_index in child_indexes.copy():
+                        child_indexes.extend([
+                            Index(child_index.token_index, subword.index) for subword in
+                            document[child_index.token_index]._.holmes.subwords
+                            if subword.is_head])
+                    for child_index in child_indexes:
+                        label_classes_and_child_indexes.append(
+                            ((document_dependency.label, inverse_polarity), child_index))
+            if index.is_subword():
+                # relationships to dependent and governing subwords within the same word
+                document_subword = document_token._.holmes.subwords[index.subword_index]
+                if document_subword.dependent_index is not None:
+                    label_classes_and_child_indexes.append((
+                        (document_subword.dependency_label, False),
+                        Index(document_token.i, document_subword.dependent_index)))
+                if document_subword.governor_index is not None and \
+                        self.use_reverse_dependency_matching:
+                    label_classes_and_child_indexes.append((
+                        (document_subword.governing_dependency_label, True),
+                        Index(document_token.i, document_subword.governor_index)))
+            return label_classes_and_child_indexes
+
+        indexes_to_corpus_word_positions = {}
+        indexes_to_key_words = {}
+        for key_word in key_words:
+            for corpus_word_position, _, _ in corpus_index_dict[key_word].get_postings(
+                    {document_label}):
+                if corpus_word_position.index in indexes_to_key_words:
+                    indexes_to_key_words[corpus_word_position.index].add(key_word)
+                else:
+                    indexes_to_corpus_word_positions[corpus_word_position.index] = \
+                        corpus_word_position
+                    indexes_to_key_words[corpus_word_position.index] = {key_word}
+        child_indexes_to_words = {}
+        edges_to_corpus_word_positions = {}
+        for index, parent_key_words in indexes_to_key_words.items():
+            corpus_word_position = indexes_to_corpus_word_positions[index]
+            for label_class, child_index in get_label_classes_and_child_indexes(index):
+                for child_word in get_child_words(child_index):
+                    for parent_key_word in parent_key_words:
+                        edge = (parent_key_word, label_class, child_word)
+                        if edge in edges_to_corpus_word_positions:
+                            edges_to_corpus_word_positions[edge].add(corpus_word_position)
+                        else:
+                            edges_to_corpus_word_positions[edge] = {corpus_word_position}
+        return edges_to_corpus_word_positions
+
+    def get_search_phrase_index_information(self, search_phrase):
+        """ Returns a tuple of the corpus index keys under which the root word of *search_phrase*
+            can be found, whether the search phrase must always be matched because its root token
+            matches every noun, and whether its root token can match via embeddings.
+        """
+        root_token = search_phrase.root_token
+        if self.semantic_matching_helper.is_entitynoun_search_phrase_token(root_token):
+            return [], True, False
+        if self.semantic_matching_helper.is_entity_search_phrase_token(
+                root_token, search_phrase.topic_match_phraselet):
+            if search_phrase.topic_match_phraselet:
+                return [root_token._.holmes.lemma], False, False
+            else:
+                return [root_token.text], False, False
+        embedding_matchable = not search_phrase.reverse_only and \
+            self.embedding_matching_permitted(root_token) and \
+            search_phrase.matchable_non_entity_tokens_to_vectors.get(root_token.i) is not None
+        return search_phrase.words_matching_root_token, False, embedding_matchable
+
+    def get_dependency_edge_lookup(
+            self, search_phrase, dependency_edge_index, compare_embeddings_on_non_root_words):
+        """ Returns the label classes and child words with which the positions where
+            *search_phrase* can match are looked up in *dependency_edge_index*, or *None* if
+            the search phrase cannot be matched using the index. The index is only used for
+            search phrases with two matchable words where the child word can only match directly,
+            i.e. not via the ontology, embeddings, entity labels or question words.
+        """
+        if dependency_edge_index is None or self.ontology is not None or \
+                compare_embeddings_on_non_root_words or search_phrase.question_phraselet or \
+                len(search_phrase.matchable_token_indexes) != 2:
+            return None
+        root_token = search_phrase.root_token
+        child_token_indexes = [index for index in search_phrase.matchable_token_indexes
+            if index != root_token.i]
+        if len(child_token_indexes) != 1:
+            return None
+        child_token = search_phrase.doc[child_token_indexes[0]]
+        if self.semantic_matching_helper.is_entity_search_phrase_token(
+                root_token, search_phrase.topic_match_phraselet) or \
+                self.semantic_matching_helper.is_entity_search_phrase_token(
+                child_token, search_phrase.topic_match_phraselet) or \
+                child_token._.holmes.is_initial_question_word:
+            return None
+        label_classes = set()
+        for dependency in (dependency for dependency in root_token._.holmes.children if
+                dependency.child_index == child_token.i):
+            label_classes.update(dependency_edge_index.get_label_classes(
+                dependency.label, self.semantic_matching_helper))
+        if len(label_classes) == 0:
+            return None
+        child_words = {representation.lower() for representation, _, _ in
+            self.loop_search_phrase_word_representations(search_phrase, child_token)}
+        return label_classes, child_words
+
     def match(
             self, *, document_labels_to_documents,
             corpus_index_dict,
@@ -1078,7 +1403,11 @@ class StructuralMatcher:
             process_initial_question_words,
             overall_similarity_threshold,
             initial_question_word_overall_similarity_threshold,
-            document_label_filter=None):
+            document_label_filter=None,
+            document_labels=None,
+            corpus_embedding_matrix=None,
+            document_label_index=None,
+            dependency_edge_index=None):
         """Finds and returns matches between search phrases and documents.
         match_depending_on_single_words -- 'True' to match only single word search phrases,
             'False' to match only non-single-word search phrases and 'None' to match both.
@@ -1098,11 +1427,33 @@ class StructuralMatcher:
             word.
         document_label_filter -- a string with which the label of a document must begin for that
             document to be considered for matching, or 'None' if no filter is in use.
+        document_labels -- a set of the labels of the documents to which matching is restricted
+            in addition to *document_label_filter*, or 'None' if no such restriction is in use.
+        corpus_embedding_matrix -- a *CorpusEmbeddingMatrix* maintained for *corpus_index_dict*,
+            or 'None' if a temporary matrix should be built when one is required.
+        document_label_index -- a *DocumentLabelIndex* maintained for
+            *document_labels_to_documents* used to find the documents that pass
+            *document_label_filter*, or 'None' if the document labels should be examined instead.
+        dependency_edge_index -- a *DependencyEdgeIndex* maintained for *corpus_index_dict* used
+            to find the positions at which two-word search phrases can match, or 'None' if
+            matching should be attempted at every position of the root word.
         """
 
-        def filter_out(document_label):
-            return document_label_filter is not None and document_label is not None and \
-                not document_label.startswith(str(document_label_filter))
+        if document_label_filter is None:
+            filtered_document_labels = None
+        elif document_label_index is not None:
+            filtered_document_labels = set(document_label_index.get_labels_with_prefix(
+                str(document_label_filter)))
+        else:
+            filtered_document_labels = {
+                document_label for document_label in document_labels_to_documents
+                if document_label is None or
+                document_label.startswith(str(document_label_filter))}
+        if document_labels is not None:
+            filtered_document_labels = document_labels if filtered_document_labels is None \
+                else filtered_document_labels & document_labels
+        if filtered_document_labels is not None and len(filtered_document_labels) == 0:
+            return []
 
         if overall_similarity_threshold == 1.0 and \
                 initial_question_word_overall_similarity_threshold == 1.0:
@@ -1114,12 +1465,24 @@ class StructuralMatcher:
             reverse_matching_corpus_word_positions = set()
         if embedding_reverse_matching_corpus_word_positions is None:
             embedding_reverse_matching_corpus_word_positions = set()
+        if match_specific_indexes:
+            # The positions are packed once so that the postings for each search phrase can be
+            # restricted to them without creating an object for each posting
+            packed_embedding_reverse_matching_positions = PackedCorpusWordPositions(
+                embedding_reverse_matching_corpus_word_positions)
+            packed_reverse_matching_positions = PackedCorpusWordPositions(
+                reverse_matching_corpus_word_positions,
+                embedding_reverse_matching_corpus_word_positions)
+        else:
+            packed_embedding_reverse_matching_positions = packed_reverse_matching_positions = None
 
         matches = []
         # Dictionary used to improve performance when embedding-based matching for root tokens
         # is active and there are multiple search phrases with the same root token word: the
         # same corpus word positions will then match all the search phrase root tokens.
         root_lexeme_to_cwps_to_match_dict = {}
+        if corpus_embedding_matrix is None:
+            corpus_embedding_matrix = CorpusEmbeddingMatrix(self)
 
         for search_phrase in search_phrases:
             if not search_phrase.has_single_matchable_word and match_depending_on_single_words:
@@ -1138,21 +1501,20 @@ class StructuralMatcher:
                 # performance we avoid entering the subgraph matching code.
                 search_phrase_token = [
                     token for token in search_phrase.doc if token._.holmes.is_matchable][0]
-                existing_minimal_match_cwps = []
+                existing_minimal_match_positions = set()
                 for word_matching_root_token in search_phrase.words_matching_root_token:
                     if word_matching_root_token in corpus_index_dict:
                         search_phrase_match_type, depth = \
                                 search_phrase.root_word_to_match_info_dict[
                                     word_matching_root_token]
-                        for corpus_word_position, document_word_representation, \
+                        for document_label, token_index, subword_index, \
+                                document_word_representation, \
                                 document_match_type_is_derivation in \
-                                corpus_index_dict[word_matching_root_token]:
-                            if filter_out(corpus_word_position.document_label):
-                                continue
-                            if corpus_word_position in existing_minimal_match_cwps:
+                                corpus_index_dict[word_matching_root_token].\
+                                get_unpacked_postings(filtered_document_labels):
+                            position = (document_label, token_index, subword_index)
+                            if position in existing_minimal_match_positions:
                                 continue
-                            document_label = corpus_word_position.document_label
-                            index = corpus_word_position.index
                             doc = document_labels_to_documents[document_label]
                             if document_match_type_is_derivation:
                                 document_match_type = 'derivation'
@@ -1165,13 +1527,13 @@ class StructuralMatcher:
                                 True, search_phrase.
                                 topic_match_phraselet_created_without_matching_tags,
                                 search_phrase.reverse_only)
-                            minimal_match.index_within_document = index.token_index
+                            minimal_match.index_within_document = token_index
                             matched = False
                             if len(word_matching_root_token.split()) > 1:
                                 for multiword_span in \
                                         self.semantic_matching_helper.\
                                         multiword_spans_with_head_token(
-                                        doc[index.token_index]):
+                                        doc[token_index]):
                                     for textual_representation, _ in \
                                             self.semantic_matching_helper.\
                                             loop_textual_representations(multiword_span):
@@ -1181,21 +1543,21 @@ class StructuralMatcher:
                                             minimal_match.word_matches.append(WordMatch(
                                                 search_phrase_token,
                                                 search_phrase_token._.holmes.lemma,
-                                                doc[index.token_index],
+                                                doc[token_index],
                                                 multiword_span.tokens[0],
                                                 multiword_span.tokens[-1],
                                                 None,
                                                 document_word_representation,
                                                 match_type,
-                                                1.0, False, False, doc[index.token_index],
+                                                1.0, False, False, doc[token_index],
                                                 document_word_representation, depth, False))
                                             break
                                     if matched:
                                         break
                             if not matched:
-                                token = doc[index.token_index]
-                                if index.is_subword():
-                                    subword = token._.holmes.subwords[index.subword_index]
+                                token = doc[token_index]
+                                if subword_index is not None:
+                                    subword = token._.holmes.subwords[subword_index]
                                 else:
                                     subword = None
                                 minimal_match.word_matches.append(WordMatch(
@@ -1211,7 +1573,7 @@ class StructuralMatcher:
                                     document_word_representation, depth, False))
                                 if token._.holmes.is_negated:
                                     minimal_match.is_negated = True
-                            existing_minimal_match_cwps.append(corpus_word_position)
+                            existing_minimal_match_positions.add(position)
                             matches.append(minimal_match)
                 continue
             direct_matching_corpus_word_positions = []
@@ -1219,6 +1581,9 @@ class StructuralMatcher:
                     search_phrase.root_token): # phraselets are not generated for
                                                # ENTITYNOUN roots, so not relevant to topic matching
                 for document_label, doc in document_labels_to_documents.items():
+                    if filtered_document_labels is not None and \
+                            document_label not in filtered_document_labels:
+                        continue
                     for token in doc:
                         if token.pos_ in self.semantic_matching_helper.noun_pos:
                             matches.extend(
@@ -1237,27 +1602,31 @@ class StructuralMatcher:
                 else:
                     entity_label = search_phrase.root_token.text
                 if entity_label in corpus_index_dict.keys():
-                    entity_matching_corpus_word_positions = [
-                        cwp for cwp, _, _ in corpus_index_dict[entity_label]]
-                    if match_specific_indexes:
-                        entity_matching_corpus_word_positions = [
-                            cwp for cwp in entity_matching_corpus_word_positions
-                            if cwp in reverse_matching_corpus_word_positions
-                            or cwp in embedding_reverse_matching_corpus_word_positions
-                            and not cwp.index.is_subword()]
+                    # entity postings never refer to subwords
                     matched_corpus_word_positions.update(
-                        entity_matching_corpus_word_positions)
+                        corpus_index_dict[entity_label].get_corpus_word_positions(
+                            filtered_document_labels, packed_reverse_matching_positions))
             else:
+                dependency_edge_lookup = self.get_dependency_edge_lookup(
+                    search_phrase, dependency_edge_index, compare_embeddings_on_non_root_words)
                 for word_matching_root_token in search_phrase.words_matching_root_token:
                     if word_matching_root_token in corpus_index_dict.keys():
-                        direct_matching_corpus_word_positions = [
-                            cwp for cwp, _, _ in corpus_index_dict[
-                                word_matching_root_token]]
-                        if match_specific_indexes:
-                            direct_matching_corpus_word_positions = [
-                                cwp for cwp in direct_matching_corpus_word_positions
-                                if cwp in reverse_matching_corpus_word_positions
-                                or cwp in embedding_reverse_matching_corpus_word_positions]
+                        if dependency_edge_lookup is not None:
+                            # Matching can only succeed where the root word governs the child
+                            # word, so the other positions of the root word are not examined
+                            direct_matching_corpus_word_positions = list(
+                                dependency_edge_index.get_corpus_word_positions(
+                                word_matching_root_token, *dependency_edge_lookup,
+                                filtered_document_labels))
+                            if match_specific_indexes:
+                                direct_matching_corpus_word_positions = [
+                                    cwp for cwp in direct_matching_corpus_word_positions
+                                    if cwp in reverse_matching_corpus_word_positions
+                                    or cwp in embedding_reverse_matching_corpus_word_positions]
+                        else:
+                            direct_matching_corpus_word_positions = corpus_index_dict[
+                                word_matching_root_token].get_corpus_word_positions(
+                                filtered_document_labels, packed_reverse_matching_positions)
                         matched_corpus_word_positions.update(
                             direct_matching_corpus_word_positions)
             if compare_embeddings_on_root_words and not \
@@ -1275,57 +1644,37 @@ class StructuralMatcher:
                         root_lexeme_to_cwps_to_match_dict[root_token_lemma_to_use])
                 else:
                     working_cwps_to_match_for_cache = set()
-                    for document_word in corpus_index_dict:
-                        corpus_word_positions_to_match = [
-                            cwp for cwp, _, _ in corpus_index_dict[document_word]]
-                        if match_specific_indexes:
-                            corpus_word_positions_to_match = [
-                                cwp for cwp in corpus_word_positions_to_match
-                                if cwp in embedding_reverse_matching_corpus_word_positions
-                                and cwp not in direct_matching_corpus_word_positions]
-                            if len(corpus_word_positions_to_match) == 0:
-                                continue
-                        search_phrase_vector = \
-                                search_phrase.matchable_non_entity_tokens_to_vectors[
-                                    search_phrase.root_token.i]
-                        example_cwp = corpus_word_positions_to_match[0]
-                        example_doc = document_labels_to_documents[example_cwp.document_label]
-                        example_index = example_cwp.index
-                        example_document_token = example_doc[example_index.token_index]
-                        if example_index.is_subword():
-                            if not self.embedding_matching_permitted(
-                                    example_document_token._.holmes.subwords[
-                                    example_index.subword_index]):
-                                continue
-                            document_vector = example_document_token._.holmes.subwords[
-                                example_index.subword_index].vector
-                        else:
-                            if not self.embedding_matching_permitted(example_document_token):
-                                continue
-                            document_vector = example_document_token._.holmes.vector
-                        if search_phrase_vector is not None and document_vector is not None:
-                            similarity_measure = \
-                                self.semantic_matching_helper.cosine_similarity(
-                                search_phrase_vector,
-                                document_vector)
-                            search_phrase_initial_question_word = process_initial_question_words \
-                                and search_phrase.root_token._.holmes.\
-                                has_initial_question_word_in_phrase
-                            single_token_similarity_threshold = \
-                                (initial_question_word_overall_similarity_threshold if
-                                search_phrase_initial_question_word else
-                                overall_similarity_threshold) ** len(
-                                search_phrase.matchable_non_entity_tokens_to_vectors)
-                            if similarity_measure >= single_token_similarity_threshold:
-                                matched_corpus_word_positions.update(
-                                    corpus_word_positions_to_match)
-                                working_cwps_to_match_for_cache.update(
-                                    corpus_word_positions_to_match)
+                    search_phrase_vector = \
+                        search_phrase.matchable_non_entity_tokens_to_vectors[
+                            search_phrase.root_token.i]
+                    if search_phrase_vector is not None:
+                        if not corpus_embedding_matrix.is_built:
+                            corpus_embedding_matrix.build(
+                                corpus_index_dict, document_labels_to_documents)
+                        search_phrase_initial_question_word = process_initial_question_words \
+                            and search_phrase.root_token._.holmes.\
+                            has_initial_question_word_in_phrase
+                        single_token_similarity_threshold = \
+                            (initial_question_word_overall_similarity_threshold if
+                            search_phrase_initial_question_word else
+                            overall_similarity_threshold) ** len(
+                            search_phrase.matchable_non_entity_tokens_to_vectors)
+                        for document_word in corpus_embedding_matrix.get_similar_key_words(
+                                search_phrase_vector, single_token_similarity_threshold):
+                            corpus_word_positions_to_match = \
+                                corpus_index_dict[document_word].get_corpus_word_positions(
+                                filtered_document_labels,
+                                packed_embedding_reverse_matching_positions)
+                            if match_specific_indexes:
+                                corpus_word_positions_to_match = [
+                                    cwp for cwp in corpus_word_positions_to_match
+                                    if cwp not in matched_corpus_word_positions]
+                            working_cwps_to_match_for_cache.update(
+                                corpus_word_positions_to_match)
+                        matched_corpus_word_positions.update(working_cwps_to_match_for_cache)
                     root_lexeme_to_cwps_to_match_dict[root_token_lemma_to_use] = \
                         working_cwps_to_match_for_cache
             for corpus_word_position in matched_corpus_word_positions:
-                if filter_out(corpus_word_position.document_label):
-                    continue
                 doc = document_labels_to_documents[corpus_word_position.document_label]
                 matches.extend(self.get_matches_starting_at_root_word_match(
                     search_phrase, doc, doc[corpus_word_position.index.token_index],
@@ -1,11 +1,14 @@
 import math
 import pickle
 import importlib
+from bisect import bisect_left, insort
 from abc import ABC, abstractmethod
 from functools import total_ordering
+from collections import OrderedDict
+from threading import Lock
 import srsly
 import pkg_resources
-from numpy import dot
+from numpy import dot, array, int32, int64, bool_, concatenate, unique, isin, insert
 from numpy.linalg import norm
 from spacy.tokens import Token, Doc
 from .errors import WrongModelDeserializationError, WrongVersionDeserializationError,\
@@ -13,11 +16,30 @@ from .errors import WrongModelDeserializationError, WrongVersionDeserializationE
         SearchPhraseContainsConjunctionError, SearchPhraseWithoutMatchableWordsError,\
         SearchPhraseContainsMultipleClausesError, SearchPhraseContainsCoreferringPronounError
 
-SERIALIZED_DOCUMENT_VERSION = '3.1'
+SERIALIZED_DOCUMENT_VERSION = '4.0'
+
+# Versions that can still be deserialized. Version 3.1 documents store each token annotation as a
+# separate pickled object.
+READABLE_SERIALIZED_DOCUMENT_VERSIONS = ('3.1', '4.0')
+
+def get_slot_state(obj):
+    """ Returns the attributes of an object whose class defines *__slots__* as a dictionary, which
+        is the form in which such objects were pickled before their classes defined *__slots__*.
+    """
+    return {name: getattr(obj, name) for name in obj.__slots__ if hasattr(obj, name)}
+
+def set_slot_state(obj, state):
+    """ Restores attributes returned by *get_slot_state()* or pickled as an instance
+        dictionary.
+    """
+    for name, value in state.items():
+        setattr(obj, name, value)
 
 class SemanticDependency:
     """A labelled semantic dependency between two tokens."""
 
+    __slots__ = ('parent_index', 'child_index', 'label', 'is_uncertain')
+
     def __init__(self, parent_index, child_index, label=None, is_uncertain=False):
         """Args:
 
@@ -79,6 +101,12 @@ class SemanticDependency:
     def __hash__(self):
         return hash((self.parent_index, self.child_index, self.label, self.is_uncertain))
 
+    def __getstate__(self):
+        return get_slot_state(self)
+
+    def __setstate__(self, state):
+        set_slot_state(self, state)
+
 class Mention:
     """ Simplified information about a coreference mention with respect to a specific token. """
 
@@ -104,7 +132,8 @@ class Subword:
         lemma -- the model-normalized representation of the subword string.
         derived_lemma -- where relevant, another lemma with which *lemma* is derivationally related
         and which can also be useful for matching in some usecases; otherwise *None*
-        vector -- the vector representation of *lemma*, or *None* if there is none available.
+        vectors_vocab -- the vocabulary from which the vector representation of *lemma* is
+            retrieved when it is required, or *None* if no vectors are available.
         char_start_index -- the character index of the subword within the containing word.
         dependent_index -- the index of a subword that is dependent on this subword, or *None*
             if there is no such subword.
@@ -115,8 +144,14 @@ class Subword:
         governing_dependency_label -- the label of the dependency between this subword and its
             governor, or *None* if it has no governor.
     """
+
+    __slots__ = (
+        'containing_token_index', 'index', 'text', 'lemma', 'derived_lemma', 'vectors_vocab',
+        'char_start_index', 'dependent_index', 'dependency_label', 'governor_index',
+        'governing_dependency_label')
+
     def __init__(
-            self, containing_token_index, index, text, lemma, derived_lemma, vector,
+            self, containing_token_index, index, text, lemma, derived_lemma, vectors_vocab,
             char_start_index, dependent_index, dependency_label, governor_index,
             governing_dependency_label):
         self.containing_token_index = containing_token_index
@@ -124,7 +159,7 @@ class Subword:
         self.text = text
         self.lemma = lemma
         self.derived_lemma = derived_lemma
-        self.vector = vector
+        self.vectors_vocab = vectors_vocab
         self.char_start_index = char_start_index
         self.dependent_index = dependent_index
         self.dependency_label = dependency_label
@@ -137,10 +172,27 @@ class Subword:
         else:
             return self.lemma
 
+    @property
+    def vector(self):
+        """ The vector representation of *lemma*, or *None* if there is none available. """
+        if self.vectors_vocab is None:
+            return None
+        return get_vector_from_vocab(self.vectors_vocab, self.lemma)
+
     @property
     def is_head(self):
         return self.governor_index is None
 
+    def __getstate__(self):
+        state = get_slot_state(self)
+        state['vectors_vocab'] = None
+        return state
+
+    def __setstate__(self, state):
+        state.pop('vector', None) # present in documents serialized with version 3.1
+        state.setdefault('vectors_vocab', None)
+        set_slot_state(self, state)
+
     def __str__(self):
         if self.derived_lemma is not None:
             lemma_string = ''.join((self.lemma, '(', self.derived_lemma, ')'))
@@ -153,6 +205,8 @@ class Subword:
 class Index:
     """ The position of a word or subword within a document. """
 
+    __slots__ = ('token_index', 'subword_index')
+
     def __init__(self, token_index, subword_index):
         self.token_index = token_index
         self.subword_index = subword_index
@@ -178,8 +232,17 @@ class Index:
     def __hash__(self):
         return hash((self.token_index, self.subword_index))
 
+    def __getstate__(self):
+        return get_slot_state(self)
+
+    def __setstate__(self, state):
+        set_slot_state(self, state)
+
 class CorpusWordPosition:
     """ A reference to a word or subword within a corpus of one or more documents. """
+
+    __slots__ = ('document_label', 'index')
+
     def __init__(self, document_label, index):
         if document_label is None:
             raise RuntimeError('CorpusWordPosition.document_label must have a value.')
@@ -196,6 +259,707 @@ class CorpusWordPosition:
     def __str__(self):
         return ':'.join((self.document_label, str(self.index)))
 
+    def __getstate__(self):
+        return get_slot_state(self)
+
+    def __setstate__(self, state):
+        set_slot_state(self, state)
+
+class DocumentIdTable:
+    """ Interns document labels to integer ids so that corpus word positions can be packed into
+        integers. Each corpus index entry holds a reference to the id of each document it has
+        postings for; once no entry in the process holds a reference, the label is forgotten
+        and its id can be assigned to another label. A label that is registered again after
+        its id was freed may therefore receive a different id.
+
+        An entry may still hold postings of a removed document that it has not yet discarded
+        when the id of that document is reassigned. This is safe because an entry ignores the
+        postings of removed documents and discards them before adding any postings under the
+        same id to its arrays.
+    """
+
+    def __init__(self):
+        self.labels_to_ids = {}
+        # the label for each id, or *None* for ids that are free
+        self.labels = []
+        self.reference_counts = []
+        self.free_ids = []
+        self.lock = Lock()
+
+    def add_reference(self, document_label):
+        """ Returns the id of *document_label*, assigning one if necessary, and records a
+            reference to it.
+        """
+        with self.lock:
+            document_id = self.labels_to_ids.get(document_label)
+            if document_id is None:
+                if len(self.free_ids) > 0:
+                    document_id = self.free_ids.pop()
+                    self.labels[document_id] = document_label
+                else:
+                    document_id = len(self.labels)
+                    self.labels.append(document_label)
+                    self.reference_counts.append(0)
+                self.labels_to_ids[document_label] = document_id
+            self.reference_counts[document_id] += 1
+            return document_id
+
+    def remove_reference(self, document_id):
+        """ Removes a reference recorded by *add_reference()*, freeing the id if it was the last
+            one.
+        """
+        with self.lock:
+            self.reference_counts[document_id] -= 1
+            if self.reference_counts[document_id] == 0:
+                del self.labels_to_ids[self.labels[document_id]]
+                self.labels[document_id] = None
+                self.free_ids.append(document_id)
+
+    def get_id(self, document_label):
+        """ Returns the id of *document_label*, or *None* if no corpus index entry has postings
+            for it.
+        """
+        return self.labels_to_ids.get(document_label)
+
+    def get_label(self, document_id):
+        return self.labels[document_id]
+
+    def __len__(self):
+        """ Returns the number of ids currently assigned. """
+        return len(self.labels_to_ids)
+
+document_id_table = DocumentIdTable()
+
+# Corpus word positions are packed into 63 bits as (document id, token index, subword index + 1)
+# so that the packed values sort in the same order as the positions
+SUBWORD_BITS = 12
+TOKEN_INDEX_BITS = 24
+DOCUMENT_ID_SHIFT = SUBWORD_BITS + TOKEN_INDEX_BITS
+# the highest id is reserved so that the end of the range of postings for a document can
+# always be represented
+MAXIMUM_DOCUMENT_ID = (1 << (63 - DOCUMENT_ID_SHIFT)) - 2
+INDEX_MASK = (1 << DOCUMENT_ID_SHIFT) - 1
+SUBWORD_MASK = (1 << SUBWORD_BITS) - 1
+
+def pack_corpus_word_position(document_id, index):
+    if index.token_index >= 1 << TOKEN_INDEX_BITS or document_id > MAXIMUM_DOCUMENT_ID or \
+            (index.is_subword() and index.subword_index + 1 >= 1 << SUBWORD_BITS):
+        raise RuntimeError(' '.join((
+            'Corpus word position out of range:', str(document_id), str(index.token_index),
+            str(index.subword_index))))
+    subword_value = 0 if index.subword_index is None else index.subword_index + 1
+    return (document_id << DOCUMENT_ID_SHIFT) | (index.token_index << SUBWORD_BITS) | \
+        subword_value
+
+# Arrays shorter than this are processed element by element because the fixed cost of each NumPy
+# call outweighs the per-element saving
+VECTORIZATION_THRESHOLD = 32
+
+def unpack_corpus_word_positions(packed_positions):
+    """ Returns a list of *(document_label, token_index, subword_index)* tuples for an array of
+        packed positions. Longer arrays are unpacked with vectorised shifts and masks.
+    """
+    labels = document_id_table.labels
+    if len(packed_positions) == 0:
+        return []
+    if len(packed_positions) < VECTORIZATION_THRESHOLD:
+        return [(labels[packed_position >> DOCUMENT_ID_SHIFT],
+            (packed_position & INDEX_MASK) >> SUBWORD_BITS,
+            (packed_position & SUBWORD_MASK) - 1 if packed_position & SUBWORD_MASK else None)
+            for packed_position in packed_positions.tolist()]
+    return [(labels[document_id], token_index, subword_value - 1 if subword_value else None)
+        for document_id, token_index, subword_value in zip(
+        (packed_positions >> DOCUMENT_ID_SHIFT).tolist(),
+        ((packed_positions & INDEX_MASK) >> SUBWORD_BITS).tolist(),
+        (packed_positions & SUBWORD_MASK).tolist())]
+
+def get_corpus_word_positions(packed_positions):
+    if len(packed_positions) == 0:
+        return []
+    return [CorpusWordPosition(document_label, Index(token_index, subword_index)) for
+        document_label, token_index, subword_index in
+        unpack_corpus_word_positions(packed_positions)]
+
+def get_distinct_positions(positions):
+    """ Returns the distinct values in a sorted array of positions. """
+    if len(positions) < 2:
+        return positions
+    return positions[concatenate(([True], positions[1:] != positions[:-1]))]
+
+class PackedCorpusWordPositions:
+    """ A set of corpus word positions packed for comparison with the postings in corpus index
+        entries. The packed values are held both as a sorted array, against which long posting
+        arrays are matched with binary searches, and as a set, which is quicker to consult for
+        short ones. Positions in documents whose labels have never been interned cannot be
+        present in any corpus index and are skipped.
+
+        Parameters:
+
+        corpus_word_position_collections -- collections of *CorpusWordPosition* objects whose
+            union is to be packed.
+    """
+
+    def __init__(self, *corpus_word_position_collections):
+        self.position_set = set()
+        for corpus_word_positions in corpus_word_position_collections:
+            for corpus_word_position in corpus_word_positions:
+                document_id = document_id_table.get_id(corpus_word_position.document_label)
+                if document_id is not None:
+                    self.position_set.add(pack_corpus_word_position(
+                        document_id, corpus_word_position.index))
+        self.positions = array(sorted(self.position_set), dtype=int64)
+
+    def restrict(self, positions):
+        """ Returns the positions within the sorted array *positions* that are in the set. """
+        if len(positions) < VECTORIZATION_THRESHOLD:
+            return array([position for position in positions.tolist() if position in
+                self.position_set], dtype=int64)
+        if len(self.positions) == 0:
+            return self.positions
+        found_indexes = self.positions.searchsorted(positions)
+        found_indexes[found_indexes == len(self.positions)] = 0
+        return positions[self.positions[found_indexes] == positions]
+
+def sort_postings(positions, word_codes, is_derivations):
+    """ Sorts parallel posting arrays by position, retaining the order of the postings at each
+        position.
+    """
+    order = positions.argsort(kind='stable')
+    return positions[order], word_codes[order], is_derivations[order]
+
+class CorpusIndexEntry:
+    """ The postings for a single key word within a corpus index. The positions are held as a
+        sorted array of packed integers (see *pack_corpus_word_position()*) with parallel arrays
+        for the textual representations and derivation flags, so that the postings for a set of
+        documents can be found with binary searches and the postings matching a set of positions
+        without creating an object for each posting. Iterating over the entry yields
+        *(corpus_word_position, word, is_derivation)* tuples.
+
+        So that registering and removing a document costs no more than it would with lists, new
+        postings are held in per-document pending lists and removed documents are only recorded.
+        The reads that take place while a document is being registered are answered from its
+        pending postings. The next read of the entry as a whole inserts the pending postings into
+        the arrays and discards the postings of removed documents in a single pass.
+    """
+
+    def __init__(self):
+        self.positions = array([], dtype=int64)
+        self.word_codes = array([], dtype=int32)
+        self.is_derivations = array([], dtype=bool_)
+        # the highest document id with postings in the arrays, which allows the lookups for
+        # documents with higher ids to be skipped
+        self.maximum_array_document_id = -1
+        # the distinct textual representations, indexed by the values in *word_codes*
+        self.words = []
+        self.words_to_codes = {}
+        # (packed_position, word_code, is_derivation, corpus_word_position) tuples in insertion
+        # order
+        self.document_ids_to_pending_postings = {}
+        self.pending_posting_set = set()
+        # documents whose postings are still in the arrays but no longer belong to the entry
+        self.removed_document_ids = set()
+        self.number_of_postings = 0
+
+    def get_word_code(self, word):
+        if word not in self.words_to_codes:
+            self.words_to_codes[word] = len(self.words)
+            self.words.append(word)
+        return self.words_to_codes[word]
+
+    def get_document_range(self, document_id):
+        """ Returns the start and end of the postings for *document_id* within the arrays. """
+        if document_id > self.maximum_array_document_id or \
+                document_id in self.removed_document_ids:
+            return 0, 0
+        return (int(self.positions.searchsorted(document_id << DOCUMENT_ID_SHIFT)),
+            int(self.positions.searchsorted((document_id + 1) << DOCUMENT_ID_SHIFT)))
+
+    def contains_array_postings(self, document_id):
+        start, end = self.get_document_range(document_id)
+        return start < end
+
+    def add(self, corpus_word_position, word, is_derivation):
+        """ Adds a posting, returning *False* if an identical posting was already present. """
+        document_id = document_id_table.get_id(corpus_word_position.document_label)
+        if document_id is None or (document_id not in self.document_ids_to_pending_postings
+                and not self.contains_array_postings(document_id)):
+            # the first posting of the document within the entry
+            document_id = document_id_table.add_reference(corpus_word_position.document_label)
+        packed_position = pack_corpus_word_position(document_id, corpus_word_position.index)
+        posting = (packed_position, self.get_word_code(word), bool(is_derivation))
+        if posting in self.pending_posting_set:
+            return False
+        start, end = self.get_document_range(document_id)
+        if start < end:
+            start = int(self.positions.searchsorted(packed_position, side='left'))
+            end = int(self.positions.searchsorted(packed_position, side='right'))
+            for array_index in range(start, end):
+                if self.word_codes[array_index] == posting[1] and \
+                        self.is_derivations[array_index] == posting[2]:
+                    return False
+        self.pending_posting_set.add(posting)
+        pending_posting = posting + (corpus_word_position,)
+        if document_id in self.document_ids_to_pending_postings:
+            self.document_ids_to_pending_postings[document_id].append(pending_posting)
+        else:
+            self.document_ids_to_pending_postings[document_id] = [pending_posting]
+        self.number_of_postings += 1
+        return True
+
+    def remove_document(self, document_label):
+        """ Removes all postings for *document_label*. """
+        document_id = document_id_table.get_id(document_label)
+        if document_id is None:
+            return
+        had_postings = False
+        if document_id in self.document_ids_to_pending_postings:
+            pending_postings = self.document_ids_to_pending_postings.pop(document_id)
+            self.pending_posting_set.difference_update(
+                pending_posting[:3] for pending_posting in pending_postings)
+            self.number_of_postings -= len(pending_postings)
+            had_postings = True
+        start, end = self.get_document_range(document_id)
+        if start < end:
+            self.removed_document_ids.add(document_id)
+            self.number_of_postings -= end - start
+            had_postings = True
+        if had_postings:
+            document_id_table.remove_reference(document_id)
+
+    def consolidate(self):
+        """ Discards the postings of removed documents from the arrays and inserts the pending
+            postings into them.
+        """
+        if len(self.removed_document_ids) > 0:
+            retained = ~isin(self.positions >> DOCUMENT_ID_SHIFT,
+                array(list(self.removed_document_ids), dtype=int64))
+            self.positions = self.positions[retained]
+            self.word_codes = self.word_codes[retained]
+            self.is_derivations = self.is_derivations[retained]
+            self.removed_document_ids = set()
+        if len(self.document_ids_to_pending_postings) == 0:
+            return
+        pending_postings = sorted((pending_posting for pending_postings in
+            self.document_ids_to_pending_postings.values() for pending_posting in
+            pending_postings), key=lambda pending_posting: pending_posting[0])
+        positions = array([posting[0] for posting in pending_postings], dtype=int64)
+        word_codes = array([posting[1] for posting in pending_postings], dtype=int32)
+        is_derivations = array([posting[2] for posting in pending_postings], dtype=bool_)
+        if len(self.positions) == 0:
+            self.positions, self.word_codes, self.is_derivations = \
+                positions, word_codes, is_derivations
+        else:
+            # inserting after any existing postings at the same positions retains insertion
+            # order
+            insertion_points = self.positions.searchsorted(positions, side='right')
+            self.positions = insert(self.positions, insertion_points, positions)
+            self.word_codes = insert(self.word_codes, insertion_points, word_codes)
+            self.is_derivations = insert(self.is_derivations, insertion_points, is_derivations)
+        self.maximum_array_document_id = int(self.positions[-1]) >> DOCUMENT_ID_SHIFT
+        self.document_ids_to_pending_postings = {}
+        self.pending_posting_set = set()
+
+    def get_document_postings(self, document_id):
+        """ Returns the start and end of the postings for *document_id* within the arrays together
+            with its pending postings in position order. A document has postings in both places
+            only when postings are added to a document that is already in the arrays, as happens
+            when snapshots overlap, in which case the entry is consolidated first.
+        """
+        start, end = self.get_document_range(document_id)
+        if document_id not in self.document_ids_to_pending_postings:
+            return start, end, []
+        if start < end:
+            self.consolidate()
+            return self.get_document_range(document_id) + ([],)
+        return start, end, sorted(self.document_ids_to_pending_postings[document_id],
+            key=lambda pending_posting: pending_posting[0])
+
+    def get_selected_postings(self, document_labels):
+        """ Returns the postings for the documents in the set *document_labels*, or for all
+            documents if *document_labels* is *None*, as a tuple of position, word code and
+            derivation arrays together with a list of pending postings. Unless more documents are
+            selected than there are postings, the postings of each selected document are looked
+            up individually without consolidating the entry.
+        """
+        if document_labels is None or (len(document_labels) >= VECTORIZATION_THRESHOLD and
+                len(document_labels) >= self.number_of_postings):
+            self.consolidate()
+            if document_labels is None:
+                return self.positions, self.word_codes, self.is_derivations, []
+            retained = isin(self.positions >> DOCUMENT_ID_SHIFT, [document_id for document_id
+                in (document_id_table.get_id(document_label) for document_label in
+                document_labels) if document_id is not None])
+            return self.positions[retained], self.word_codes[retained], \
+                self.is_derivations[retained], []
+        ranges = []
+        pending_postings = []
+        for document_label in document_labels:
+            document_id = document_id_table.get_id(document_label)
+            if document_id is None:
+                continue
+            start, end, document_pending_postings = self.get_document_postings(document_id)
+            if start < end:
+                ranges.append((start, end))
+            pending_postings.extend(document_pending_postings)
+        if len(ranges) == 0:
+            return self.positions[:0], self.word_codes[:0], self.is_derivations[:0], \
+                pending_postings
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            return self.positions[start:end], self.word_codes[start:end], \
+                self.is_derivations[start:end], pending_postings
+        ranges.sort()
+        return (concatenate([self.positions[start:end] for start, end in ranges]),
+            concatenate([self.word_codes[start:end] for start, end in ranges]),
+            concatenate([self.is_derivations[start:end] for start, end in ranges]),
+            pending_postings)
+
+    def get_document_ids(self):
+        self.consolidate()
+        return unique(self.positions >> DOCUMENT_ID_SHIFT)
+
+    def document_labels(self):
+        return [document_id_table.get_label(document_id) for document_id in
+            self.get_document_ids().tolist()]
+
+    def get_number_of_corpus_word_positions(self):
+        """ Returns the number of distinct positions, which is lower than the number of postings
+            where one position is indexed with several textual representations.
+        """
+        self.consolidate()
+        return len(unique(self.positions))
+
+    def get_number_of_corpus_word_positions_in_document(self, document_label):
+        """ Returns the number of distinct positions within the document *document_label*. """
+        document_id = document_id_table.get_id(document_label)
+        if document_id is None:
+            return 0
+        start, end, pending_postings = self.get_document_postings(document_id)
+        if start < end:
+            return len(get_distinct_positions(self.positions[start:end]))
+        return len({pending_posting[0] for pending_posting in pending_postings})
+
+    def get_number_of_postings_in_document(self, document_label):
+        document_id = document_id_table.get_id(document_label)
+        if document_id is None:
+            return 0
+        start, end, pending_postings = self.get_document_postings(document_id)
+        return end - start + len(pending_postings)
+
+    def get_first_corpus_word_position(self):
+        """ Returns the position of one of the postings without consolidating the entry, or
+            *None* if the entry is empty.
+        """
+        start = 0
+        while start < len(self.positions):
+            document_id = int(self.positions[start]) >> DOCUMENT_ID_SHIFT
+            if document_id not in self.removed_document_ids:
+                return get_corpus_word_positions(self.positions[start:start + 1])[0]
+            start = int(self.positions.searchsorted((document_id + 1) << DOCUMENT_ID_SHIFT))
+        for pending_postings in self.document_ids_to_pending_postings.values():
+            return pending_postings[0][3]
+        return None
+
+    def get_unpacked_postings(self, document_labels=None):
+        """ Returns a list of *(document_label, token_index, subword_index, word, is_derivation)*
+            tuples for the documents in the set *document_labels*, or for all documents if
+            *document_labels* is *None*, without creating position objects.
+        """
+        positions, word_codes, is_derivations, pending_postings = \
+            self.get_selected_postings(document_labels)
+        words = self.words
+        unpacked_postings = [
+            (document_label, token_index, subword_index, words[word_code], is_derivation)
+            for (document_label, token_index, subword_index), word_code, is_derivation in zip(
+            unpack_corpus_word_positions(positions), word_codes.tolist(),
+            is_derivations.tolist())]
+        unpacked_postings.extend(
+            (corpus_word_position.document_label, corpus_word_position.index.token_index,
+            corpus_word_position.index.subword_index, words[word_code], is_derivation)
+            for _, word_code, is_derivation, corpus_word_position in pending_postings)
+        return unpacked_postings
+
+    def get_postings(self, document_labels=None):
+        """ Yields the postings for the documents in the set *document_labels*, or for all
+            documents if *document_labels* is *None*. Only the postings of the documents in question
+            are visited.
+        """
+        positions, word_codes, is_derivations, pending_postings = \
+            self.get_selected_postings(document_labels)
+        words = self.words
+        for corpus_word_position, word_code, is_derivation in zip(
+                get_corpus_word_positions(positions), word_codes.tolist(),
+                is_derivations.tolist()):
+            yield corpus_word_position, words[word_code], is_derivation
+        for _, word_code, is_derivation, corpus_word_position in pending_postings:
+            yield corpus_word_position, words[word_code], is_derivation
+
+    def get_corpus_word_positions(self, document_labels=None, packed_corpus_word_positions=None):
+        """ Returns a list of the distinct positions of the postings for the documents in the set
+            *document_labels*, or for all documents if *document_labels* is *None*.
+
+            Parameters:
+
+            document_labels -- the labels of the documents whose positions are to be returned.
+            packed_corpus_word_positions -- a *PackedCorpusWordPositions* object to which the
+                positions are restricted, or *None* if they are not to be restricted.
+        """
+        positions, _, _, pending_postings = self.get_selected_postings(document_labels)
+        positions = get_distinct_positions(positions)
+        if packed_corpus_word_positions is not None:
+            positions = packed_corpus_word_positions.restrict(positions)
+        corpus_word_positions = get_corpus_word_positions(positions)
+        if len(pending_postings) > 0:
+            packed_pending_positions = set()
+            for packed_position, _, _, corpus_word_position in pending_postings:
+                if packed_position not in packed_pending_positions and \
+                        (packed_corpus_word_positions is None or packed_position in
+                        packed_corpus_word_positions.position_set):
+                    packed_pending_positions.add(packed_position)
+                    corpus_word_positions.append(corpus_word_position)
+        return corpus_word_positions
+
+    def __iter__(self):
+        return self.get_postings()
+
+    def __len__(self):
+        return self.number_of_postings
+
+    def __getstate__(self):
+        """ Packed positions are only meaningful within the process that created them, so the
+            document ids are pickled together with the labels they stand for.
+        """
+        self.consolidate()
+        document_ids = self.get_document_ids()
+        return {
+            'document_labels': [document_id_table.get_label(document_id) for document_id in
+                document_ids.tolist()],
+            'document_ids': document_ids,
+            'positions': self.positions,
+            'word_codes': self.word_codes,
+            'is_derivations': self.is_derivations,
+            'words': self.words}
+
+    def __setstate__(self, state):
+        self.__init__()
+        if 'document_labels_to_postings' in state:
+            # entry pickled before postings were held as arrays
+            for postings in state['document_labels_to_postings'].values():
+                for corpus_word_position, word, is_derivation in postings:
+                    self.add(corpus_word_position, word, is_derivation)
+            self.consolidate()
+            return
+        self.words = state['words']
+        self.words_to_codes = {word: word_code for word_code, word in enumerate(self.words)}
+        self.number_of_postings = len(state['positions'])
+        if len(state['positions']) == 0:
+            return
+        new_document_ids = array([document_id_table.add_reference(document_label) for
+            document_label in state['document_labels']], dtype=int64)
+        positions = state['positions']
+        old_document_id_indexes = state['document_ids'].searchsorted(
+            positions >> DOCUMENT_ID_SHIFT)
+        self.positions, self.word_codes, self.is_derivations = sort_postings(
+            (new_document_ids[old_document_id_indexes] << DOCUMENT_ID_SHIFT) |
+            (positions & INDEX_MASK), state['word_codes'], state['is_derivations'])
+        self.maximum_array_document_id = int(self.positions[-1]) >> DOCUMENT_ID_SHIFT
+
+    def __del__(self):
+        """ Releases the document ids of the documents still in the entry, e.g. when a whole
+            corpus index is discarded without its documents being removed.
+        """
+        if not hasattr(self, 'positions'):
+            # the entry was never initialized, e.g. because unpickling failed
+            return
+        document_ids = set(get_distinct_positions(
+            self.positions >> DOCUMENT_ID_SHIFT).tolist()) - self.removed_document_ids
+        document_ids.update(self.document_ids_to_pending_postings)
+        for document_id in document_ids:
+            document_id_table.remove_reference(document_id)
+
+class DocumentLabelIndex:
+    """ The labels of the documents in a corpus held in sorted order so that the labels beginning
+        with a prefix can be found with a binary search rather than by examining every label.
+    """
+
+    def __init__(self):
+        self.sorted_labels = []
+
+    def add(self, document_label):
+        insort(self.sorted_labels, document_label)
+
+    def remove(self, document_label):
+        position = bisect_left(self.sorted_labels, document_label)
+        if position < len(self.sorted_labels) and \
+                self.sorted_labels[position] == document_label:
+            del self.sorted_labels[position]
+
+    def get_labels_with_prefix(self, prefix):
+        """ Returns the labels beginning with *prefix* in sorted order. """
+        start_position = position = bisect_left(self.sorted_labels, prefix)
+        while position < len(self.sorted_labels) and \
+                self.sorted_labels[position].startswith(prefix):
+            position += 1
+        return self.sorted_labels[start_position:position]
+
+    def __iter__(self):
+        return iter(self.sorted_labels)
+
+    def __len__(self):
+        return len(self.sorted_labels)
+
+class DependencyEdgeIndex:
+    """ An inverted index from dependency edges to the corpus word positions at which matching of
+        a two-word search phrase whose words are linked by such an edge can succeed. Each edge is
+        a *(parent_key_word, label_class, child_word)* tuple where *parent_key_word* is a key
+        word under which the position is held in the corpus index; *label_class* is a
+        *(document_dependency_label, is_inverse)* tuple, *is_inverse* being *True* for
+        dependencies that are followed in the reverse direction; and *child_word* is a lower-case
+        textual representation of a word linked to the position by the dependency, including
+        words reached via coreference chains and head subwords.
+    """
+
+    def __init__(self):
+        self.edges_to_document_labels_to_corpus_word_positions = {}
+        self.document_labels_to_edges = {}
+        self.label_classes = set()
+        self.search_phrase_dependency_labels_to_label_classes = {}
+
+    def add_document(self, document_label, edges_to_corpus_word_positions):
+        """ Adds the edges of a document as returned by
+            *StructuralMatcher.get_dependency_edges()*.
+        """
+        for edge, corpus_word_positions in edges_to_corpus_word_positions.items():
+            if edge in self.edges_to_document_labels_to_corpus_word_positions:
+                self.edges_to_document_labels_to_corpus_word_positions[edge][document_label] = \
+                    corpus_word_positions
+            else:
+                self.edges_to_document_labels_to_corpus_word_positions[edge] = \
+                    {document_label: corpus_word_positions}
+            if edge[1] not in self.label_classes:
+                self.label_classes.add(edge[1])
+                self.search_phrase_dependency_labels_to_label_classes = {}
+        self.document_labels_to_edges[document_label] = set(edges_to_corpus_word_positions)
+
+    def remove_document(self, document_label):
+        for edge in self.document_labels_to_edges.pop(document_label, ()):
+            document_labels_to_corpus_word_positions = \
+                self.edges_to_document_labels_to_corpus_word_positions[edge]
+            document_labels_to_corpus_word_positions.pop(document_label, None)
+            if len(document_labels_to_corpus_word_positions) == 0:
+                del self.edges_to_document_labels_to_corpus_word_positions[edge]
+
+    def get_label_classes(self, search_phrase_dependency_label, semantic_matching_helper):
+        """ Returns the label classes within the index whose document dependencies match a search
+            phrase dependency labelled *search_phrase_dependency_label*.
+        """
+        if search_phrase_dependency_label not in \
+                self.search_phrase_dependency_labels_to_label_classes:
+            self.search_phrase_dependency_labels_to_label_classes[
+                search_phrase_dependency_label] = [
+                label_class for label_class in self.label_classes if
+                semantic_matching_helper.dependency_labels_match(
+                search_phrase_dependency_label=search_phrase_dependency_label,
+                document_dependency_label=label_class[0], inverse_polarity=label_class[1])]
+        return self.search_phrase_dependency_labels_to_label_classes[
+            search_phrase_dependency_label]
+
+    def get_corpus_word_positions(
+            self, parent_key_word, label_classes, child_words, document_labels=None):
+        """ Returns the set of corpus word positions held under *parent_key_word* that are linked
+            by a dependency in one of *label_classes* to one of *child_words*, optionally
+            restricted to the documents labelled with members of *document_labels*.
+        """
+        corpus_word_positions = set()
+        for label_class in label_classes:
+            for child_word in child_words:
+                edge = (parent_key_word, label_class, child_word)
+                if edge not in self.edges_to_document_labels_to_corpus_word_positions:
+                    continue
+                for document_label, edge_corpus_word_positions in \
+                        self.edges_to_document_labels_to_corpus_word_positions[edge].items():
+                    if document_labels is None or document_label in document_labels:
+                        corpus_word_positions.update(edge_corpus_word_positions)
+        return corpus_word_positions
+
+    def __len__(self):
+        return len(self.edges_to_document_labels_to_corpus_word_positions)
+
+class SearchPhraseIndex:
+    """ The registered search phrases together with an inverted index from the corpus index keys
+        under which their root words can be found, including ontology and derivation variants, to
+        the search phrases themselves. This allows a document or corpus to be matched against only
+        those search phrases whose root words it actually contains. Search phrases whose root
+        tokens match every noun (*ENTITYNOUN*) are always returned; search phrases whose root
+        tokens could additionally match via embeddings are returned when embedding-based matching
+        on root words is active.
+    """
+
+    def __init__(self):
+        self.search_phrases_to_sequence_numbers = {}
+        self.key_words_to_search_phrases = {}
+        self.always_matchable_search_phrases = set()
+        self.embedding_matchable_search_phrases = set()
+        self.next_sequence_number = 0
+
+    def add(self, search_phrase, key_words, always_matchable, embedding_matchable):
+        """ Adds a search phrase with the information returned by
+            *StructuralMatcher.get_search_phrase_index_information()*.
+        """
+        self.search_phrases_to_sequence_numbers[search_phrase] = self.next_sequence_number
+        self.next_sequence_number += 1
+        for key_word in key_words:
+            if key_word in self.key_words_to_search_phrases:
+                self.key_words_to_search_phrases[key_word].add(search_phrase)
+            else:
+                self.key_words_to_search_phrases[key_word] = {search_phrase}
+        if always_matchable:
+            self.always_matchable_search_phrases.add(search_phrase)
+        if embedding_matchable:
+            self.embedding_matchable_search_phrases.add(search_phrase)
+
+    def remove_with_label(self, label):
+        for search_phrase in [search_phrase for search_phrase in
+                self.search_phrases_to_sequence_numbers if search_phrase.label == label]:
+            del self.search_phrases_to_sequence_numbers[search_phrase]
+            self.always_matchable_search_phrases.discard(search_phrase)
+            self.embedding_matchable_search_phrases.discard(search_phrase)
+            for key_word in [key_word for key_word, search_phrases in
+                    self.key_words_to_search_phrases.items() if search_phrase in search_phrases]:
+                self.key_words_to_search_phrases[key_word].remove(search_phrase)
+                if len(self.key_words_to_search_phrases[key_word]) == 0:
+                    del self.key_words_to_search_phrases[key_word]
+
+    def get_search_phrases(self, corpus_index_dict, include_embedding_matchable=False):
+        """ Returns the search phrases that can match within *corpus_index_dict* in the order in
+            which they were added.
+
+            Parameters:
+
+            corpus_index_dict -- the corpus index of the document or documents to be matched.
+            include_embedding_matchable -- *True* if embedding-based matching on root words is
+                active.
+        """
+        search_phrases = set(self.always_matchable_search_phrases)
+        if include_embedding_matchable:
+            search_phrases.update(self.embedding_matchable_search_phrases)
+        if len(corpus_index_dict) < len(self.key_words_to_search_phrases):
+            for key_word in corpus_index_dict:
+                if key_word in self.key_words_to_search_phrases:
+                    search_phrases.update(self.key_words_to_search_phrases[key_word])
+        else:
+            for key_word, key_word_search_phrases in self.key_words_to_search_phrases.items():
+                if key_word in corpus_index_dict:
+                    search_phrases.update(key_word_search_phrases)
+        return sorted(search_phrases,
+            key=lambda search_phrase: self.search_phrases_to_sequence_numbers[search_phrase])
+
+    def __iter__(self):
+        return iter(self.search_phrases_to_sequence_numbers)
+
+    def __len__(self):
+        return len(self.search_phrases_to_sequence_numbers)
+
 class MultiwordSpan:
 
     def __init__(self, text, lemma, derived_lemma, tokens):
@@ -234,6 +998,20 @@ class HolmesDocumentInfo:
     def __init__(self, semantic_analyzer):
         self.model = semantic_analyzer.model
         self.serialized_document_version = SERIALIZED_DOCUMENT_VERSION
+        self.token_annotation_columns = None # only set while a document is being serialized
+            # using *serialize_holmes_document()*
+        self.annotation_store = None # created when the document is first matched, see
+            # *get_annotation_store()*
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['annotation_store'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if 'annotation_store' not in state: # backwards compatibility
+            self.annotation_store = None
 
     @srsly.msgpack_encoders("holmes_document_info_holder")
     def serialize_obj(obj, chain=None):
@@ -257,16 +1035,30 @@ class HolmesDictionary:
     derived_lemma -- the value returned from *._.holmes.derived_lemma for the token; where relevant,
         another lemma with which *lemma* is derivationally related and which can also be useful for
         matching in some usecases; otherwise *None*.
-    vector -- the vector representation of *lemma*, unless *lemma* is a multiword, in which case
-        the vector representation of *token.lemma_* is used instead. *None* where there is no
-        vector for the lexeme.
+    vectors_vocab -- the vocabulary from which the vector representation is retrieved when it is
+        required, or *None* if no vectors are available. Vectors are not held by the dictionary
+        itself so that documents do not each contain a copy of the vectors of their words.
+    vector_lemma -- *token.lemma_* where *lemma* is a multiword, in which case its vector
+        representation is used instead of that of *lemma*; otherwise *None*.
+    ent_type -- the entity label a phraselet token was derived from; *None* for other tokens.
     """
 
-    def __init__(self, index, lemma, derived_lemma, vector):
+    # *most_specific_coreferring_term_index* is not set until coreference information has been
+    # added.
+    __slots__ = (
+        'index', 'lemma', '_derived_lemma', 'vectors_vocab', 'vector_lemma', 'children',
+        'parents', 'righthand_siblings', 'token_or_lefthand_sibling_index',
+        'is_involved_in_or_conjunction', 'is_negated', 'is_matchable', 'is_initial_question_word',
+        'has_initial_question_word_in_phrase', 'coreference_linked_child_dependencies',
+        'coreference_linked_parent_dependencies', 'token_and_coreference_chain_indexes',
+        'mentions', 'subwords', 'most_specific_coreferring_term_index', 'ent_type')
+
+    def __init__(self, index, lemma, derived_lemma, vectors_vocab, vector_lemma=None):
         self.index = index
         self.lemma = lemma
         self._derived_lemma = derived_lemma
-        self.vector = vector
+        self.vectors_vocab = vectors_vocab
+        self.vector_lemma = vector_lemma
         self.children = [] # list of *SemanticDependency* objects where this token is the parent.
         self.parents = [] # list of *SemanticDependency* objects where this token is the child.
         self.righthand_siblings = [] # list of tokens to the right of this token that stand in a
@@ -288,6 +1080,7 @@ class HolmesDictionary:
         # index; where coreference, the token index followed by the indexes of coreferring tokens
         self.mentions = []
         self.subwords = []
+        self.ent_type = None
 
     @property
     def derived_lemma(self):
@@ -369,6 +1162,36 @@ class HolmesDictionary:
     def is_involved_in_coreference(self):
         return len(self.mentions) > 0
 
+    @property
+    def vector(self):
+        """ The vector representation of the token, or *None* where there is no vector for the
+            lexeme.
+        """
+        if self.vectors_vocab is None:
+            return None
+        return get_vector_from_vocab(
+            self.vectors_vocab, self.lemma if self.vector_lemma is None else self.vector_lemma)
+
+    def attach_vectors_vocab(self, vectors_vocab):
+        """ Sets the vocabulary from which vectors are retrieved for the token and its
+            subwords, which is not retained when the dictionary is pickled.
+        """
+        self.vectors_vocab = vectors_vocab
+        for subword in self.subwords:
+            subword.vectors_vocab = vectors_vocab
+
+    def __getstate__(self):
+        state = get_slot_state(self)
+        state['vectors_vocab'] = None
+        return state
+
+    def __setstate__(self, state):
+        state.pop('vector', None) # present in documents serialized with version 3.1
+        state.setdefault('vectors_vocab', None)
+        state.setdefault('vector_lemma', None)
+        state.setdefault('ent_type', None)
+        set_slot_state(self, state)
+
     @srsly.msgpack_encoders("holmes_dictionary_holder")
     def serialize_obj(obj, chain=None):
         if isinstance(obj, HolmesDictionary):
@@ -381,6 +1204,281 @@ class HolmesDictionary:
             return pickle.loads(obj['__holmes_dictionary_holder__'])
         return obj if chain is None else chain(obj)
 
+def get_vector_from_vocab(vocab, lemma):
+    """ Returns a vector representation of *lemma* from *vocab*, or *None* if none is
+        available.
+    """
+    lexeme = vocab[lemma]
+    return lexeme.vector if lexeme.has_vector and lexeme.vector_norm > 0 else None
+
+class HolmesDocumentColumns:
+    """Converts the *token._.holmes* dictionaries of a document to and from a columnar
+        representation. Strings are replaced by indexes into a string table held within the
+        representation; integer columns are NumPy arrays; variable-length token attributes are
+        held as one array of per-token lengths and one array of rows. Vectors are not stored but
+        are retrieved from a vocabulary when they are required. The entity types of phraselet
+        tokens, which few tokens have, are retained in a dictionary from token indexes to
+        attribute dictionaries.
+    """
+
+    dependency_attributes = ('children', 'parents')
+
+    index_label_attributes = (
+        'coreference_linked_child_dependencies', 'coreference_linked_parent_dependencies')
+
+    def __init__(self):
+        self.strings = []
+        self.string_indexes = {}
+
+    def string_index(self, string):
+        if string is None:
+            return -1
+        if string not in self.string_indexes:
+            self.string_indexes[string] = len(self.strings)
+            self.strings.append(string)
+        return self.string_indexes[string]
+
+    def string(self, string_index):
+        return None if string_index == -1 else self.strings[string_index]
+
+    @staticmethod
+    def optional_int(value, none_value=-1):
+        return none_value if value is None else int(value)
+
+    @staticmethod
+    def int_or_none(value, none_value=-1):
+        return None if value == none_value else int(value)
+
+    @staticmethod
+    def to_list_column(lengths, rows, width):
+        return array(lengths, dtype=int32), array(rows, dtype=int32).reshape(-1, width)
+
+    def to_columns(self, doc):
+        """ Returns a dictionary of columns representing the annotations of *doc*. """
+        token_rows = []
+        list_lengths_and_rows = {
+            'righthand_siblings': ([], []), 'token_and_coreference_chain_indexes': ([], []),
+            'mentions': ([], []), 'mention_indexes': ([], []), 'subwords': ([], [])}
+        for attribute in self.dependency_attributes + self.index_label_attributes:
+            list_lengths_and_rows[attribute] = ([], [])
+        extra_attributes = {}
+        for token in doc:
+            holmes_dictionary = token._.holmes
+            token_rows.append((
+                self.string_index(holmes_dictionary.lemma),
+                self.string_index(holmes_dictionary._derived_lemma),
+                self.optional_int(holmes_dictionary.token_or_lefthand_sibling_index),
+                int(holmes_dictionary.is_involved_in_or_conjunction),
+                self.optional_int(holmes_dictionary.is_negated),
+                self.optional_int(holmes_dictionary.is_matchable),
+                int(holmes_dictionary.is_initial_question_word),
+                int(holmes_dictionary.has_initial_question_word_in_phrase),
+                self.optional_int(getattr(
+                    holmes_dictionary, 'most_specific_coreferring_term_index', -2))))
+            for attribute in self.dependency_attributes:
+                lengths, rows = list_lengths_and_rows[attribute]
+                dependencies = getattr(holmes_dictionary, attribute)
+                lengths.append(len(dependencies))
+                rows.extend((
+                    dependency.parent_index, dependency.child_index,
+                    self.string_index(dependency.label), int(dependency.is_uncertain))
+                    for dependency in dependencies)
+            for attribute in self.index_label_attributes:
+                lengths, rows = list_lengths_and_rows[attribute]
+                index_labels = getattr(holmes_dictionary, attribute)
+                lengths.append(len(index_labels))
+                rows.extend((index, self.string_index(label)) for index, label in index_labels)
+            lengths, rows = list_lengths_and_rows['righthand_siblings']
+            lengths.append(len(holmes_dictionary.righthand_siblings))
+            rows.extend((index,) for index in holmes_dictionary.righthand_siblings)
+            lengths, rows = list_lengths_and_rows['token_and_coreference_chain_indexes']
+            if holmes_dictionary.token_and_coreference_chain_indexes is None:
+                lengths.append(-1)
+            else:
+                lengths.append(len(holmes_dictionary.token_and_coreference_chain_indexes))
+                rows.extend((index,) for index in
+                    holmes_dictionary.token_and_coreference_chain_indexes)
+            lengths, rows = list_lengths_and_rows['mentions']
+            mention_index_lengths, mention_index_rows = list_lengths_and_rows['mention_indexes']
+            lengths.append(len(holmes_dictionary.mentions))
+            for mention in holmes_dictionary.mentions:
+                rows.append((mention.root_index,))
+                mention_index_lengths.append(len(mention.indexes))
+                mention_index_rows.extend((index,) for index in mention.indexes)
+            lengths, rows = list_lengths_and_rows['subwords']
+            lengths.append(len(holmes_dictionary.subwords))
+            rows.extend((
+                subword.containing_token_index, subword.index, self.string_index(subword.text),
+                self.string_index(subword.lemma), self.string_index(subword.derived_lemma),
+                subword.char_start_index, self.optional_int(subword.dependent_index),
+                self.string_index(subword.dependency_label),
+                self.optional_int(subword.governor_index),
+                self.string_index(subword.governing_dependency_label))
+                for subword in holmes_dictionary.subwords)
+            if holmes_dictionary.ent_type is not None:
+                extra_attributes[token.i] = {'ent_type': holmes_dictionary.ent_type}
+        columns = {'tokens': array(token_rows, dtype=int32).reshape(-1, 9)}
+        for attribute, width in (
+                ('children', 4), ('parents', 4), ('coreference_linked_child_dependencies', 2),
+                ('coreference_linked_parent_dependencies', 2), ('righthand_siblings', 1),
+                ('token_and_coreference_chain_indexes', 1), ('mentions', 1),
+                ('mention_indexes', 1), ('subwords', 10)):
+            columns[attribute] = self.to_list_column(*list_lengths_and_rows[attribute], width)
+        columns['strings'] = self.strings
+        columns['extra_attributes'] = extra_attributes
+        return columns
+
+    def restore(self, doc, columns, vectors_vocab):
+        """ Sets *token._.holmes* on each token of *doc* from *columns*. Vectors are retrieved
+            from *vectors_vocab*.
+        """
+
+        def iterate_rows(attribute):
+            lengths, rows = columns[attribute]
+            start = 0
+            for length in lengths:
+                if length == -1:
+                    yield None
+                    continue
+                yield rows[start:start + length]
+                start += length
+
+        self.strings = columns['strings']
+        string = self.string
+        list_iterators = {attribute: iterate_rows(attribute) for attribute in (
+            'children', 'parents', 'coreference_linked_child_dependencies',
+            'coreference_linked_parent_dependencies', 'righthand_siblings',
+            'token_and_coreference_chain_indexes', 'mentions', 'subwords')}
+        mention_index_iterator = iterate_rows('mention_indexes')
+        for token, token_row in zip(doc, columns['tokens']):
+            lemma_index, derived_lemma_index, token_or_lefthand_sibling_index, \
+                is_involved_in_or_conjunction, is_negated, is_matchable, \
+                is_initial_question_word, has_initial_question_word_in_phrase, \
+                most_specific_coreferring_term_index = token_row
+            lemma = string(lemma_index)
+            holmes_dictionary = HolmesDictionary(
+                token.i, lemma, string(derived_lemma_index), vectors_vocab,
+                token.lemma_ if len(lemma.split()) > 1 else None)
+            holmes_dictionary.token_or_lefthand_sibling_index = \
+                self.int_or_none(token_or_lefthand_sibling_index)
+            holmes_dictionary.is_involved_in_or_conjunction = bool(is_involved_in_or_conjunction)
+            holmes_dictionary.is_negated = None if is_negated == -1 else bool(is_negated)
+            holmes_dictionary.is_matchable = None if is_matchable == -1 else bool(is_matchable)
+            holmes_dictionary.is_initial_question_word = bool(is_initial_question_word)
+            holmes_dictionary.has_initial_question_word_in_phrase = \
+                bool(has_initial_question_word_in_phrase)
+            if most_specific_coreferring_term_index != -2:
+                holmes_dictionary.most_specific_coreferring_term_index = \
+                    self.int_or_none(most_specific_coreferring_term_index)
+            for attribute in self.dependency_attributes:
+                setattr(holmes_dictionary, attribute, [SemanticDependency(
+                    int(parent_index), int(child_index), string(label_index), bool(is_uncertain))
+                    for parent_index, child_index, label_index, is_uncertain in
+                    next(list_iterators[attribute])])
+            for attribute in self.index_label_attributes:
+                setattr(holmes_dictionary, attribute, [[int(index), string(label_index)]
+                    for index, label_index in next(list_iterators[attribute])])
+            holmes_dictionary.righthand_siblings = [
+                int(row[0]) for row in next(list_iterators['righthand_siblings'])]
+            token_and_coreference_chain_indexes = \
+                next(list_iterators['token_and_coreference_chain_indexes'])
+            if token_and_coreference_chain_indexes is not None:
+                holmes_dictionary.token_and_coreference_chain_indexes = [
+                    int(row[0]) for row in token_and_coreference_chain_indexes]
+            holmes_dictionary.mentions = [Mention(int(row[0]), [
+                int(index_row[0]) for index_row in next(mention_index_iterator)])
+                for row in next(list_iterators['mentions'])]
+            holmes_dictionary.subwords = [Subword(
+                int(containing_token_index), int(index), string(text_index),
+                string(lemma_index), string(derived_lemma_index), vectors_vocab,
+                int(char_start_index), self.int_or_none(dependent_index),
+                string(dependency_label_index), self.int_or_none(governor_index),
+                string(governing_dependency_label_index))
+                for containing_token_index, index, text_index, lemma_index, derived_lemma_index,
+                char_start_index, dependent_index, dependency_label_index, governor_index,
+                governing_dependency_label_index in next(list_iterators['subwords'])]
+            if token.i in columns['extra_attributes']:
+                for key, value in columns['extra_attributes'][token.i].items():
+                    setattr(holmes_dictionary, key, value)
+            token._.set('holmes', holmes_dictionary)
+
+class HolmesAnnotationStore:
+    """A Holmes-owned view of the token annotations of a document used by the matching code in
+        place of *token._.holmes* and *token._.coref_chains*, each access to which creates a
+        spaCy *Underscore* proxy and looks up the extension. The lists are indexed by token index.
+        The store holds references to the same *HolmesDictionary* objects as the document, so it
+        remains valid as long as the dictionaries are not replaced.
+    """
+
+    def __init__(self, doc):
+        self.holmes_dictionaries = [token._.holmes for token in doc]
+        self.coref_chains = [token._.coref_chains for token in doc]
+
+    def child_dictionary(self, dependency):
+        """Returns the Holmes dictionary of the child token of *dependency*."""
+        index = dependency.child_index
+        if index < 0:
+            index = -1 - index
+        return self.holmes_dictionaries[index]
+
+    def __len__(self):
+        return len(self.holmes_dictionaries)
+
+def get_annotation_store(doc):
+    """ Returns the *HolmesAnnotationStore* for a document, creating it the first time it is
+        required. The store is held within the document information so that it is shared by all
+        matching operations on the document; it is not serialized.
+    """
+    document_info = doc._.holmes_document_info
+    if document_info is None:
+        return HolmesAnnotationStore(doc)
+    annotation_store = getattr(document_info, 'annotation_store', None)
+    if annotation_store is None or len(annotation_store) != len(doc):
+        annotation_store = document_info.annotation_store = HolmesAnnotationStore(doc)
+    return annotation_store
+
+def serialize_holmes_document(doc):
+    """ Serializes a Holmes document, storing the token annotations in columnar form within the
+        document information rather than as one pickled object per token.
+    """
+    holmes_dictionaries = [token._.holmes for token in doc]
+    document_info = doc._.holmes_document_info
+    serialized_document_version = document_info.serialized_document_version
+    document_info.serialized_document_version = SERIALIZED_DOCUMENT_VERSION
+    document_info.token_annotation_columns = HolmesDocumentColumns().to_columns(doc)
+    try:
+        for token in doc:
+            token._.set('holmes', None)
+        return doc.to_bytes()
+    finally:
+        document_info.serialized_document_version = serialized_document_version
+        document_info.token_annotation_columns = None
+        for token, holmes_dictionary in zip(doc, holmes_dictionaries):
+            token._.set('holmes', holmes_dictionary)
+
+def deserialize_holmes_document(serialized_doc, vocab, vectors_vocab):
+    """ Deserializes a document serialized either with *serialize_holmes_document()* or, for
+        documents of older versions or where the caller used *doc.to_bytes()* directly, with
+        one pickled object per token.
+
+        serialized_doc -- the serialized document.
+        vocab -- the vocabulary with which to create the document.
+        vectors_vocab -- the vocabulary from which to retrieve vectors.
+    """
+    doc = Doc(vocab).from_bytes(serialized_doc)
+    document_info = doc._.holmes_document_info
+    if document_info is not None and \
+            getattr(document_info, 'token_annotation_columns', None) is not None:
+        HolmesDocumentColumns().restore(doc, document_info.token_annotation_columns, vectors_vocab)
+        document_info.token_annotation_columns = None
+    else:
+        for token in doc:
+            if token._.holmes is not None:
+                token._.holmes.attach_vectors_vocab(vectors_vocab)
+                if len(token._.holmes.lemma.split()) > 1:
+                    token._.holmes.vector_lemma = token.lemma_
+    return doc
+
 class PhraseletTemplate:
     """A template for a phraselet used in topic matching.
 
@@ -529,6 +1627,22 @@ class PhraseletInfo:
             str(self.frequency_factor), str(self.parent_frequency_factor),
             str(self.child_frequency_factor)))
 
+    def get_search_phrase_key(self, reverse_matching_frequency_threshold=None):
+        """ Returns a key that is identical for two phraselet infos exactly when
+            *LinguisticObjectFactory.create_search_phrases_from_phraselet_infos()* would create
+            equivalent search phrases from them with *reverse_matching_frequency_threshold*. The
+            frequency factors are only relevant to the extent that they are compared with the
+            threshold.
+        """
+        return (
+            self.label, self.template_label, self.parent_lemma, self.parent_derived_lemma,
+            self.parent_ent_type, self.parent_is_initial_question_word,
+            self.parent_has_initial_question_word_in_phrase, self.child_lemma,
+            self.child_derived_lemma, self.child_ent_type, self.child_is_initial_question_word,
+            self.child_has_initial_question_word_in_phrase, self.created_without_matching_tags,
+            self.reverse_only_parent_lemma, reverse_matching_frequency_threshold is not None and
+            self.parent_frequency_factor < reverse_matching_frequency_threshold)
+
 class SearchPhrase:
 
     def __init__(self, doc, matchable_token_indexes, root_token_index,
@@ -610,6 +1724,78 @@ class SemanticAnalyzerFactory():
         return language_specific_rules_module.\
             LanguageSpecificSemanticAnalyzer(nlp=nlp, vectors_nlp=vectors_nlp)
 
+class SubwordCache:
+    """A size-bounded least-recently-used cache from *(token text, part of speech)* keys to the
+        subwords found within words with that text and part of speech. Each value is a tuple of
+        *(index, text, lemma, derived_lemma, char_start_index, dependent_index, dependency_label,
+        governor_index, governing_dependency_label)* tuples; an empty tuple records that a word
+        has no subwords. Vectors are not cached as they can be retrieved cheaply from the
+        vocabulary. The cache is shared by all documents parsed with the same semantic analyzer
+        and may be saved to and loaded from disk.
+    """
+
+    def __init__(self, maximum_size):
+        self.maximum_size = maximum_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get(self, key):
+        """ Returns the cached value for *key*, or *None* if there is none. """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def __contains__(self, key):
+        """ Checks for *key* without affecting the recency order or the counters. """
+        with self.lock:
+            return key in self.entries
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maximum_size:
+                self.entries.popitem(last=False)
+
+    def get_statistics(self):
+        with self.lock:
+            return {'size': len(self.entries), 'maximum_size': self.maximum_size,
+                'hits': self.hits, 'misses': self.misses}
+
+    def save(self, filename, model):
+        """Writes the cache entries, least recently used first, to *filename*.
+
+        Args:
+
+        filename -- the name of the file to write.
+        model -- the name of the model with which the entries were generated.
+        """
+        with self.lock:
+            serializable_entries = [(text, pos, value) for (text, pos), value in
+                self.entries.items()]
+        srsly.write_msgpack(filename, {'model': model, 'entries': serializable_entries})
+
+    def load(self, filename, model):
+        """Adds the entries saved in *filename* to the cache.
+
+        Args:
+
+        filename -- the name of the file to read.
+        model -- the name of the current model, which must match the model with which the
+            entries were generated.
+        """
+        serialized_cache = srsly.read_msgpack(filename)
+        if serialized_cache['model'] != model:
+            raise WrongModelDeserializationError('; '.join((model, serialized_cache['model'])))
+        for text, pos, value in serialized_cache['entries']:
+            self.put((text, pos), tuple(tuple(subword_tuple) for subword_tuple in value))
+
 class SemanticAnalyzer(ABC):
     """Abstract *SemanticAnalyzer* parent class. A *SemanticAnalyzer* is responsible for adding the
     *token._.holmes* dictionaries to each token within a spaCy document. It requires full access to
@@ -674,8 +1860,15 @@ class SemanticAnalyzer(ABC):
 
     whose_lemma = NotImplemented
 
+    def lemmatize_subwords(self, spacy_doc, subword_cache):
+        """ Returns a dictionary from subword lemmatization strings to lemmatized documents for
+            use by *add_subwords()*, or an empty dictionary for languages where subwords are not
+            analysed.
+        """
+        return {}
+
     @abstractmethod
-    def add_subwords(self, token, subword_cache):
+    def add_subwords(self, token, subword_cache, lemmatization_strings_to_docs):
         pass
 
     @abstractmethod
@@ -713,6 +1906,7 @@ class SemanticAnalyzer(ABC):
         self.model = '_'.join((self.nlp.meta['lang'], self.nlp.meta['name']))
         self.derivational_dictionary = self.load_derivational_dictionary()
         self.serialized_document_version = SERIALIZED_DOCUMENT_VERSION
+        self.subword_cache = SubwordCache(self._maximum_subword_cache_size)
 
     def load_derivational_dictionary(self):
         in_package_filename = ''.join(('lang/', self.nlp.meta['lang'], '/data/derivation.csv'))
@@ -727,6 +1921,8 @@ class SemanticAnalyzer(ABC):
 
     _maximum_document_size = 1000000
 
+    _maximum_subword_cache_size = 100000
+
     def spacy_parse(self, text):
         """Performs a standard spaCy parse on a string.
         """
@@ -741,8 +1937,7 @@ class SemanticAnalyzer(ABC):
     def get_vector(self, lemma):
         """ Returns a vector representation of *lemma*, or *None* if none is available.
         """
-        lexeme = self.vectors_nlp.vocab[lemma]
-        return lexeme.vector if lexeme.has_vector and lexeme.vector_norm > 0 else None
+        return get_vector_from_vocab(self.vectors_nlp.vocab, lemma)
 
     def holmes_parse(self, spacy_doc):
         """Adds the Holmes-specific information to each token within a spaCy document.
@@ -751,9 +1946,9 @@ class SemanticAnalyzer(ABC):
         for token in spacy_doc:
             lemma = self.holmes_lemma(token)
             derived_lemma = self.derived_holmes_lemma(token, lemma)
-            lexeme = self.vectors_nlp.vocab[token.lemma_ if len(lemma.split()) > 1 else lemma]
-            vector = lexeme.vector if lexeme.has_vector and lexeme.vector_norm > 0 else None
-            token._.set('holmes', HolmesDictionary(token.i, lemma, derived_lemma, vector))
+            token._.set('holmes', HolmesDictionary(
+                token.i, lemma, derived_lemma, self.vectors_nlp.vocab,
+                token.lemma_ if len(lemma.split()) > 1 else None))
         for token in spacy_doc:
             self.set_negation(token)
         for token in spacy_doc:
@@ -765,9 +1960,9 @@ class SemanticAnalyzer(ABC):
                 token)
         for token in spacy_doc:
             self.copy_any_sibling_info(token)
-        subword_cache = {}
+        lemmatization_strings_to_docs = self.lemmatize_subwords(spacy_doc, self.subword_cache)
         for token in spacy_doc:
-            self.add_subwords(token, subword_cache)
+            self.add_subwords(token, self.subword_cache, lemmatization_strings_to_docs)
         for token in spacy_doc:
             self.set_coreference_information(token)
         for token in spacy_doc:
@@ -1283,8 +2478,9 @@ class LinguisticObjectFactory:
                             word_set_including_any_ontology.add(word_matching)
                 frequencies = []
                 for word in word_set_including_any_ontology:
-                    if word in words_to_corpus_frequencies:
-                        frequencies.append(float(words_to_corpus_frequencies[word]))
+                    frequency = words_to_corpus_frequencies.get(word)
+                    if frequency is not None:
+                        frequencies.append(float(frequency))
                 if len(frequencies) == 0:
                     return 1.0
                 adjusted_max_frequency = max(frequencies) - 1.0
@@ -1975,7 +3171,11 @@ class SemanticMatchingHelper(ABC):
         return 0.0
 
     def add_to_corpus_index(self, corpus_index_dict, parsed_document, document_label):
-        """ Indexes a parsed document. """
+        """ Indexes a parsed document and returns the set of key words under which the document
+            was indexed so that it can later be removed without scanning the whole index.
+        """
+
+        key_words = set()
 
         def add_dict_entry(dictionary, word, token_index, subword_index, match_type):
             index = Index(token_index, subword_index)
@@ -1984,12 +3184,10 @@ class SemanticMatchingHelper(ABC):
                 key_word = word
             else:
                 key_word = word.lower()
-            if key_word in dictionary.keys():
-                if index not in dictionary[key_word]:
-                    dictionary[key_word].append((
-                        corpus_word_position, word, match_type == 'derivation'))
-            else:
-                dictionary[key_word] = [(corpus_word_position, word, match_type == 'derivation')]
+            key_words.add(key_word)
+            if key_word not in dictionary:
+                dictionary[key_word] = CorpusIndexEntry()
+            dictionary[key_word].add(corpus_word_position, word, match_type == 'derivation')
 
         def get_ontology_defined_multiword(token):
             for multiword_span in \
@@ -2040,15 +3238,24 @@ class SemanticMatchingHelper(ABC):
                     add_dict_entry(
                         corpus_index_dict, representation, token.i, subword.index,
                         match_type)
+        return key_words
+
+    def remove_from_corpus_index(self, corpus_index_dict, document_label, key_words):
+        """ Removes a document from a corpus index in place.
 
-    def get_corpus_index_removing_document(self, corpus_index_dict, document_label):
-        new_corpus_index_dict = {}
-        for entry in corpus_index_dict:
-            new_value = ([(c, w, m) for (c, w, m) in corpus_index_dict[entry] if c.document_label !=
-                document_label])
-            if len(new_value) > 0:
-                new_corpus_index_dict[entry] = new_value
-        return new_corpus_index_dict
+        Args:
+
+        corpus_index_dict -- the corpus index.
+        document_label -- the label of the document to remove.
+        key_words -- the key words returned when the document was added to the index.
+        """
+        for key_word in key_words:
+            if key_word not in corpus_index_dict:
+                continue
+            corpus_index_entry = corpus_index_dict[key_word]
+            corpus_index_entry.remove_document(document_label)
+            if len(corpus_index_entry) == 0:
+                del corpus_index_dict[key_word]
 
     def dependency_labels_match(self, *, search_phrase_dependency_label, document_dependency_label,
             inverse_polarity:bool):
@@ -1,4 +1,5 @@
-from .parsing import Index, CorpusWordPosition
+from time import perf_counter
+from .parsing import Index, CorpusWordPosition, get_annotation_store
 
 class TopicMatch:
     """A topic match between some text and part of a document. Note that the end indexes refer
@@ -77,7 +78,8 @@ class TopicMatcher:
 
     def __init__(
             self, *, structural_matcher, document_labels_to_documents, corpus_index_dict,
-            text_to_match, phraselet_labels_to_phraselet_infos, phraselet_labels_to_search_phrases,
+            corpus_embedding_matrix, text_to_match, phraselet_labels_to_phraselet_infos,
+            phraselet_labels_to_search_phrases,
             maximum_activation_distance, overall_similarity_threshold,
             initial_question_word_overall_similarity_threshold, relation_score,
             reverse_only_relation_score, single_word_score, single_word_any_tag_score,
@@ -86,11 +88,13 @@ class TopicMatcher:
             ontology_penalty, relation_matching_frequency_threshold,
             embedding_matching_frequency_threshold, sideways_match_extent,
             only_one_result_per_document, number_of_results, document_label_filter,
-            use_frequency_factor):
+            use_frequency_factor, use_document_score_bounds=False, document_label_index=None,
+            dependency_edge_index=None, profile=False):
         self.structural_matcher = structural_matcher
         self.semantic_matching_helper = structural_matcher.semantic_matching_helper
         self.document_labels_to_documents = document_labels_to_documents
         self.corpus_index_dict = corpus_index_dict
+        self.corpus_embedding_matrix = corpus_embedding_matrix
         self.text_to_match = text_to_match
         self.phraselet_labels_to_phraselet_infos = phraselet_labels_to_phraselet_infos
         self.phraselet_labels_to_search_phrases = phraselet_labels_to_search_phrases
@@ -116,68 +120,145 @@ class TopicMatcher:
         self.only_one_result_per_document = only_one_result_per_document
         self.number_of_results = number_of_results
         self.document_label_filter = document_label_filter
+        self.document_label_index = document_label_index
+        self.dependency_edge_index = dependency_edge_index
         self.use_frequency_factor = use_frequency_factor
+        self.use_document_score_bounds = use_document_score_bounds
         self.words_to_phraselet_word_match_infos = {}
+        # The token annotations of each document and phraselet, looked up once rather than for
+        # every word match
+        self.document_labels_to_holmes_dictionaries = {}
+        self.phraselet_labels_to_holmes_dictionaries = {}
+        # Maps stage names to dictionaries holding the time spent and item counts for each stage,
+        # or *None* if profiling is not active
+        self.stage_profile = {} if profile else None
 
-        process_initial_question_words = initial_question_word_behaviour in ('process', 'exclusive')
+        self.process_initial_question_words = \
+            initial_question_word_behaviour in ('process', 'exclusive')
 
+        phraselet_labels_to_frequency_factors = {info.label: info.frequency_factor for info
+            in phraselet_labels_to_phraselet_infos.values()}
+        if self.use_document_score_bounds:
+            self.topic_matches = self.generate_topic_matches_within_document_score_bounds(
+                phraselet_labels_to_frequency_factors)
+        else:
+            position_sorted_structural_matches = self.get_position_sorted_structural_matches(None)
+            # Read through the documents measuring the activation based on where
+            # in the document structural matches were found
+            start_time = perf_counter()
+            score_sorted_structural_matches = self.perform_activation_scoring(
+                position_sorted_structural_matches, phraselet_labels_to_frequency_factors)
+            self.record_stage(
+                'perform_activation_scoring', start_time,
+                matches=len(position_sorted_structural_matches))
+            start_time = perf_counter()
+            self.topic_matches = self.generate_topic_matches(
+                score_sorted_structural_matches, position_sorted_structural_matches)
+            self.record_stage(
+                'generate_topic_matches', start_time, topic_matches=len(self.topic_matches))
+
+    def get_position_sorted_structural_matches(self, document_labels):
+        """Performs the structural matching passes and returns the matches found, sorted by
+            position and with duplicates removed.
+
+            Parameters:
+
+            document_labels -- the labels of the documents to be matched, or *None* if all
+                documents are to be matched.
+        """
         # First get single-word matches
+        start_time = perf_counter()
         structural_matches = self.structural_matcher.match(
             document_labels_to_documents=self.document_labels_to_documents,
             corpus_index_dict=self.corpus_index_dict,
-            search_phrases=phraselet_labels_to_search_phrases.values(),
+            search_phrases=self.phraselet_labels_to_search_phrases.values(),
             match_depending_on_single_words=True,
             compare_embeddings_on_root_words=False,
             compare_embeddings_on_non_root_words=False,
             reverse_matching_corpus_word_positions=None,
             embedding_reverse_matching_corpus_word_positions=None,
-            process_initial_question_words=process_initial_question_words,
-            overall_similarity_threshold=overall_similarity_threshold,
+            process_initial_question_words=self.process_initial_question_words,
+            overall_similarity_threshold=self.overall_similarity_threshold,
             initial_question_word_overall_similarity_threshold=
-            initial_question_word_overall_similarity_threshold,
-            document_label_filter=self.document_label_filter)
+            self.initial_question_word_overall_similarity_threshold,
+            document_label_filter=self.document_label_filter,
+            document_labels=document_labels,
+            document_label_index=self.document_label_index,
+            dependency_edge_index=self.dependency_edge_index)
+        if self.stage_profile is not None:
+            self.record_stage(
+                'single_word_matching', start_time,
+                phraselets=len([1 for phraselet in
+                self.phraselet_labels_to_search_phrases.values() if
+                phraselet.has_single_matchable_word]),
+                matches=len(structural_matches))
 
         # Now get normally matched relations
+        start_time = perf_counter()
+        number_of_matches = len(structural_matches)
         structural_matches.extend(self.structural_matcher.match(
             document_labels_to_documents=self.document_labels_to_documents,
             corpus_index_dict=self.corpus_index_dict,
-            search_phrases=phraselet_labels_to_search_phrases.values(),
+            search_phrases=self.phraselet_labels_to_search_phrases.values(),
             match_depending_on_single_words=False,
             compare_embeddings_on_root_words=False,
             compare_embeddings_on_non_root_words=False,
             reverse_matching_corpus_word_positions=None,
             embedding_reverse_matching_corpus_word_positions=None,
-            process_initial_question_words=process_initial_question_words,
-            overall_similarity_threshold=overall_similarity_threshold,
+            process_initial_question_words=self.process_initial_question_words,
+            overall_similarity_threshold=self.overall_similarity_threshold,
             initial_question_word_overall_similarity_threshold=
-            initial_question_word_overall_similarity_threshold,
-            document_label_filter=self.document_label_filter))
+            self.initial_question_word_overall_similarity_threshold,
+            document_label_filter=self.document_label_filter,
+            document_labels=document_labels,
+            document_label_index=self.document_label_index,
+            dependency_edge_index=self.dependency_edge_index))
+        if self.stage_profile is not None:
+            # Reverse-only phraselets are only matched at the positions selected for retrying
+            self.record_stage(
+                'relation_matching', start_time,
+                phraselets=len([1 for phraselet in
+                self.phraselet_labels_to_search_phrases.values() if not
+                phraselet.has_single_matchable_word and not phraselet.reverse_only and
+                not phraselet.treat_as_reverse_only_during_initial_relation_matching]),
+                matches=len(structural_matches) - number_of_matches)
 
-        self.rebuild_document_info_dict(structural_matches, phraselet_labels_to_phraselet_infos)
+        start_time = perf_counter()
+        self.rebuild_document_info_dict(
+            structural_matches, self.phraselet_labels_to_phraselet_infos)
+        self.record_stage(
+            'rebuild_document_info_dict', start_time, matches=len(structural_matches))
+        start_time = perf_counter()
+        number_of_relation_phraselets = 0
         parent_direct_retry_corpus_word_positions = set()
         parent_embedding_retry_corpus_word_positions = set()
         child_embedding_retry_corpus_word_positions = set()
         for phraselet in (
-                phraselet_labels_to_search_phrases[phraselet_info.label] for
-                phraselet_info in phraselet_labels_to_phraselet_infos.values() if
+                self.phraselet_labels_to_search_phrases[phraselet_info.label] for
+                phraselet_info in self.phraselet_labels_to_phraselet_infos.values() if
                 phraselet_info.child_lemma is not None):
+            number_of_relation_phraselets += 1
             self.get_indexes_for_reverse_matching(
                 phraselet=phraselet,
-                phraselet_info=phraselet_labels_to_phraselet_infos[phraselet.label],
+                phraselet_info=self.phraselet_labels_to_phraselet_infos[phraselet.label],
                 parent_direct_retry_corpus_word_positions=
                 parent_direct_retry_corpus_word_positions,
                 parent_embedding_retry_corpus_word_positions=
                 parent_embedding_retry_corpus_word_positions,
                 child_embedding_retry_corpus_word_positions=
                 child_embedding_retry_corpus_word_positions)
+        self.record_stage(
+            'retry_position_selection', start_time, phraselets=number_of_relation_phraselets)
         if len(parent_embedding_retry_corpus_word_positions) > 0 or \
                 len(parent_direct_retry_corpus_word_positions) > 0:
 
             # Perform reverse matching at selected indexes
+            start_time = perf_counter()
+            number_of_matches = len(structural_matches)
             structural_matches.extend(self.structural_matcher.match(
                 document_labels_to_documents=self.document_labels_to_documents,
                 corpus_index_dict=self.corpus_index_dict,
-                search_phrases=phraselet_labels_to_search_phrases.values(),
+                search_phrases=self.phraselet_labels_to_search_phrases.values(),
                 match_depending_on_single_words=False,
                 compare_embeddings_on_root_words=True,
                 compare_embeddings_on_non_root_words=False,
@@ -185,36 +266,62 @@ class TopicMatcher:
                 parent_direct_retry_corpus_word_positions,
                 embedding_reverse_matching_corpus_word_positions=
                 parent_embedding_retry_corpus_word_positions,
-                process_initial_question_words=process_initial_question_words,
-                overall_similarity_threshold=overall_similarity_threshold,
+                process_initial_question_words=self.process_initial_question_words,
+                overall_similarity_threshold=self.overall_similarity_threshold,
                 initial_question_word_overall_similarity_threshold=
-                initial_question_word_overall_similarity_threshold,
-                document_label_filter=self.document_label_filter))
+                self.initial_question_word_overall_similarity_threshold,
+                document_label_filter=self.document_label_filter,
+                document_labels=document_labels,
+                corpus_embedding_matrix=self.corpus_embedding_matrix,
+                document_label_index=self.document_label_index,
+                dependency_edge_index=self.dependency_edge_index))
+            self.record_stage(
+                'reverse_matching', start_time,
+                corpus_word_positions=len(parent_direct_retry_corpus_word_positions) +
+                len(parent_embedding_retry_corpus_word_positions),
+                matches=len(structural_matches) - number_of_matches)
 
         if len(child_embedding_retry_corpus_word_positions) > 0:
             # Retry normal matching at selected indexes with embedding-based matching on children
+            start_time = perf_counter()
+            number_of_matches = len(structural_matches)
             structural_matches.extend(self.structural_matcher.match(
                 document_labels_to_documents=self.document_labels_to_documents,
                 corpus_index_dict=self.corpus_index_dict,
-                search_phrases=phraselet_labels_to_search_phrases.values(),
+                search_phrases=self.phraselet_labels_to_search_phrases.values(),
                 match_depending_on_single_words=False,
                 compare_embeddings_on_root_words=False,
                 compare_embeddings_on_non_root_words=True,
                 reverse_matching_corpus_word_positions=None,
                 embedding_reverse_matching_corpus_word_positions=
                 child_embedding_retry_corpus_word_positions,
-                process_initial_question_words=process_initial_question_words,
-                overall_similarity_threshold=overall_similarity_threshold,
+                process_initial_question_words=self.process_initial_question_words,
+                overall_similarity_threshold=self.overall_similarity_threshold,
                 initial_question_word_overall_similarity_threshold=
-                initial_question_word_overall_similarity_threshold,
-                document_label_filter=self.document_label_filter))
+                self.initial_question_word_overall_similarity_threshold,
+                document_label_filter=self.document_label_filter,
+                document_labels=document_labels,
+                document_label_index=self.document_label_index,
+                dependency_edge_index=self.dependency_edge_index))
+            self.record_stage(
+                'child_embedding_matching', start_time,
+                corpus_word_positions=len(child_embedding_retry_corpus_word_positions),
+                matches=len(structural_matches) - number_of_matches)
         if len(parent_direct_retry_corpus_word_positions) > 0 or \
                 len(parent_embedding_retry_corpus_word_positions) > 0 or \
                 len(child_embedding_retry_corpus_word_positions) > 0:
-            self.rebuild_document_info_dict(structural_matches, phraselet_labels_to_phraselet_infos)
+            start_time = perf_counter()
+            self.rebuild_document_info_dict(
+                structural_matches, self.phraselet_labels_to_phraselet_infos)
+            self.record_stage(
+                'rebuild_document_info_dict', start_time, matches=len(structural_matches))
+        start_time = perf_counter()
+        number_of_matches = len(structural_matches)
         structural_matches = list(filter(self.filter_superfluous_matches, structural_matches))
-        phraselet_labels_to_frequency_factors = {info.label: info.frequency_factor for info
-            in phraselet_labels_to_phraselet_infos.values()}
+        self.record_stage(
+            'filter_superfluous_matches', start_time, matches=len(structural_matches),
+            matches_filtered=number_of_matches - len(structural_matches))
+        start_time = perf_counter()
         position_sorted_structural_matches = sorted(
             structural_matches, key=lambda match:
             (
@@ -225,13 +332,28 @@ class TopicMatcher:
                 match.from_single_word_phraselet))
         position_sorted_structural_matches = self.remove_duplicates(
             position_sorted_structural_matches)
+        self.record_stage(
+            'remove_duplicates', start_time, matches=len(position_sorted_structural_matches),
+            matches_filtered=len(structural_matches) - len(position_sorted_structural_matches))
+        return position_sorted_structural_matches
 
-        # Read through the documents measuring the activation based on where
-        # in the document structural matches were found
-        score_sorted_structural_matches = self.perform_activation_scoring(
-            position_sorted_structural_matches, phraselet_labels_to_frequency_factors)
-        self.topic_matches = self.generate_topic_matches(
-            score_sorted_structural_matches, position_sorted_structural_matches)
+    def record_stage(self, stage, start_time, **counts):
+        """Adds the time elapsed since *start_time* and *counts* to the profile entry for *stage*
+            if profiling is active. Stages that are performed more than once accumulate their
+            times and counts.
+        """
+        if self.stage_profile is None:
+            return
+        if stage not in self.stage_profile:
+            self.stage_profile[stage] = {'seconds': 0.0, 'calls': 0}
+        stage_info = self.stage_profile[stage]
+        stage_info['seconds'] += perf_counter() - start_time
+        stage_info['calls'] += 1
+        for key, value in counts.items():
+            if key in stage_info:
+                stage_info[key] += value
+            else:
+                stage_info[key] = value
 
     def get_phraselet_word_match_info(self, word):
         if word in self.words_to_phraselet_word_match_infos:
@@ -258,15 +380,18 @@ class TopicMatcher:
             child (non-root) word. These are ascertained by examining the parent words.
         """
 
+        phraselet_holmes_dictionaries = self.get_phraselet_holmes_dictionaries(phraselet)
         parent_token = phraselet.root_token
-        parent_word = parent_token._.holmes.lemma_or_derived_lemma()
+        parent_token_holmes = phraselet_holmes_dictionaries[parent_token.i]
+        parent_word = parent_token_holmes.lemma_or_derived_lemma()
         child_token = [token for token in phraselet.matchable_tokens if token.i !=
                        parent_token.i][0]
-        child_word = child_token._.holmes.lemma_or_derived_lemma()
+        child_token_holmes = phraselet_holmes_dictionaries[child_token.i]
+        child_word = child_token_holmes.lemma_or_derived_lemma()
         if parent_word in self.words_to_phraselet_word_match_infos and ((not \
                 phraselet.reverse_only and not \
                 phraselet.treat_as_reverse_only_during_initial_relation_matching)
-                or child_token._.holmes.has_initial_question_word_in_phrase):
+                or child_token_holmes.has_initial_question_word_in_phrase):
             parent_phraselet_word_match_info = self.words_to_phraselet_word_match_infos[
                 parent_word]
             parent_single_word_match_corpus_words = \
@@ -280,7 +405,7 @@ class TopicMatcher:
                 parent_relation_match_corpus_words = []
             if phraselet_info.parent_frequency_factor >= \
                     self.embedding_matching_frequency_threshold or \
-                    child_token._.holmes.has_initial_question_word_in_phrase:
+                    child_token_holmes.has_initial_question_word_in_phrase:
                 child_embedding_retry_corpus_word_positions.update(cwp for cwp in
                     parent_single_word_match_corpus_words.difference(
                     parent_relation_match_corpus_words))
@@ -297,7 +422,7 @@ class TopicMatcher:
                 child_relation_match_corpus_words = []
 
             if phraselet_info.child_frequency_factor >= self.embedding_matching_frequency_threshold\
-                    or parent_token._.holmes.has_initial_question_word_in_phrase:
+                    or parent_token_holmes.has_initial_question_word_in_phrase:
                 set_to_add_to = parent_embedding_retry_corpus_word_positions
             elif phraselet_info.child_frequency_factor >= \
                     self.relation_matching_frequency_threshold \
@@ -306,17 +431,17 @@ class TopicMatcher:
                 set_to_add_to = parent_direct_retry_corpus_word_positions
             else:
                 return
-            linking_dependency = parent_token._.holmes.get_label_of_dependency_with_child_index(
+            linking_dependency = parent_token_holmes.get_label_of_dependency_with_child_index(
                 child_token.i)
             for corpus_word_position in child_single_word_match_corpus_words.difference(
                     child_relation_match_corpus_words):
-                doc = self.document_labels_to_documents[corpus_word_position.document_label]
                 working_index = corpus_word_position.index
-                working_token = doc[working_index.token_index]
+                working_token_holmes = self.get_document_holmes_dictionaries(
+                    corpus_word_position.document_label)[working_index.token_index]
                 if not working_index.is_subword() or \
-                        working_token._.holmes.subwords[working_index.subword_index].is_head:
+                        working_token_holmes.subwords[working_index.subword_index].is_head:
                     for parent_dependency in \
-                            working_token._.holmes.coreference_linked_parent_dependencies:
+                            working_token_holmes.coreference_linked_parent_dependencies:
                         if self.semantic_matching_helper.dependency_labels_match(
                                 search_phrase_dependency_label=linking_dependency,
                                 document_dependency_label=parent_dependency[1],
@@ -326,7 +451,7 @@ class TopicMatcher:
                                 working_index)
                             set_to_add_to.add(working_cwp)
                     for child_dependency in \
-                            working_token._.holmes.coreference_linked_child_dependencies:
+                            working_token_holmes.coreference_linked_child_dependencies:
                         if self.structural_matcher.use_reverse_dependency_matching and \
                                 self.semantic_matching_helper.dependency_labels_match(
                                 search_phrase_dependency_label=linking_dependency,
@@ -338,7 +463,7 @@ class TopicMatcher:
                             set_to_add_to.add(working_cwp)
                 else:
                     working_subword = \
-                        working_token._.holmes.subwords[working_index.subword_index]
+                        working_token_holmes.subwords[working_index.subword_index]
                     if self.semantic_matching_helper.dependency_labels_match(
                             search_phrase_dependency_label=linking_dependency,
                             document_dependency_label=
@@ -365,7 +490,9 @@ class TopicMatcher:
 
         def process_word_match(match, parent): # 'True' -> parent, 'False' -> child
             word_match = self.get_word_match_from_match(match, parent)
-            word = word_match.search_phrase_token._.holmes.lemma_or_derived_lemma()
+            word = self.get_phraselet_holmes_dictionaries(
+                self.phraselet_labels_to_search_phrases[match.search_phrase_label])[
+                word_match.search_phrase_token.i].lemma_or_derived_lemma()
             phraselet_word_match_info = self.get_phraselet_word_match_info(word)
             corpus_word_position = CorpusWordPosition(
                 match.document_label, word_match.get_document_index())
@@ -401,7 +528,9 @@ class TopicMatcher:
 
         def get_other_matches_at_same_word(match, parent):  # 'True' -> parent, 'False' -> child
             word_match = self.get_word_match_from_match(match, parent)
-            word = word_match.search_phrase_token._.holmes.lemma_or_derived_lemma()
+            word = self.get_phraselet_holmes_dictionaries(
+                self.phraselet_labels_to_search_phrases[match.search_phrase_label])[
+                word_match.search_phrase_token.i].lemma_or_derived_lemma()
             phraselet_word_match_info = self.get_phraselet_word_match_info(word)
             corpus_word_position = CorpusWordPosition(
                 match.document_label, word_match.get_document_index())
@@ -419,11 +548,11 @@ class TopicMatcher:
                 return True
             if word_match.document_token.i == other_word_match.document_token.i:
                 return True
-            working_sibling = word_match.document_token.doc[
-                word_match.document_token._.holmes.token_or_lefthand_sibling_index]
-            for sibling in \
-                    working_sibling._.holmes.loop_token_and_righthand_siblings(
-                        word_match.document_token.doc):
+            document_holmes_dictionaries = self.get_document_holmes_dictionaries(
+                match.document_label)
+            for sibling in document_holmes_dictionaries[document_holmes_dictionaries[
+                    word_match.document_token.i].token_or_lefthand_sibling_index].\
+                    loop_token_and_righthand_siblings(word_match.document_token.doc):
                 if match.search_phrase_label == other_match.search_phrase_label and \
                         other_word_match.document_token.i == sibling.i and \
                         other_word_match.similarity_measure > word_match.similarity_measure:
@@ -467,8 +596,9 @@ class TopicMatcher:
                 if not parent and this_other_pole_word_match.document_token.i != \
                         other_other_pole_word_match.document_token.i and \
                         other_other_pole_word_match.document_token.i in \
-                        this_other_pole_word_match.document_token._.\
-                        holmes.token_and_coreference_chain_indexes and \
+                        self.get_document_holmes_dictionaries(match.document_label)[
+                        this_other_pole_word_match.document_token.i].\
+                        token_and_coreference_chain_indexes and \
                         match.search_phrase_label == other_this_pole_match.search_phrase_label \
                         and (
                                 (
@@ -550,6 +680,18 @@ class TopicMatcher:
                         matches_to_return.append(this_match)
         return matches_to_return
 
+    def get_document_holmes_dictionaries(self, document_label):
+        if document_label not in self.document_labels_to_holmes_dictionaries:
+            self.document_labels_to_holmes_dictionaries[document_label] = get_annotation_store(
+                self.document_labels_to_documents[document_label]).holmes_dictionaries
+        return self.document_labels_to_holmes_dictionaries[document_label]
+
+    def get_phraselet_holmes_dictionaries(self, phraselet):
+        if phraselet.label not in self.phraselet_labels_to_holmes_dictionaries:
+            self.phraselet_labels_to_holmes_dictionaries[phraselet.label] = get_annotation_store(
+                phraselet.doc).holmes_dictionaries
+        return self.phraselet_labels_to_holmes_dictionaries[phraselet.label]
+
     def get_word_match_from_match(self, match, parent):
         ## child if parent==False
         for word_match in match.word_matches:
@@ -570,6 +712,13 @@ class TopicMatcher:
             dictionary[key] = set()
         dictionary[key].add(value)
 
+    def is_intcompound_match_within_same_document_word(self, match):
+        # Where a relationship match involves subwords of the same word both on the
+        # searched text and on the document side, it should receive the same activation as a
+        # single-word match.
+        return (match.search_phrase_label.startswith('intcompound') and
+            len({wm.document_token.i for wm in match.word_matches}) == 1)
+
     def perform_activation_scoring(self, position_sorted_structural_matches,
         phraselet_labels_to_frequency_factors):
         """
@@ -582,13 +731,6 @@ class TopicMatcher:
             else:
                 return set()
 
-        def is_intcompound_match_within_same_document_word(match):
-            # Where a relationship match involves subwords of the same word both on the
-            # searched text and on the document side, it should receive the same activation as a
-            # single-word match.
-            return (match.search_phrase_label.startswith('intcompound') and
-                len({wm.document_token.i for wm in match.word_matches}) == 1)
-
         def get_current_activation_for_phraselet(phraselet_activation_tracker, current_index):
             distance_to_last_match = current_index - phraselet_activation_tracker.position
             tailoff_quotient = distance_to_last_match / self.maximum_activation_distance
@@ -599,7 +741,7 @@ class TopicMatcher:
         for match in (
                 match for match in position_sorted_structural_matches if not
                 match.from_single_word_phraselet and
-                not is_intcompound_match_within_same_document_word(match)):
+                not self.is_intcompound_match_within_same_document_word(match)):
             if match.document_label in document_labels_to_indexes_to_phraselet_labels:
                 inner_dict = document_labels_to_indexes_to_phraselet_labels[match.document_label]
             else:
@@ -621,7 +763,7 @@ class TopicMatcher:
                     current_document_label, {})
             match.is_overlapping_relation = False
             if match.from_single_word_phraselet or \
-                    is_intcompound_match_within_same_document_word(match):
+                    self.is_intcompound_match_within_same_document_word(match):
                 if match.from_topic_match_phraselet_created_without_matching_tags:
                     this_match_score = self.single_word_any_tag_score
                 else:
@@ -682,6 +824,198 @@ class TopicMatcher:
                     match.topic_score += current_activation
         return sorted(position_sorted_structural_matches, key=lambda match: 0-match.topic_score)
 
+    def get_maximum_phraselet_score(self, phraselet, phraselet_labels_to_frequency_factors):
+        """Returns the highest score any match for *phraselet* could contribute to the activation
+            within a document, which is the score calculated in *perform_activation_scoring()*
+            assuming the overlapping relation multiplier is applied whenever it would increase
+            the score and that no embedding or ontology penalty is applied.
+        """
+        if phraselet.topic_match_phraselet_created_without_matching_tags:
+            maximum_score = self.single_word_any_tag_score
+        else:
+            maximum_score = self.single_word_score
+        if not phraselet.has_single_matchable_word:
+            if phraselet.reverse_only:
+                relation_score = self.reverse_only_relation_score
+            else:
+                relation_score = self.relation_score
+            if self.process_initial_question_words and any(
+                    holmes_dictionary.is_initial_question_word or
+                    holmes_dictionary.has_initial_question_word_in_phrase for holmes_dictionary
+                    in self.get_phraselet_holmes_dictionaries(phraselet)):
+                relation_score = max(relation_score, self.initial_question_word_answer_score)
+            if self.overlapping_relation_multiplier > 1.0:
+                relation_score *= self.overlapping_relation_multiplier
+            maximum_score = max(maximum_score, relation_score)
+        if self.use_frequency_factor:
+            maximum_score *= phraselet_labels_to_frequency_factors[phraselet.label]
+        return maximum_score
+
+    def get_root_lemmas_to_similar_words(self):
+        """Returns a dictionary from the root lemmas of the relation phraselets whose root words
+            can be matched using embeddings during reverse matching to the corpus index keys
+            whose embeddings are similar to them. The structural matcher shares the keys it finds
+            for a root lemma between all phraselets with that root lemma, so the keys for each
+            root lemma are found using the lowest threshold that applies to any of them.
+        """
+        if self.overall_similarity_threshold == 1.0 and \
+                self.initial_question_word_overall_similarity_threshold == 1.0:
+            return {}
+        root_lemmas_to_thresholds = {}
+        root_lemmas_to_vectors = {}
+        for phraselet in self.phraselet_labels_to_search_phrases.values():
+            root_token = phraselet.root_token
+            if phraselet.has_single_matchable_word or phraselet.reverse_only or \
+                    self.semantic_matching_helper.is_entity_search_phrase_token(
+                    root_token, phraselet.topic_match_phraselet) or \
+                    not self.structural_matcher.embedding_matching_permitted(root_token):
+                continue
+            vector = phraselet.matchable_non_entity_tokens_to_vectors[root_token.i]
+            if vector is None:
+                continue
+            if self.process_initial_question_words and \
+                    root_token._.holmes.has_initial_question_word_in_phrase:
+                threshold = self.initial_question_word_overall_similarity_threshold
+            else:
+                threshold = self.overall_similarity_threshold
+            threshold **= len(phraselet.matchable_non_entity_tokens_to_vectors)
+            root_lemma = root_token._.holmes.lemma
+            if root_lemma not in root_lemmas_to_thresholds or \
+                    threshold < root_lemmas_to_thresholds[root_lemma]:
+                root_lemmas_to_thresholds[root_lemma] = threshold
+                root_lemmas_to_vectors[root_lemma] = vector
+        if len(root_lemmas_to_thresholds) > 0 and not self.corpus_embedding_matrix.is_built:
+            self.corpus_embedding_matrix.build(
+                self.corpus_index_dict, self.document_labels_to_documents)
+        return {root_lemma: self.corpus_embedding_matrix.get_similar_key_words(
+            root_lemmas_to_vectors[root_lemma], threshold) for root_lemma, threshold in
+            root_lemmas_to_thresholds.items()}
+
+    def get_words_matching_phraselet_root(self, phraselet, root_lemmas_to_similar_words):
+        """Returns the corpus index keys under which the positions are indexed at which the
+            structural matching passes look for the root word of *phraselet*.
+
+            Parameters:
+
+            phraselet -- the phraselet.
+            root_lemmas_to_similar_words -- the dictionary returned by
+                *get_root_lemmas_to_similar_words()*.
+        """
+        root_token = phraselet.root_token
+        if self.semantic_matching_helper.is_entity_search_phrase_token(
+                root_token, phraselet.topic_match_phraselet):
+            return [root_token._.holmes.lemma]
+        words = list(phraselet.words_matching_root_token)
+        if not phraselet.has_single_matchable_word and not phraselet.reverse_only:
+            words.extend(root_lemmas_to_similar_words.get(root_token._.holmes.lemma, ()))
+        return words
+
+    def get_document_score_bounds(self, phraselet_labels_to_frequency_factors):
+        """Returns a dictionary from the labels of the documents in which at least one phraselet
+            could match to upper bounds for the activation within each document.
+
+            Every structural match starts at a position of the root word of its phraselet that
+            is looked up in the corpus index, so a phraselet can only match within the documents
+            that have postings under the keys returned by
+            *get_words_matching_phraselet_root()*. Because a phraselet activation never exceeds
+            the highest score any match for that phraselet could contribute, the sum of these
+            maximum scores over the phraselets that could match within a document is an upper
+            bound for every activation within the document.
+        """
+        document_labels_to_score_bounds = {}
+        root_lemmas_to_similar_words = self.get_root_lemmas_to_similar_words()
+        for phraselet in self.phraselet_labels_to_search_phrases.values():
+            maximum_score = self.get_maximum_phraselet_score(
+                phraselet, phraselet_labels_to_frequency_factors)
+            document_labels = set()
+            for word in self.get_words_matching_phraselet_root(
+                    phraselet, root_lemmas_to_similar_words):
+                if word in self.corpus_index_dict:
+                    document_labels.update(self.corpus_index_dict[word].document_labels())
+            for document_label in document_labels:
+                document_labels_to_score_bounds[document_label] = \
+                    document_labels_to_score_bounds.get(document_label, 0) + maximum_score
+        if self.document_label_filter is not None:
+            document_labels_to_score_bounds = {
+                document_label: score_bound for document_label, score_bound in
+                document_labels_to_score_bounds.items() if
+                document_label.startswith(str(self.document_label_filter))}
+        return document_labels_to_score_bounds
+
+    def generate_topic_matches_within_document_score_bounds(
+            self, phraselet_labels_to_frequency_factors):
+        """Performs structural matching, activation scoring and topic match generation on
+            batches of documents in descending order of the upper bounds returned by
+            *get_document_score_bounds()*, which are calculated from the corpus index before any
+            matching takes place. Processing stops once no remaining document could supply a
+            topic match scoring higher than the current *number_of_results*-th topic match, so
+            that the remaining documents are neither matched nor scored. The first batch holds
+            *number_of_results* documents and each further batch is twice the size of the
+            previous one. The structural matches found within a document do not depend on the
+            other documents matched alongside it, so the topic matches returned are the same as
+            those returned when the whole corpus is matched and scored.
+        """
+        if self.number_of_results <= 0:
+            return []
+        start_time = perf_counter()
+        document_labels_to_score_bounds = self.get_document_score_bounds(
+            phraselet_labels_to_frequency_factors)
+        self.record_stage(
+            'document_score_bounds', start_time, documents=len(document_labels_to_score_bounds))
+        bound_sorted_document_labels = sorted(
+            document_labels_to_score_bounds, key=lambda document_label:
+            (0-document_labels_to_score_bounds[document_label], document_label))
+
+        def can_supply_topic_match(document_label):
+            return len(topic_matches) < self.number_of_results or \
+                document_labels_to_score_bounds[document_label] >= topic_matches[-1].score
+
+        topic_matches = []
+        batch_start = 0
+        batch_size = self.number_of_results
+        while batch_start < len(bound_sorted_document_labels) and \
+                can_supply_topic_match(bound_sorted_document_labels[batch_start]):
+            batch_document_labels = bound_sorted_document_labels[
+                batch_start:batch_start + batch_size]
+            batch_start += batch_size
+            batch_size *= 2
+            document_labels_to_position_sorted_structural_matches = {}
+            for match in self.get_position_sorted_structural_matches(set(batch_document_labels)):
+                self.add_to_dict_list(
+                    document_labels_to_position_sorted_structural_matches, match.document_label,
+                    match)
+            for document_label in batch_document_labels:
+                if not can_supply_topic_match(document_label):
+                    break
+                if document_label not in document_labels_to_position_sorted_structural_matches:
+                    continue
+                document_position_sorted_structural_matches = \
+                    document_labels_to_position_sorted_structural_matches[document_label]
+                start_time = perf_counter()
+                document_score_sorted_structural_matches = self.perform_activation_scoring(
+                    document_position_sorted_structural_matches,
+                    phraselet_labels_to_frequency_factors)
+                self.record_stage(
+                    'perform_activation_scoring', start_time, documents=1,
+                    matches=len(document_position_sorted_structural_matches))
+                start_time = perf_counter()
+                number_of_topic_matches = len(topic_matches)
+                topic_matches.extend(self.generate_topic_matches(
+                    document_score_sorted_structural_matches,
+                    document_position_sorted_structural_matches))
+                self.record_stage(
+                    'generate_topic_matches', start_time,
+                    topic_matches=len(topic_matches) - number_of_topic_matches)
+                # Reproduce the order in which the topic matches would have been generated from
+                # the whole corpus so that ties are resolved in the same way
+                topic_matches.sort(key=lambda topic_match: (
+                    0-topic_match.score, topic_match.document_label,
+                    topic_match.index_within_document))
+                del topic_matches[self.number_of_results:]
+        return sorted(
+            topic_matches, key=lambda topic_match: (
+                0-topic_match.score, topic_match.start_index - topic_match.end_index))
+
     def generate_topic_matches(
             self, score_sorted_structural_matches, position_sorted_structural_matches):
         """Resort the matches starting with the highest (most active) and
@@ -1,5 +1,14 @@
 import unittest
+import os
+import tempfile
+from multiprocessing import get_context
+from queue import Empty
+from threading import Thread
 import holmes_extractor as holmes
+import pickle
+from holmes_extractor.manager import ReplyRouter
+from holmes_extractor.parsing import SearchPhraseIndex, CorpusIndexEntry, CorpusWordPosition, \
+    Index, PackedCorpusWordPositions, document_id_table
 
 holmes_manager = holmes.Manager(
     'en_core_web_trf', perform_coreference_resolution=False, number_of_workers=2)
@@ -38,6 +47,203 @@ class ManagerTest(unittest.TestCase):
             document_text="All the time I am testing here, dogs keep on chasing cats.", label='pets')
         self.assertEqual(len(holmes_manager.match()), 1)
 
+    def test_parse_and_register_documents(self):
+        holmes_manager.remove_all_search_phrases()
+        holmes_manager.remove_all_documents()
+        holmes_manager.parse_and_register_documents({
+            'pets': "All the time I am testing here, dogs keep on chasing cats.",
+            'safari': "Everything I know suggests that lions enjoy eating gnu"})
+        holmes_manager.register_search_phrase("A dog chases a cat")
+        holmes_manager.register_search_phrase("A lion eats a gnu")
+        self.assertEqual(holmes_manager.document_labels(), ['pets', 'safari'])
+        self.assertEqual(len(holmes_manager.match()), 2)
+
+    def test_parse_and_register_documents_in_parser_processes(self):
+        holmes_manager.remove_all_search_phrases()
+        holmes_manager.remove_all_documents()
+        holmes_manager.parse_and_register_documents({
+            'pets': "All the time I am testing here, dogs keep on chasing cats.",
+            'safari': "Everything I know suggests that lions enjoy eating gnu",
+            'pets2': "Dogs chase cats."}, batch_size=2, n_process=2)
+        holmes_manager.register_search_phrase("A dog chases a cat")
+        holmes_manager.register_search_phrase("A lion eats a gnu")
+        self.assertEqual(holmes_manager.document_labels(), ['pets', 'pets2', 'safari'])
+        self.assertEqual(len(holmes_manager.match()), 3)
+        self.assertEqual(holmes_manager.get_document('safari')[5]._.holmes.lemma, 'lion')
+
+    def test_document_store_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store_holmes_manager = holmes.Manager(
+                'en_core_web_trf', perform_coreference_resolution=False, number_of_workers=2,
+                document_store_directory=directory)
+            store_holmes_manager.parse_and_register_document(
+                "All the time I am testing here, dogs keep on chasing cats.", 'pets')
+            store_holmes_manager.parse_and_register_documents({
+                'safari': "Everything I know suggests that lions enjoy eating gnu",
+                'pets2': "Dogs chase cats."}, n_process=2)
+            store_holmes_manager.register_search_phrase("A dog chases a cat")
+            self.assertEqual(len(store_holmes_manager.match()), 2)
+            self.assertEqual(store_holmes_manager.get_document('safari')[5]._.holmes.lemma, 'lion')
+            store_holmes_manager.remove_document('pets')
+            self.assertEqual(store_holmes_manager.serialize_document('pets'), None)
+            self.assertEqual(len(store_holmes_manager.match()), 1)
+            store_holmes_manager.remove_all_documents()
+            self.assertEqual(len(os.listdir(directory)), 1)
+            store_holmes_manager.close()
+            self.assertEqual(len(os.listdir(directory)), 0)
+
+    def test_document_store_compaction(self):
+        minimum_dead_bytes = holmes.manager.MINIMUM_DOCUMENT_ARENA_DEAD_BYTES_FOR_COMPACTION
+        holmes.manager.MINIMUM_DOCUMENT_ARENA_DEAD_BYTES_FOR_COMPACTION = 1
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                store_holmes_manager = holmes.Manager(
+                    'en_core_web_trf', perform_coreference_resolution=False,
+                    number_of_workers=2, document_store_directory=directory)
+                store_holmes_manager.parse_and_register_documents({
+                    'pets1': "Dogs chase cats.", 'pets2': "Dogs chase cats."})
+                old_filenames = set(os.listdir(directory))
+                store_holmes_manager.remove_document('pets1')
+                new_filenames = set(os.listdir(directory))
+                self.assertEqual(len(new_filenames), 1)
+                self.assertTrue(new_filenames.isdisjoint(old_filenames))
+                self.assertEqual(
+                    store_holmes_manager.get_document('pets2')[0]._.holmes.lemma, 'dog')
+                store_holmes_manager.register_search_phrase("A dog chases a cat")
+                self.assertEqual(len(store_holmes_manager.match()), 1)
+                store_holmes_manager.rebalance(target_spread=0.0)
+                self.assertEqual(len(store_holmes_manager.match()), 1)
+                store_holmes_manager.close()
+                self.assertEqual(len(os.listdir(directory)), 0)
+        finally:
+            holmes.manager.MINIMUM_DOCUMENT_ARENA_DEAD_BYTES_FOR_COMPACTION = minimum_dead_bytes
+
+    def test_topic_match_cache(self):
+        cached_holmes_manager = holmes.Manager(
+            'en_core_web_trf', perform_coreference_resolution=False, number_of_workers=2,
+            topic_match_cache_size=2)
+        cached_holmes_manager.parse_and_register_document(
+            "All the time I am testing here, dogs keep on chasing cats.", 'pets')
+        topic_matches = cached_holmes_manager.topic_match_documents_against("A dog chases a cat")
+        self.assertEqual(len(topic_matches), 1)
+        topic_matches[0]['document_label'] = 'changed'
+        topic_matches = cached_holmes_manager.topic_match_documents_against(
+            "A dog  chases a cat")
+        self.assertEqual(topic_matches[0]['document_label'], 'pets')
+        self.assertEqual(cached_holmes_manager.get_topic_match_cache_statistics(), {
+            'size': 1, 'maximum_size': 2, 'hits': 1, 'misses': 1, 'evictions': 0})
+        cached_holmes_manager.parse_and_register_document("Dogs chase cats.", 'pets2')
+        topic_matches = cached_holmes_manager.topic_match_documents_against("A dog chases a cat")
+        self.assertEqual(len(topic_matches), 2)
+        cached_holmes_manager.topic_match_documents_against("A dog chases a cat",
+            number_of_results=1)
+        self.assertEqual(cached_holmes_manager.get_topic_match_cache_statistics(), {
+            'size': 2, 'maximum_size': 2, 'hits': 1, 'misses': 3, 'evictions': 1})
+        cached_holmes_manager.close()
+
+    def test_phraselet_search_phrases_reused_between_topic_matches(self):
+        self._register_multiple_documents_and_search_phrases()
+        first_topic_matches = holmes_manager.topic_match_documents_against("A lion eats a gnu")
+        number_of_cached_search_phrases = len(holmes_manager.phraselet_search_phrase_cache)
+        self.assertTrue(number_of_cached_search_phrases > 0)
+        second_topic_matches = holmes_manager.topic_match_documents_against("A lion eats a gnu")
+        self.assertEqual(len(holmes_manager.phraselet_search_phrase_cache),
+            number_of_cached_search_phrases)
+        self.assertEqual(first_topic_matches, second_topic_matches)
+
+    def test_document_label_filter_skipping_workers(self):
+        self._register_multiple_documents_and_search_phrases()
+        holmes_manager.parse_and_register_document(
+            document_text="All the time I am testing here, dogs keep on chasing cats.", label='pets2')
+        # 'safari' is held by one worker, so the other worker only receives the search phrases
+        self.assertEqual(len(holmes_manager.topic_match_documents_against(
+            "A dog chases a cat", document_label_filter='safari')), 0)
+        self.assertEqual(len(holmes_manager.topic_match_documents_against(
+            "A dog chases a cat", document_label_filter='pets')), 2)
+        self.assertEqual(len(holmes_manager.topic_match_documents_against(
+            "A dog chases a cat", document_label_filter='x')), 0)
+        holmes_manager.remove_documents(['pets', 'pets2'])
+        self.assertEqual(len(holmes_manager.topic_match_documents_against(
+            "A dog chases a cat", document_label_filter='pets')), 0)
+        holmes_manager.parse_and_register_document(
+            document_text="All the time I am testing here, dogs keep on chasing cats.", label='pets3')
+        topic_matches = holmes_manager.topic_match_documents_against("A dog chases a cat")
+        self.assertEqual(len(topic_matches), 1)
+        self.assertEqual(topic_matches[0]['document_label'], 'pets3')
+        self.assertEqual(holmes_manager.document_labels(), ['pets3', 'safari'])
+
+    def test_size_aware_placement_and_rebalancing(self):
+        m = holmes.Manager(
+            'en_core_web_trf', perform_coreference_resolution=False, number_of_workers=2)
+        m.parse_and_register_document(' '.join(
+            ["All the time I am testing here, dogs keep on chasing cats."] * 10), 'long')
+        for counter in range(4):
+            m.parse_and_register_document("Dogs chase cats.", ''.join(('short', str(counter))))
+        long_worker_queue_number = m.document_labels_to_worker_queues['long']
+        for counter in range(4):
+            self.assertNotEqual(m.document_labels_to_worker_queues[
+                ''.join(('short', str(counter)))], long_worker_queue_number)
+        self.assertEqual(sum(m.worker_token_counts), 156)
+        self.assertTrue(all(posting_count > 0 for posting_count in m.worker_posting_counts))
+        m.remove_document('long')
+        self.assertEqual(m.worker_token_counts[long_worker_queue_number], 0)
+        self.assertEqual(m.rebalance(), 2)
+        self.assertEqual(m.worker_token_counts, [8, 8])
+        self.assertEqual(m.rebalance(), 0)
+        topic_matches = m.topic_match_documents_against("A dog chases a cat")
+        self.assertEqual(len(topic_matches), 4)
+        self.assertEqual(m.get_corpus_frequency_information()[0]['dog'], 4)
+        m.close()
+
+    def test_snapshot(self):
+        self._register_multiple_documents_and_search_phrases()
+        holmes_manager.parse_and_register_document(
+            document_text="All the time I am testing here, dogs keep on chasing cats.", label='pets2')
+        topic_matches = holmes_manager.topic_match_documents_against("A dog chases a cat")
+        with tempfile.TemporaryDirectory() as directory:
+            holmes_manager.save_snapshot(directory)
+            for number_of_workers in (1, 3):
+                restarted_manager = holmes.Manager(
+                    'en_core_web_trf', perform_coreference_resolution=False,
+                    number_of_workers=number_of_workers, snapshot=directory)
+                self.assertEqual(restarted_manager.document_labels(),
+                    ['pets', 'pets2', 'safari'])
+                self.assertEqual(restarted_manager.get_corpus_frequency_information(),
+                    holmes_manager.get_corpus_frequency_information())
+                self.assertEqual(restarted_manager.topic_match_documents_against(
+                    "A dog chases a cat"), topic_matches)
+                self.assertEqual(restarted_manager.get_document('safari')[5]._.holmes.lemma,
+                    'lion')
+                restarted_manager.parse_and_register_document("Dogs chase cats.", 'pets3')
+                self.assertEqual(len(restarted_manager.topic_match_documents_against(
+                    "A dog chases a cat")), 3)
+                restarted_manager.remove_document('pets')
+                self.assertEqual(restarted_manager.document_labels(), ['pets2', 'pets3', 'safari'])
+                restarted_manager.close()
+
+    def test_statistics(self):
+        self._register_multiple_documents_and_search_phrases()
+        holmes_manager.match()
+        statistics = holmes_manager.get_statistics()
+        self.assertEqual(len(statistics['workers']), 2)
+        self.assertEqual(sum(worker_statistics['documents'] for worker_statistics in
+            statistics['workers']), 2)
+        self.assertEqual(sum(worker_statistics['tokens'] for worker_statistics in
+            statistics['workers']), sum(holmes_manager.worker_token_counts))
+        for worker_statistics in statistics['workers']:
+            self.assertTrue(worker_statistics['alive'])
+            self.assertEqual(worker_statistics['documents'], 1)
+            self.assertTrue(worker_statistics['corpus_index_keys'] > 0)
+            self.assertTrue(worker_statistics['postings'] >= \
+                worker_statistics['corpus_index_keys'])
+            match_statistics = worker_statistics['methods']['match']
+            self.assertTrue(match_statistics['calls'] >= 1)
+            self.assertEqual(sum(match_statistics['latency_histogram']),
+                match_statistics['calls'])
+            self.assertEqual(len(match_statistics['latency_histogram']),
+                len(statistics['latency_histogram_bounds_seconds']) + 1)
+        self.assertIn('hits', statistics['topic_match_cache'])
+
     def test_remove_document(self):
         self._register_multiple_documents_and_search_phrases()
         holmes_manager.parse_and_register_document(
@@ -49,6 +255,16 @@ class ManagerTest(unittest.TestCase):
         self.assertEqual(len(matches), 1)
         self.assertEqual(matches[0]['document'], 'pets2')
 
+    def test_remove_documents(self):
+        self._register_multiple_documents_and_search_phrases()
+        holmes_manager.parse_and_register_document(
+            document_text="All the time I am testing here, dogs keep on chasing cats.", label='pets2')
+        holmes_manager.remove_documents(['pets', 'safari', 'nonexistent'])
+        self.assertEqual(holmes_manager.document_labels(), ['pets2'])
+        matches = holmes_manager.match()
+        self.assertEqual(len(matches), 1)
+        self.assertEqual(matches[0]['document'], 'pets2')
+
     def test_match_search_phrases_against(self):
         self._register_multiple_documents_and_search_phrases()
         self.assertEqual(len(holmes_manager.match(document_text=
@@ -96,3 +312,264 @@ class ManagerTest(unittest.TestCase):
             "testc")), 0)
         self.assertEqual(len(holmes_manager.match(document_text=
             "testd")), 0)
+
+    def test_search_phrase_index(self):
+        search_phrase_index = SearchPhraseIndex()
+        for text, label in (("A dog chases a cat", "dog"), ("A lion eats", "lion"),
+                ("A big ENTITYNOUN", "noun")):
+            search_phrase = holmes_manager.internal_get_search_phrase(text, label)
+            search_phrase_index.add(search_phrase, *holmes_manager.structural_matcher.
+                get_search_phrase_index_information(search_phrase))
+        self.assertEqual(len(search_phrase_index), 3)
+        for text, expected_labels in (("Dogs chased a cat", ["dog", "noun"]),
+                ("The lion was eating", ["lion", "noun"]), ("It rained", ["noun"])):
+            corpus_index_dict = {}
+            holmes_manager.semantic_matching_helper.add_to_corpus_index(
+                corpus_index_dict, holmes_manager.nlp(text), '')
+            self.assertEqual([search_phrase.label for search_phrase in
+                search_phrase_index.get_search_phrases(corpus_index_dict)], expected_labels)
+        search_phrase_index.remove_with_label("noun")
+        self.assertEqual([search_phrase.label for search_phrase in
+            search_phrase_index.get_search_phrases(corpus_index_dict)], [])
+        self.assertEqual([search_phrase.label for search_phrase in search_phrase_index],
+            ["dog", "lion"])
+        holmes_manager.remove_all_search_phrases()
+        holmes_manager.register_search_phrase("A dog chases a cat", label="dog")
+        holmes_manager.register_search_phrase("A lion eats", label="lion")
+        matches = holmes_manager.match(document_text="The lion was eating")
+        self.assertEqual([match['search_phrase_label'] for match in matches], ["lion"])
+
+    def test_corpus_index_entry(self):
+        def describe(cwp):
+            return cwp.document_label, cwp.index.token_index, cwp.index.subword_index
+
+        corpus_index_entry = CorpusIndexEntry()
+        for document_label, token_index, subword_index, word, is_derivation in (
+                ('entry2', 5, None, 'dog', False), ('entry1', 3, 1, 'Dog', False),
+                ('entry1', 3, None, 'dog', False), ('entry1', 3, None, 'dogs', True),
+                ('entry2', 1, None, 'dog', False)):
+            self.assertTrue(corpus_index_entry.add(CorpusWordPosition(
+                document_label, Index(token_index, subword_index)), word, is_derivation))
+        self.assertFalse(corpus_index_entry.add(CorpusWordPosition(
+            'entry1', Index(3, None)), 'dogs', True))
+        self.assertEqual(len(corpus_index_entry), 5)
+        # answered from the pending postings
+        self.assertEqual(
+            corpus_index_entry.get_number_of_corpus_word_positions_in_document('entry1'), 2)
+        self.assertEqual(corpus_index_entry.get_number_of_postings_in_document('entry1'), 3)
+        self.assertEqual(
+            corpus_index_entry.get_number_of_corpus_word_positions_in_document('entry3'), 0)
+        self.assertEqual([(describe(cwp), word, is_derivation) for cwp, word, is_derivation in
+            corpus_index_entry.get_postings({'entry1'})],
+            [(('entry1', 3, None), 'dog', False), (('entry1', 3, None), 'dogs', True),
+            (('entry1', 3, 1), 'Dog', False)])
+        self.assertEqual(corpus_index_entry.get_number_of_corpus_word_positions(), 4)
+        self.assertEqual(sorted(corpus_index_entry.document_labels()), ['entry1', 'entry2'])
+        self.assertFalse(corpus_index_entry.add(CorpusWordPosition(
+            'entry1', Index(3, None)), 'dogs', True))
+        self.assertEqual(sorted(describe(cwp) for cwp in
+            corpus_index_entry.get_corpus_word_positions(
+            {'entry1', 'entry2'}, PackedCorpusWordPositions({
+            CorpusWordPosition('entry1', Index(3, None)),
+            CorpusWordPosition('entry2', Index(1, None)),
+            CorpusWordPosition('entry2', Index(2, None)),
+            CorpusWordPosition('entry4', Index(3, None))}))),
+            [('entry1', 3, None), ('entry2', 1, None)])
+        unpickled_corpus_index_entry = pickle.loads(pickle.dumps(corpus_index_entry))
+        self.assertEqual(list(unpickled_corpus_index_entry), list(corpus_index_entry))
+        corpus_index_entry.remove_document('entry1')
+        self.assertEqual(len(corpus_index_entry), 2)
+        self.assertEqual(describe(corpus_index_entry.get_first_corpus_word_position()),
+            ('entry2', 1, None))
+        self.assertTrue(corpus_index_entry.add(CorpusWordPosition(
+            'entry1', Index(7, None)), 'dog', False))
+        self.assertEqual([describe(cwp) for cwp, _, _ in
+            corpus_index_entry.get_postings({'entry1'})], [('entry1', 7, None)])
+        self.assertEqual(sorted(describe(cwp) for cwp in
+            corpus_index_entry.get_corpus_word_positions()),
+            [('entry1', 7, None), ('entry2', 1, None), ('entry2', 5, None)])
+        corpus_index_entry.remove_document('entry1')
+        corpus_index_entry.remove_document('entry2')
+        self.assertEqual(len(corpus_index_entry), 0)
+        self.assertIsNone(corpus_index_entry.get_first_corpus_word_position())
+        self.assertEqual(len(unpickled_corpus_index_entry), 5)
+
+    def test_document_ids_freed_once_no_corpus_index_entry_holds_the_document(self):
+        first_corpus_index_entry = CorpusIndexEntry()
+        second_corpus_index_entry = CorpusIndexEntry()
+        number_of_ids = len(document_id_table.labels)
+        for counter in range(100):
+            document_label = ''.join(('churn', str(counter)))
+            for corpus_index_entry in (first_corpus_index_entry, second_corpus_index_entry):
+                corpus_index_entry.add(
+                    CorpusWordPosition(document_label, Index(1, None)), 'dog', False)
+                corpus_index_entry.add(
+                    CorpusWordPosition(document_label, Index(2, None)), 'dog', False)
+            first_corpus_index_entry.consolidate()
+            document_id = document_id_table.get_id(document_label)
+            first_corpus_index_entry.remove_document(document_label)
+            self.assertEqual(document_id_table.get_id(document_label), document_id)
+            second_corpus_index_entry.remove_document(document_label)
+            self.assertIsNone(document_id_table.get_id(document_label))
+        # the ids freed above are reused rather than new ones being assigned
+        self.assertTrue(len(document_id_table.labels) <= number_of_ids + 1)
+        first_corpus_index_entry.add(CorpusWordPosition('churn0', Index(3, None)), 'dog', False)
+        self.assertEqual([(cwp.document_label, cwp.index.token_index) for cwp, _, _ in
+            first_corpus_index_entry], [('churn0', 3)])
+        self.assertIsNotNone(document_id_table.get_id('churn0'))
+        del first_corpus_index_entry
+        self.assertIsNone(document_id_table.get_id('churn0'))
+
+    def test_corpus_frequencies_with_repeated_words(self):
+        holmes_manager.remove_all_search_phrases()
+        holmes_manager.remove_all_documents()
+        holmes_manager.parse_and_register_document(
+            document_text="A dog chased a dog while another dog watched.", label='dogs1')
+        holmes_manager.parse_and_register_document(
+            document_text="A dog slept.", label='dogs2')
+        words_to_corpus_frequencies, _ = holmes_manager.get_corpus_frequency_information()
+        self.assertEqual(words_to_corpus_frequencies['dog'], 4)
+        holmes_manager.remove_document('dogs1')
+        words_to_corpus_frequencies, _ = holmes_manager.get_corpus_frequency_information()
+        self.assertEqual(words_to_corpus_frequencies['dog'], 1)
+
+    def test_corpus_frequencies_updated_incrementally(self):
+        holmes_manager.remove_all_search_phrases()
+        holmes_manager.remove_all_documents()
+        holmes_manager.parse_and_register_documents({
+            'dogs1': "A dog chased a dog while another dog watched.",
+            'dogs2': "A dog slept.",
+            'cats': "A cat slept."})
+        self.assertFalse(holmes_manager.word_dictionaries_need_rebuilding)
+        words_to_corpus_frequencies, maximum_corpus_frequency = \
+            holmes_manager.get_corpus_frequency_information()
+        self.assertEqual(words_to_corpus_frequencies['dog'], 4)
+        self.assertEqual(words_to_corpus_frequencies['sleep'], 2)
+        self.assertEqual(maximum_corpus_frequency, 4)
+        holmes_manager.remove_documents(['dogs1', 'cats'])
+        words_to_corpus_frequencies, maximum_corpus_frequency = \
+            holmes_manager.get_corpus_frequency_information()
+        self.assertEqual(words_to_corpus_frequencies['dog'], 1)
+        self.assertNotIn('cat', words_to_corpus_frequencies)
+        self.assertEqual(maximum_corpus_frequency, 1)
+        incremental_words_to_corpus_frequencies = dict(words_to_corpus_frequencies)
+        holmes_manager.word_dictionaries_need_rebuilding = True
+        words_to_corpus_frequencies, _ = holmes_manager.get_corpus_frequency_information()
+        self.assertEqual(words_to_corpus_frequencies, incremental_words_to_corpus_frequencies)
+
+    def test_corpus_frequency_information_not_changed_by_later_registrations(self):
+        holmes_manager.remove_all_search_phrases()
+        holmes_manager.remove_all_documents()
+        holmes_manager.parse_and_register_document(
+            document_text="A dog slept.", label='dogs1')
+        words_to_corpus_frequencies, maximum_corpus_frequency = \
+            holmes_manager.get_corpus_frequency_information()
+        holmes_manager.parse_and_register_document(
+            document_text="A dog chased a dog while another dog watched.", label='dogs2')
+        self.assertEqual(words_to_corpus_frequencies['dog'], 1)
+        self.assertEqual(maximum_corpus_frequency, 1)
+        holmes_manager.remove_document('dogs1')
+        self.assertEqual(words_to_corpus_frequencies['dog'], 1)
+        words_to_corpus_frequencies, maximum_corpus_frequency = \
+            holmes_manager.get_corpus_frequency_information()
+        self.assertEqual(words_to_corpus_frequencies['dog'], 3)
+        self.assertEqual(maximum_corpus_frequency, 3)
+
+    def test_reply_router_with_simultaneous_requests(self):
+        reply_queue = get_context('spawn').Queue()
+        reply_router = ReplyRouter(reply_queue)
+        request_ids = [reply_router.open_request() for _ in range(10)]
+        # Replies without an open request, e.g. to requests that have timed out, are discarded
+        reply_queue.put((None, 'unrequested'))
+        reply_queue.put((len(request_ids), 'unrequested'))
+
+        def send_replies(request_id):
+            for counter in range(3):
+                reply_queue.put((request_id, (request_id, counter)))
+
+        threads = [Thread(target=send_replies, args=(request_id,)) for request_id in
+            reversed(request_ids)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results = {}
+
+        def receive_replies(request_id):
+            results[request_id] = [reply_router.get(request_id, 10) for _ in range(3)]
+            reply_router.close_request(request_id)
+
+        threads = [Thread(target=receive_replies, args=(request_id,)) for request_id in
+            request_ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for request_id in request_ids:
+            self.assertEqual(results[request_id], [(request_id, 0), (request_id, 1),
+                (request_id, 2)])
+        request_id = reply_router.open_request()
+        with self.assertRaises(Empty):
+            reply_router.get(request_id, 0.1)
+        reply_queue.put((request_id, 'late'))
+        self.assertEqual(reply_router.get(request_id, 10), 'late')
+        self.assertTrue(reply_router.thread.is_alive())
+        reply_router.close()
+        self.assertFalse(reply_router.thread.is_alive())
+
+    def test_manager_close_stops_reply_router(self):
+        m = holmes.Manager(
+            'en_core_web_trf', perform_coreference_resolution=False, number_of_workers=2)
+        m.parse_and_register_document("Dogs chase cats.", 'pets')
+        self.assertTrue(m.reply_router.thread.is_alive())
+        m.close()
+        self.assertFalse(m.reply_router.thread.is_alive())
+
+    def test_calls_after_filtered_topic_match_sending_search_phrases_without_reply(self):
+        self._register_multiple_documents_and_search_phrases()
+        holmes_manager.phraselet_search_phrase_cache.clear()
+        # The worker that does not hold 'safari' is sent the new search phrases without a request
+        self.assertEqual(len(holmes_manager.topic_match_documents_against(
+            "A lion eats a gnu", document_label_filter='safari')), 1)
+        self.assertEqual(holmes_manager.document_labels(), ['pets', 'safari'])
+        self.assertEqual(len(holmes_manager.topic_match_documents_against(
+            "A dog chases a cat")), 1)
+        self.assertEqual(len(holmes_manager.match()), 2)
+
+    def test_calls_after_request_failing_in_worker(self):
+        holmes_manager.remove_all_search_phrases()
+        holmes_manager.remove_all_documents()
+        holmes_manager.register_serialized_document(b'not a document', 'broken')
+        holmes_manager.parse_and_register_document("Dogs chase cats.", 'pets')
+        holmes_manager.register_search_phrase("A dog chases a cat")
+        self.assertEqual(len(holmes_manager.match()), 1)
+        # The label of the document that could not be registered is released
+        self.assertEqual(holmes_manager.document_labels(), ['pets'])
+        holmes_manager.parse_and_register_document("Dogs chase cats.", 'broken')
+        self.assertEqual(len(holmes_manager.match()), 2)
+        holmes_manager.remove_all_documents()
+        self.assertEqual(holmes_manager.document_labels(), [])
+
+    def test_labels_released_when_parser_processes_fail(self):
+        m = holmes.Manager(
+            'en_core_web_trf', perform_coreference_resolution=False, number_of_workers=2)
+        m.parse_and_register_document("Dogs chase cats.", 'pets')
+        # The parser processes cannot load the model and report the failure for each document
+        model = m.model
+        m.model = 'no_such_model'
+        m.parse_and_register_documents({
+            'pets2': "Dogs chase cats.", 'pets3': "Dogs chase cats."}, n_process=2)
+        self.assertEqual(m.document_labels(), ['pets'])
+        m.model = model
+        m.parse_and_register_documents({
+            'pets2': "Dogs chase cats.", 'pets3': "Dogs chase cats."}, n_process=2)
+        self.assertEqual(m.document_labels(), ['pets', 'pets2', 'pets3'])
+        m.close()
+
+    def test_waiting_for_replies_from_parser_process_that_exits_without_reporting(self):
+        parser = get_context('spawn').Process(target=os._exit, args=(3,), daemon=True)
+        parser.start()
+        request_id = holmes_manager.reply_router.open_request()
+        with self.assertRaises(holmes.manager.ParserProcessError):
+            holmes_manager.handle_response(request_id, 2, 'test', [parser])
+        parser.join()
@@ -1,6 +1,9 @@
 import unittest
 import os
+import pickle
 import holmes_extractor as holmes
+from holmes_extractor.parsing import SERIALIZED_DOCUMENT_VERSION, serialize_holmes_document, \
+    deserialize_holmes_document, get_annotation_store, Index, CorpusWordPosition
 
 script_directory = os.path.dirname(os.path.realpath(__file__))
 ontology = holmes.Ontology(os.sep.join(
@@ -120,3 +123,84 @@ class SerializationTest(unittest.TestCase):
             'information2')
         self.assertEqual(old_doc[3]._.holmes.derived_lemma, 'inform')
         self.assertEqual(new_doc[3]._.holmes.derived_lemma, 'inform')
+
+    def test_columnar_serialization_version_and_vectors(self):
+        holmes_manager.remove_all_documents()
+        holmes_manager.parse_and_register_document(
+            "I saw a dog. It was chasing a cat.", 'pets')
+        serialized_doc = holmes_manager.serialize_document('pets')
+        holmes_manager.register_serialized_document(
+            serialized_doc, 'pets2')
+        old_doc = holmes_manager.get_document('pets')
+        new_doc = holmes_manager.get_document('pets2')
+        self.assertEqual(new_doc._.holmes_document_info.serialized_document_version,
+            SERIALIZED_DOCUMENT_VERSION)
+        for old_token, new_token in zip(old_doc, new_doc):
+            self.assertEqual(old_token._.holmes.lemma, new_token._.holmes.lemma)
+            self.assertEqual(old_token._.holmes.string_representation_of_children(),
+                new_token._.holmes.string_representation_of_children())
+            self.assertEqual(old_token._.holmes.token_and_coreference_chain_indexes,
+                new_token._.holmes.token_and_coreference_chain_indexes)
+            self.assertEqual(old_token._.holmes.vector is None,
+                new_token._.holmes.vector is None)
+        self.assertEqual(len(holmes_manager.match()), 2)
+
+    def test_registering_document_serialized_with_to_bytes(self):
+        holmes_manager.remove_all_documents()
+        holmes_manager.register_serialized_document(
+            holmes_manager.nlp("The cat was chased by the dog").to_bytes(), 'pets')
+        self.assertEqual(len(holmes_manager.match()), 1)
+        new_doc = holmes_manager.get_document('pets')
+        self.assertEqual(new_doc[1]._.holmes.lemma, 'cat')
+
+    def test_vectors_not_serialized_but_retrieved_from_vocab(self):
+        holmes_manager.remove_all_documents()
+        holmes_manager.parse_and_register_document(
+            "The cat was chased by the dog", 'pets')
+        doc = holmes_manager.get_document('pets')
+        self.assertEqual(doc[1]._.holmes.__getstate__()['vectors_vocab'], None)
+        self.assertNotIn('vector', doc[1]._.holmes.__getstate__())
+        self.assertEqual(list(doc[1]._.holmes.vector), list(
+            holmes_manager.semantic_analyzer.vectors_nlp.vocab['cat'].vector))
+
+    def test_annotation_store_not_serialized(self):
+        doc = holmes_manager.nlp("I saw a dog. It was chasing a cat.")
+        annotation_store = get_annotation_store(doc)
+        self.assertIs(get_annotation_store(doc), annotation_store)
+        self.assertEqual(len(annotation_store), len(doc))
+        for token in doc:
+            self.assertIs(annotation_store.holmes_dictionaries[token.i], token._.holmes)
+            self.assertIs(annotation_store.coref_chains[token.i], token._.coref_chains)
+        serialized_doc = serialize_holmes_document(doc)
+        self.assertIs(doc._.holmes_document_info.annotation_store, annotation_store)
+        new_doc = deserialize_holmes_document(serialized_doc, holmes_manager.nlp.vocab,
+            holmes_manager.semantic_analyzer.vectors_nlp.vocab)
+        self.assertIsNone(new_doc._.holmes_document_info.annotation_store)
+        self.assertIs(get_annotation_store(new_doc).holmes_dictionaries[3], new_doc[3]._.holmes)
+        self.assertIsNone(doc.copy()._.holmes_document_info.annotation_store)
+        holmes_manager.remove_all_documents()
+        holmes_manager.register_serialized_document(serialized_doc, 'pets')
+        self.assertEqual(len(holmes_manager.match()), 1)
+
+    def test_slotted_value_objects_pickled_as_dictionaries(self):
+        doc = holmes_manager.nlp("The cat was chased by the dog")
+        holmes_dictionary = doc[3]._.holmes
+        dependency = holmes_dictionary.children[0]
+        self.assertFalse(hasattr(dependency, '__dict__'))
+        self.assertEqual(dependency.__getstate__(), {'parent_index': dependency.parent_index,
+            'child_index': dependency.child_index, 'label': dependency.label,
+            'is_uncertain': dependency.is_uncertain})
+        self.assertEqual(pickle.loads(pickle.dumps(dependency)), dependency)
+        unpickled_holmes_dictionary = pickle.loads(pickle.dumps(holmes_dictionary))
+        self.assertEqual(unpickled_holmes_dictionary.lemma, 'chase')
+        self.assertEqual(unpickled_holmes_dictionary.string_representation_of_children(),
+            holmes_dictionary.string_representation_of_children())
+        self.assertIsNone(unpickled_holmes_dictionary.vectors_vocab)
+        self.assertFalse(hasattr(holmes_dictionary, '__dict__'))
+        self.assertIsNone(holmes_dictionary.ent_type)
+        holmes_dictionary.ent_type = 'ORG'
+        self.assertEqual(pickle.loads(pickle.dumps(holmes_dictionary)).ent_type, 'ORG')
+        holmes_dictionary.ent_type = None
+        corpus_word_position = CorpusWordPosition('pets', Index(3, None))
+        self.assertFalse(hasattr(corpus_word_position, '__dict__'))
+        self.assertEqual(pickle.loads(pickle.dumps(corpus_word_position)), corpus_word_position)
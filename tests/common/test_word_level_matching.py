@@ -88,6 +88,20 @@ class WordMatchingTest(unittest.TestCase):
         for text_match in text_matches:
             self.assertTrue(text_match['document'].endswith('queen'))
 
+    def test_embedding_matching_on_root_node_after_documents_removed_and_added(self):
+        holmes_manager_coref.remove_all_documents()
+        holmes_manager_coref.parse_and_register_document('A narcissistic queen',
+                label='narcissistic queen')
+        holmes_manager_coref.parse_and_register_document('A splendid queen', label='splendid queen')
+        self.assertEqual(len(holmes_manager_coref.match()), 2)
+        holmes_manager_coref.remove_document('narcissistic queen')
+        text_matches = holmes_manager_coref.match()
+        self.assertEqual(len(text_matches), 1)
+        self.assertEqual(text_matches[0]['document'], 'splendid queen')
+        holmes_manager_coref.parse_and_register_document('A kind queen', label='kind queen')
+        self.assertEqual(len(holmes_manager_coref.match()), 2)
+        holmes_manager_coref.remove_all_documents()
+
     def test_multiword_matching_multiword_in_document(self):
         text_matches = holmes_manager_coref.match(document_text='Fido chased Mimi Momo')
         self.assertEqual(len(text_matches), 2)
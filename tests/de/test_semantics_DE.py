@@ -792,6 +792,28 @@ class GermanSemanticAnalyzerTest(unittest.TestCase):
         self.assertEqual(doc[0]._.holmes.subwords[1].containing_token_index, 0)
         self.assertEqual(doc[0]._.holmes.subwords[1].char_start_index, 7)
 
+    def test_subwords_retrieved_from_cache_in_later_document(self):
+        subword_cache = nlp.get_pipe('holmes').semantic_analyzer.subword_cache
+        nlp("Die Telefaxnummer.")
+        hits = subword_cache.get_statistics()['hits']
+        doc = nlp("Eine andere Telefaxnummer.")
+        self.assertGreater(subword_cache.get_statistics()['hits'], hits)
+        self.assertEqual(len(doc[2]._.holmes.subwords), 2)
+        self.assertEqual(doc[2]._.holmes.subwords[0].text, 'Telefax')
+        self.assertEqual(doc[2]._.holmes.subwords[0].lemma, 'telefax')
+        self.assertEqual(doc[2]._.holmes.subwords[0].containing_token_index, 2)
+        self.assertEqual(doc[2]._.holmes.subwords[1].text, 'nummer')
+        self.assertEqual(doc[2]._.holmes.subwords[1].char_start_index, 7)
+        self.assertEqual(doc[2]._.holmes.subwords[1].governor_index, None)
+        self.assertEqual(doc[2]._.holmes.subwords[1].dependent_index, 0)
+
+    def test_subwords_for_several_compounds_lemmatized_together(self):
+        doc = nlp("Die Vertragsverlängerung und die Kündigungsfrist.")
+        self.assertEqual([subword.lemma for subword in doc[1]._.holmes.subwords],
+            ['vertrag', 'verlängerung'])
+        self.assertEqual([subword.lemma for subword in doc[4]._.holmes.subwords],
+            ['kündigung', 'frist'])
+
     def test_subwords_with_fugen_s(self):
         doc = nlp("Widerrufsbelehrung")
         self.assertEqual(len(doc[0]._.holmes.subwords), 2)
@@ -1,5 +1,6 @@
 import unittest
 import holmes_extractor as holmes
+from holmes_extractor.parsing import DependencyEdgeIndex
 import os
 
 script_directory = os.path.dirname(os.path.realpath(__file__))
@@ -838,3 +839,46 @@ class CoreferenceEnglishMatchingTest(unittest.TestCase):
             "Yesterday I saw a boy and a boy. They were running")
         matches = coref_holmes_manager.match()
         self.assertEqual(len(matches), 2)
+
+    def test_dependency_edge_index(self):
+        m = holmes.Manager('en_core_web_trf', perform_coreference_resolution=True,
+            number_of_workers=1)
+        document_labels_to_documents = {
+            'coref': m.nlp("I saw a dog. It was chasing a cat."),
+            'passive': m.nlp("The cat was chased by a dog."),
+            'conjunction': m.nlp("A dog and a lion chased cats and mice."),
+            'irrelevant': m.nlp("The dog slept. A cat was chased by a horse.")}
+        corpus_index_dict = {}
+        dependency_edge_index = DependencyEdgeIndex()
+        for label, doc in document_labels_to_documents.items():
+            key_words = m.semantic_matching_helper.add_to_corpus_index(
+                corpus_index_dict, doc, label)
+            dependency_edge_index.add_document(label, m.structural_matcher.get_dependency_edges(
+                doc, label, corpus_index_dict, key_words))
+        self.assertTrue(len(dependency_edge_index) > 0)
+        for search_phrase_text in ("A dog chases a cat", "A dog chases a mouse",
+                "A horse chases", "A sleeping dog"):
+            search_phrase = m.internal_get_search_phrase(search_phrase_text, '')
+            match_dictionaries = []
+            for index in (None, dependency_edge_index):
+                matches = m.structural_matcher.match(
+                    document_labels_to_documents=document_labels_to_documents,
+                    corpus_index_dict=corpus_index_dict,
+                    search_phrases=[search_phrase],
+                    match_depending_on_single_words=None,
+                    compare_embeddings_on_root_words=False,
+                    compare_embeddings_on_non_root_words=False,
+                    reverse_matching_corpus_word_positions=None,
+                    embedding_reverse_matching_corpus_word_positions=None,
+                    process_initial_question_words=False,
+                    overall_similarity_threshold=1.0,
+                    initial_question_word_overall_similarity_threshold=1.0,
+                    dependency_edge_index=index)
+                match_dictionaries.append(m.structural_matcher.build_match_dictionaries(matches))
+            self.assertEqual(match_dictionaries[0], match_dictionaries[1], search_phrase_text)
+        dependency_edge_index.remove_document('coref')
+        self.assertNotIn('coref', dependency_edge_index.document_labels_to_edges)
+        for document_labels_to_corpus_word_positions in \
+                dependency_edge_index.edges_to_document_labels_to_corpus_word_positions.values():
+            self.assertNotIn('coref', document_labels_to_corpus_word_positions)
+        m.close()
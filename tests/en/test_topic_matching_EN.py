@@ -1164,6 +1164,84 @@ class EnglishTopicMatchingTest(unittest.TestCase):
             [{'document_label': 'exact', 'text': 'The dog chased the animal', 'text_to_match': 'A dog chases an animal', 'rank': '1', 'index_within_document': 4, 'subword_index': None, 'start_index': 1, 'end_index': 4, 'sentences_start_index': 0, 'sentences_end_index': 4, 'sentences_character_start_index': 0, 'sentences_character_end_index': 25, 'score': 17.654017250803907, 'word_infos': [[4, 7, 'overlapping_relation', False, 'Matches DOG directly.'], [8, 14, 'overlapping_relation', False, 'Matches CHASE directly.'], [19, 25, 'overlapping_relation', True, 'Matches ANIMAL directly.']], 'answers': []}, {'document_label': 'specific', 'text': 'I saw a dog. It was chasing a cat', 'text_to_match': 'A dog chases an animal', 'rank': '2', 'index_within_document': 9, 'subword_index': None, 'start_index': 3, 'end_index': 9, 'sentences_start_index': 0, 'sentences_end_index': 9, 'sentences_character_start_index': 0, 'sentences_character_end_index': 33, 'score': 14.777271168442839, 'word_infos': [[8, 11, 'overlapping_relation', False, 'Matches DOG directly.'], [20, 27, 'overlapping_relation', False, 'Is a synonym of CHASE in the ontology.'], [30, 33, 'overlapping_relation', True, 'Is a child of ANIMAL in the ontology.']], 'answers': []}, {'document_label': 'exact-reversed', 'text': 'The animal chased the dog', 'text_to_match': 'A dog chases an animal', 'rank': '3', 'index_within_document': 4, 'subword_index': None, 'start_index': 1, 'end_index': 4, 'sentences_start_index': 0, 'sentences_end_index': 4, 'sentences_character_start_index': 0, 'sentences_character_end_index': 25, 'score': 8.083873269940398, 'word_infos': [[4, 10, 'single', False, 'Matches ANIMAL directly.'], [11, 17, 'relation', False, 'Matches CHASE directly.'], [22, 25, 'relation', True, 'Is a child of ANIMAL in the ontology.']], 'answers': []}], )
         m.close()
 
+    def test_document_score_bounds(self):
+        m = holmes.Manager('en_core_web_sm', ontology=ontology_for_sm_tests,
+            number_of_workers=1)
+        m.parse_and_register_document("I saw a dog. It was chasing a cat", 'specific')
+        m.parse_and_register_document("The dog chased the animal", 'exact')
+        m.parse_and_register_document("The cat chased the dog", 'specific-reversed')
+        m.parse_and_register_document("The animal chased the dog", 'exact-reversed')
+        m.parse_and_register_document("A dog. An animal.", 'single-words')
+        m.parse_and_register_document("A plant grows.", 'irrelevant')
+        for number_of_results in range(7):
+            for only_one_result_per_document in (False, True):
+                topic_matches = m.topic_match_documents_against(
+                    "A dog chases an animal", number_of_results=number_of_results,
+                    only_one_result_per_document=only_one_result_per_document)
+                self.assertEqual(len(topic_matches) > 0, number_of_results > 0)
+                self.assertTrue(len(topic_matches) <= number_of_results)
+                self.assertEqual(m.topic_match_documents_against(
+                    "A dog chases an animal", number_of_results=number_of_results,
+                    only_one_result_per_document=only_one_result_per_document,
+                    use_document_score_bounds=True), topic_matches)
+        for word_embedding_match_threshold in (0.8, 0.42):
+            for document_label_filter in (None, 'exact', 'specific'):
+                topic_matches = m.topic_match_documents_against(
+                    "A dog chases an animal", number_of_results=2,
+                    word_embedding_match_threshold=word_embedding_match_threshold,
+                    document_label_filter=document_label_filter)
+                self.assertEqual(m.topic_match_documents_against(
+                    "A dog chases an animal", number_of_results=2,
+                    word_embedding_match_threshold=word_embedding_match_threshold,
+                    document_label_filter=document_label_filter,
+                    use_document_score_bounds=True), topic_matches)
+        m.close()
+
+    def test_document_score_bounds_restrict_structural_matching(self):
+        m = holmes.Manager('en_core_web_sm', ontology=ontology_for_sm_tests,
+            number_of_workers=1)
+        m.parse_and_register_document("The dog chased the animal", 'exact')
+        for counter in range(5):
+            m.parse_and_register_document("A dog.", ''.join(('single-word-', str(counter))))
+        topic_matches, profile = m.profile_topic_match_documents_against(
+            "A dog chases an animal", number_of_results=1)
+        bounded_topic_matches, bounded_profile = m.profile_topic_match_documents_against(
+            "A dog chases an animal", number_of_results=1, use_document_score_bounds=True)
+        self.assertEqual(bounded_topic_matches, topic_matches)
+        self.assertEqual(topic_matches[0]['document_label'], 'exact')
+        stages = profile['workers']['Worker 0']
+        bounded_stages = bounded_profile['workers']['Worker 0']
+        self.assertEqual(bounded_stages['document_score_bounds']['documents'], 6)
+        self.assertEqual(bounded_stages['perform_activation_scoring']['documents'], 1)
+        self.assertTrue(bounded_stages['single_word_matching']['matches'] <
+            stages['single_word_matching']['matches'])
+        m.close()
+
+    def test_profile(self):
+        m = holmes.Manager('en_core_web_sm', ontology=ontology_for_sm_tests,
+            number_of_workers=2, topic_match_cache_size=10)
+        m.parse_and_register_document("The dog chased the animal", 'exact')
+        m.parse_and_register_document("A plant grows.", 'irrelevant')
+        topic_matches = m.topic_match_documents_against("A dog chases an animal")
+        profiled_topic_matches, profile = m.profile_topic_match_documents_against(
+            "A dog chases an animal")
+        self.assertEqual(profiled_topic_matches, topic_matches)
+        for stage in ('parse', 'phraselet_creation', 'search_phrase_creation',
+                'worker_round_trip', 'ipc', 'ordering', 'total'):
+            self.assertIn('seconds', profile['manager'][stage])
+        self.assertEqual(profile['manager']['worker_round_trip']['workers'], 2)
+        self.assertEqual(len(profile['workers']), 2)
+        stages = profile['workers']['Worker 0']
+        for stage in ('single_word_matching', 'relation_matching', 'rebuild_document_info_dict',
+                'filter_superfluous_matches', 'remove_duplicates', 'perform_activation_scoring',
+                'generate_topic_matches', 'get_topic_match_dictionaries', 'total'):
+            self.assertIn(stage, stages)
+        self.assertTrue(stages['single_word_matching']['phraselets'] > 0)
+        self.assertTrue(stages['total']['seconds'] >= stages['single_word_matching']['seconds'])
+        self.assertEqual(sum(worker_stages['get_topic_match_dictionaries']['topic_matches'] for
+            worker_stages in profile['workers'].values()), len(topic_matches))
+        m.close()
+
     def test_multithreading_filtering_with_topic_match_dictionaries(self):
         m = holmes.Manager('en_core_web_sm', number_of_workers=2,
                                           ontology=ontology_for_sm_tests)